@@ -1,15 +1,21 @@
 # app/db/mysql.py
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
 import pymysql
 
 
 def get_conn():
     """
-    获取一个 MySQL 数据库连接
+    新建一个 MySQL 数据库连接
 
     作用：
-    - 统一管理数据库连接
-    - 供 repository 层直接调用写入 / 查询数据库
+    - 统一管理数据库连接参数
+    - 连接池（ConnectionPool）用它创建连接，repository 层请通过 get_pool() 借用
     - 不做任何业务逻辑
     """
 
@@ -41,3 +47,294 @@ def get_conn():
         # 连接超时时间（秒），防止卡死
         connect_timeout=5,
     )
+
+
+class ConnectionPool:
+    """
+    线程安全的 MySQL 连接池
+
+    - min_size：常驻连接数，空闲回收时至少保留这么多
+    - max_size：最大连接数，超过后借用方等待
+    - max_lifetime：连接最长存活秒数，超过后在归还 / 借出时关闭
+    - idle_timeout：空闲超过该秒数的连接（超出 min_size 部分）会被关闭
+    - checkout_timeout：借用连接的最长等待秒数
+    - 借出前 ping 一次，失效连接直接丢弃并重新获取
+    """
+
+    def __init__(
+        self,
+        creator=get_conn,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float = 3600,
+        idle_timeout: float = 300,
+        checkout_timeout: float = 10,
+    ):
+        self.creator = creator
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        # 空闲连接：(conn, 最近归还时间)，右端为最近归还
+        self._idle = deque()
+        # 连接创建时间，key 为 id(conn)
+        self._created: Dict[int, float] = {}
+
+        # 运行统计
+        self._in_use = 0
+        self._created_total = 0
+        self._closed_total = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._ping_failures = 0
+
+    # ------------------------------------------------------------------
+    # 借用 / 归还
+    # ------------------------------------------------------------------
+
+    def acquire(self):
+        """
+        借出一个可用连接，超过 checkout_timeout 仍无连接时抛出 RuntimeError
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            create = False
+
+            with self._cond:
+                while True:
+                    if self._idle:
+                        # 优先复用最近归还的连接
+                        conn, _ = self._idle.pop()
+                        break
+                    if self._size() < self.max_size:
+                        create = True
+                        # 先占位，避免并发创建超过 max_size
+                        self._in_use += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise RuntimeError(
+                            f"数据库连接池已耗尽（max_size={self.max_size}），"
+                            f"等待 {self.checkout_timeout}s 超时"
+                        )
+                    self._waits += 1
+                    self._cond.wait(remaining)
+
+                if not create:
+                    self._in_use += 1
+
+            if create:
+                try:
+                    conn = self.creator()
+                except Exception:
+                    with self._cond:
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+
+                with self._cond:
+                    self._created[id(conn)] = time.monotonic()
+                    self._created_total += 1
+                    self._checkouts += 1
+                return conn
+
+            # 复用的连接：检查寿命并 ping
+            if self._expired(conn) or not self._ping(conn):
+                with self._cond:
+                    self._in_use -= 1
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+            return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """
+        归还连接；discard=True 或连接已超过寿命时直接关闭
+        """
+        if not discard:
+            try:
+                # 防御：未提交的事务一律回滚，保证下一个借用方拿到干净连接
+                if not conn.get_autocommit():
+                    conn.rollback()
+                    conn.autocommit(True)
+            except Exception:
+                discard = True
+
+        if discard or self._expired(conn):
+            with self._cond:
+                self._in_use -= 1
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            evicted = self._evict_idle()
+            self._cond.notify()
+
+        for c in evicted:
+            self._close(c)
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn: ...
+
+        块内抛出数据库连接类异常时，连接直接丢弃不再复用
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ------------------------------------------------------------------
+    # 预热 / 关闭 / 统计
+    # ------------------------------------------------------------------
+
+    def warm(self) -> None:
+        """
+        预先建立 min_size 个连接
+        """
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size() >= self.min_size:
+                        break
+                conns.append(self.acquire())
+        finally:
+            for c in conns:
+                self.release(c)
+
+    def close(self) -> None:
+        """
+        关闭所有空闲连接（借出中的连接在归还后按正常流程处理）
+        """
+        with self._cond:
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+
+        for c in idle:
+            self._close(c)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size(),
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "created_total": self._created_total,
+                "closed_total": self._closed_total,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "ping_failures": self._ping_failures,
+            }
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _size(self) -> int:
+        # 调用方需持有 self._cond
+        return self._in_use + len(self._idle)
+
+    def _expired(self, conn) -> bool:
+        created = self._created.get(id(conn))
+        return created is None or time.monotonic() - created > self.max_lifetime
+
+    def _ping(self, conn) -> bool:
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._ping_failures += 1
+            return False
+
+    def _evict_idle(self) -> List[Any]:
+        # 调用方需持有 self._cond；从最久未使用的一端回收
+        evicted = []
+        now = time.monotonic()
+        while len(self._idle) > 0 and self._size() > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.idle_timeout:
+                break
+            self._idle.popleft()
+            evicted.append(conn)
+        return evicted
+
+    def _discard(self, conn) -> None:
+        # 关闭一个已不在 idle、也不再计入 in_use 的连接，并唤醒等待方
+        with self._cond:
+            self._cond.notify()
+        self._close(conn)
+
+    def _close(self, conn) -> None:
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._closed_total += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    获取进程内唯一的数据库连接池（按环境变量配置）
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+                    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+                    checkout_timeout=float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10")),
+                )
+
+    return _pool
+
+
+def close_pool() -> None:
+    """
+    关闭连接池中的空闲连接（停机时调用；未创建过时什么也不做）
+    """
+    if _pool is not None:
+        _pool.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    连接池状态，供监控使用
+    """
+    return get_pool().stats()
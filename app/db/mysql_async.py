@@ -0,0 +1,101 @@
+# app/db/mysql_async.py
+"""
+MySQL 异步连接池（aiomysql，可选依赖）
+
+连接参数与 get_conn 一致，池大小 / 连接寿命沿用 DB_POOL_* 配置：
+- DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE：常驻 / 最大连接数
+- DB_POOL_MAX_LIFETIME：连接最长存活秒数（aiomysql 的 pool_recycle）
+
+连接池绑定创建它的事件循环，只在该事件循环中使用。
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+try:
+    import aiomysql
+except ImportError:  # 可选依赖
+    aiomysql = None
+
+
+_pool = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def _create_pool():
+    if aiomysql is None:
+        raise RuntimeError("异步数据库访问需要安装 aiomysql")
+
+    return await aiomysql.create_pool(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        db=os.getenv("DB_NAME"),
+        charset="utf8mb4",
+        cursorclass=aiomysql.DictCursor,
+        autocommit=True,
+        connect_timeout=5,
+        minsize=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        maxsize=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        pool_recycle=int(float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))),
+    )
+
+
+async def get_async_pool():
+    """
+    获取进程内唯一的异步连接池（首次调用时创建）
+    """
+    global _pool, _pool_lock
+
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await _create_pool()
+
+    return _pool
+
+
+@asynccontextmanager
+async def async_connection():
+    """
+    从异步连接池借用一个连接，块结束后归还
+
+    连接在块内出现连接类错误时会被 aiomysql 关闭，不会放回池中
+    """
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        yield conn
+
+
+async def close_async_pool() -> None:
+    """
+    关闭异步连接池（停机时调用；未创建过时什么也不做）
+    """
+    global _pool
+
+    if _pool is not None:
+        pool, _pool = _pool, None
+        pool.close()
+        await pool.wait_closed()
+
+
+def async_pool_stats() -> Dict[str, Any]:
+    """
+    异步连接池状态，供监控使用
+    """
+    pool = _pool
+    if pool is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "min_size": pool.minsize,
+        "max_size": pool.maxsize,
+        "size": pool.size,
+        "idle": pool.freesize,
+        "in_use": pool.size - pool.freesize,
+    }
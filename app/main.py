@@ -1,10 +1,97 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes.approval import router as approval_router
+from app.routes.monitor import router as monitor_router, runtime_samples
+from app.db.mysql import close_pool
+from app.db.mysql_async import close_async_pool
+from app.services.attachment_pipeline import get_attachment_pipeline
+from app.services.callback_worker import get_callback_pool, callback_queue_enabled
+from app.services.lark_http import close_lark_http
+from app.services.lark_http_async import close_async_lark_http
+from app.services.readiness import check_readiness, mark_stopping, warm_up
+from app.services.reconcile import get_reconcile_sweeper, reconcile_enabled
+from app.utils.log import setup_logging, shutdown_logging
+from app.utils.metrics import get_metrics_registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动：日志改为队列异步输出
+    setup_logging()
+
+    # 接收流量前预热：数据库连接、飞书连接、app_access_token
+    await warm_up()
+
+    # 拉起回调后台处理池
+    if callback_queue_enabled():
+        get_callback_pool().start()
+
+    # 附件 / 图片转存（ATTACHMENT_PIPELINE 未开启时什么也不做）
+    get_attachment_pipeline().start()
+
+    # 定期对账未结束的审批实例（补偿丢失的回调）
+    if reconcile_enabled():
+        get_reconcile_sweeper().start()
+
+    yield
+
+    # 停止：/ready 先返回未就绪，再停止接收新回调并处理完队列中的任务
+    mark_stopping()
+    if reconcile_enabled():
+        await asyncio.to_thread(get_reconcile_sweeper().stop)
+    if callback_queue_enabled():
+        await asyncio.to_thread(
+            get_callback_pool().stop,
+            float(os.getenv("CALLBACK_DRAIN_TIMEOUT", "30")),
+        )
+    # 回调处理完后再等待已入队的附件转存
+    await asyncio.to_thread(get_attachment_pipeline().stop)
 
-app = FastAPI(title="Approval Callback Service")
+    # 关闭飞书客户端和数据库连接池（未使用过时什么也不做）
+    await close_async_lark_http()
+    await close_async_pool()
+    close_lark_http()
+    close_pool()
+
+    # 写出剩余日志
+    shutdown_logging()
+
+
+app = FastAPI(title="Approval Callback Service", lifespan=lifespan)
 
 app.include_router(approval_router)
+app.include_router(monitor_router)
+
+# 各组件已有的 stats() 在抓取时一并导出
+get_metrics_registry().register_collector(runtime_samples)
 
 @app.get("/")
 def health_check():
+    """
+    存活检查：进程在运行即返回 ok（不检查依赖）
+    """
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def readiness():
+    """
+    就绪检查：数据库、飞书 token、回调处理池均可用时返回 200，否则 503
+    """
+    ready, detail = await check_readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=detail)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus 抓取入口：分阶段耗时 / 成功失败 / 重试次数 / 并发数，以及队列、连接池等状态
+    """
+    return PlainTextResponse(
+        get_metrics_registry().render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,250 @@
+"""
+审批金额汇总表（增量维护）
+
+两张表：
+- lark_approval_amount_contrib：每个实例 × 币种 当前计入汇总的一行（维度 + 金额），即该实例对汇总表的"贡献"
+- lark_approval_amount_agg：approval_code × department_id × currency × 日 / 月 × status 的实例数和金额合计
+
+实例入库时（与其它表同一个事务、持有实例锁）：
+1. 读出实例已有的贡献行（FOR UPDATE）
+2. 按本次入库内容算出新的贡献行：form 变化时从 KV 行重新计算金额；
+   只有状态 / 主表变化时沿用原金额，只更新维度（状态、部门等）
+3. 旧贡献从汇总行中减去，新贡献加上，同一汇总行的增减先在内存中抵消，只写净变化
+4. 用新贡献行替换旧贡献行
+
+因此同一实例重复处理不会重复计数，PENDING → APPROVED 等状态变化会把金额从旧状态移到新状态
+（旧状态的汇总行可能减到 instance_count = 0，查询时按 instance_count > 0 过滤）。
+
+金额字段：顶层（非明细单元格）、解析出金额和币种（_extract_value 识别的 {amount, currency}），
+且 field_key 在 AMOUNT_AGG_FIELD_KEYS 中的 KV 行。默认只统计归一后的 总金额，
+避免同一表单中的 金额 / 税额 / 合计 被重复计入；设为 * 时统计全部顶层金额字段。
+"""
+
+import datetime
+import os
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+
+# 是否维护金额汇总表
+AMOUNT_AGG_ENABLED = os.getenv("AMOUNT_AGG", "1").lower() not in ("0", "false", "no")
+
+# 只统计这些 field_key 的金额字段（逗号分隔）；* 表示全部顶层金额字段
+AMOUNT_AGG_FIELD_KEYS = {k.strip() for k in os.getenv("AMOUNT_AGG_FIELD_KEYS", "总金额").split(",") if k.strip()}
+
+# 统计日期所用时区（与运行环境的本地时区无关，不同主机算出的 stat_date 一致）
+AMOUNT_AGG_TZ = ZoneInfo(os.getenv("AMOUNT_AGG_TZ", "Asia/Shanghai"))
+
+# 汇总粒度
+GRAINS = ("day", "month")
+
+# 贡献行维度（除 instance_code / currency / amount 外）
+CONTRIB_DIMENSIONS = ("approval_code", "department_id", "status", "stat_date")
+
+
+SQL_SAVE_AMOUNT_CONTRIB = """
+INSERT INTO lark_approval_amount_contrib (
+    instance_code,   -- 审批实例 code
+    currency,        -- 币种
+    approval_code,   -- 审批定义 code
+    department_id,   -- 申请人部门 ID
+    status,          -- 实例状态
+    stat_date,       -- 统计日期（实例发起日）
+    amount           -- 金额合计
+)
+VALUES (%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    approval_code = VALUES(approval_code),
+    department_id = VALUES(department_id),
+    status = VALUES(status),
+    stat_date = VALUES(stat_date),
+    amount = VALUES(amount)
+"""
+
+SQL_APPLY_AMOUNT_AGG = """
+INSERT INTO lark_approval_amount_agg (
+    grain,            -- day / month
+    period_start,     -- 日期 / 当月 1 日
+    approval_code,    -- 审批定义 code
+    department_id,    -- 申请人部门 ID（无部门时为空串）
+    currency,         -- 币种
+    status,           -- 实例状态
+    instance_count,   -- 实例数（增量）
+    amount_sum        -- 金额合计（增量）
+)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    instance_count = instance_count + VALUES(instance_count),
+    amount_sum = amount_sum + VALUES(amount_sum)
+"""
+
+
+def contrib_select_sql(count: int) -> str:
+    placeholders = ",".join(["%s"] * count)
+    return f"""
+    SELECT instance_code, currency, approval_code, department_id, status, stat_date, amount
+    FROM lark_approval_amount_contrib
+    WHERE instance_code IN ({placeholders})
+    FOR UPDATE
+    """
+
+
+def contrib_delete_sql(count: int) -> str:
+    placeholders = ",".join(["(%s, %s)"] * count)
+    return f"""
+    DELETE FROM lark_approval_amount_contrib
+    WHERE (instance_code, currency) IN ({placeholders})
+    """
+
+
+# =========================
+# 贡献行 / 汇总增量计算
+# =========================
+
+def stat_date(start_time) -> Optional[datetime.date]:
+    """
+    实例发起时间（毫秒时间戳）→ AMOUNT_AGG_TZ 时区的日期
+    """
+    if start_time is None or not str(start_time).isdigit():
+        return None
+    return datetime.datetime.fromtimestamp(int(start_time) / 1000, AMOUNT_AGG_TZ).date()
+
+
+def is_amount_row(r: Dict[str, Any]) -> bool:
+    if r.get("parent_widget_id") or r.get("currency") is None or r.get("field_value_num") is None:
+        return False
+    return "*" in AMOUNT_AGG_FIELD_KEYS or r.get("field_key") in AMOUNT_AGG_FIELD_KEYS
+
+
+def amounts_from_kv(kv_rows: Iterable[Dict[str, Any]]) -> Dict[str, Decimal]:
+    """
+    KV 行 → {币种: 金额合计}
+    """
+    amounts: Dict[str, Decimal] = defaultdict(Decimal)
+    for r in kv_rows:
+        if is_amount_row(r):
+            # 经字符串转 Decimal，避免浮点误差在汇总表中累积
+            amounts[r["currency"]] += Decimal(str(r["field_value_num"]))
+    return dict(amounts)
+
+
+def contribution_rows(
+    instance: Dict[str, Any],
+    kv_rows: Optional[List[Dict[str, Any]]],
+    old_rows: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    计算实例新的贡献行
+    - instance：实例主表字段（_build_instance_row 的结果）
+    - kv_rows：本次的完整 KV 行；None 表示 form 未变化，金额沿用 old_rows
+    """
+    if kv_rows is not None:
+        amounts = amounts_from_kv(kv_rows)
+    else:
+        amounts = {r["currency"]: Decimal(str(r["amount"])) for r in old_rows}
+
+    dims = {
+        "approval_code": instance.get("approval_code"),
+        "department_id": instance.get("department_id") or "",
+        "status": instance.get("status"),
+        "stat_date": stat_date(instance.get("start_time")),
+    }
+    if dims["stat_date"] is None:
+        return []
+
+    return [
+        {"instance_code": instance.get("instance_code"), "currency": currency, "amount": amount, **dims}
+        for currency, amount in sorted(amounts.items())
+    ]
+
+
+def _agg_keys(r: Dict[str, Any]) -> List[Tuple]:
+    # 汇总表主键列不允许 NULL，缺失的维度记为空串
+    day = r["stat_date"]
+    periods = {"day": day, "month": day.replace(day=1)}
+    return [
+        (grain, periods[grain], r["approval_code"] or "", r["department_id"] or "", r["currency"], r["status"] or "")
+        for grain in GRAINS
+    ]
+
+
+def amount_agg_deltas(old_rows: List[Dict[str, Any]], new_rows: List[Dict[str, Any]]) -> List[Tuple]:
+    """
+    旧贡献减去、新贡献加上，按汇总行合并后返回非零的 SQL 参数（按键排序，多个事务加行锁的顺序一致）
+    """
+    deltas: Dict[Tuple, List] = defaultdict(lambda: [0, Decimal(0)])
+
+    for sign, rows in ((-1, old_rows), (1, new_rows)):
+        for r in rows:
+            amount = Decimal(str(r["amount"]))
+            for key in _agg_keys(r):
+                deltas[key][0] += sign
+                deltas[key][1] += sign * amount
+
+    return [
+        (*key, count, amount)
+        for key, (count, amount) in sorted(deltas.items(), key=lambda kv: tuple(str(k) for k in kv[0]))
+        if count != 0 or amount != 0
+    ]
+
+
+def contrib_params(r: Dict[str, Any]) -> Tuple:
+    return (
+        r["instance_code"],
+        r["currency"],
+        r["approval_code"],
+        r["department_id"],
+        r["status"],
+        r["stat_date"],
+        r["amount"],
+    )
+
+
+def _same_contrib(old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    if Decimal(str(old["amount"])) != new["amount"]:
+        return False
+    return all(old.get(k) == new.get(k) for k in CONTRIB_DIMENSIONS)
+
+
+def diff_amount_contrib(
+    bundles: List[Dict[str, Any]],
+    existing_rows: List[Dict[str, Any]],
+) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+    """
+    计算金额汇总的全部写入，返回 (汇总增量参数, 贡献行 upsert 参数, 贡献行删除 (instance_code, currency))
+
+    只处理带实例主表行（有变化）的 bundle；内容完全相同的实例不产生任何写入
+    """
+    existing: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in existing_rows:
+        existing[r["instance_code"]].append(r)
+
+    old_all: List[Dict[str, Any]] = []
+    new_all: List[Dict[str, Any]] = []
+    upserts: List[Tuple] = []
+    deletes: List[Tuple] = []
+
+    for b in bundles:
+        instance = b.get("instance")
+        if not instance:
+            continue
+
+        code = b["instance_code"]
+        old_rows = existing.get(code, [])
+        new_rows = contribution_rows(instance, b.get("kv_rows"), old_rows)
+
+        old_by_currency = {r["currency"]: r for r in old_rows}
+        new_currencies = {r["currency"] for r in new_rows}
+
+        for r in new_rows:
+            old = old_by_currency.get(r["currency"])
+            if old is None or not _same_contrib(old, r):
+                upserts.append(contrib_params(r))
+        deletes.extend((code, c) for c in old_by_currency if c not in new_currencies)
+
+        old_all.extend(old_rows)
+        new_all.extend(new_rows)
+
+    return amount_agg_deltas(old_all, new_all), upserts, deletes
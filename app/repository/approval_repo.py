@@ -6,169 +6,674 @@
 - 不做任何业务判断
 - 不解析、不重组 JSON
 - 上层给什么，这里就存什么
+
+多行写入统一走 cursor.executemany：
+PyMySQL 会把 INSERT ... VALUES (...) [ON DUPLICATE KEY UPDATE ...]
+改写成一条多行 INSERT，并按 max_stmt_length 自动切分，
+因此一次调用只产生少量网络往返
+"""
+
+from app.utils import json_codec  # 用于将 dict 序列化为 JSON 字符串（有 orjson 时使用 orjson）
+import os  # 读取批量写入配置
+import pymysql  # 区分连接类异常（连接需要丢弃）
+from contextlib import contextmanager  # 借用 / 归还连接的上下文管理
+from typing import Dict, List, Any, Optional, Tuple  # 类型注解，仅用于可读性和 IDE 提示
+from app.db.mysql import get_pool  # MySQL 连接池
+from app.repository.amount_agg import (  # 金额汇总表（增量维护）
+    AMOUNT_AGG_ENABLED,
+    SQL_APPLY_AMOUNT_AGG,
+    SQL_SAVE_AMOUNT_CONTRIB,
+    contrib_delete_sql,
+    contrib_select_sql,
+    diff_amount_contrib,
+)
+from app.utils.log import fields, get_logger  # 结构化日志
+from app.utils.metrics import stage, timed  # 分阶段耗时指标
+
+logger = get_logger(__name__)
+
+
+# 单条多行 INSERT 的最大字节数，需小于 MySQL 的 max_allowed_packet
+BULK_MAX_BYTES = int(os.getenv("DB_BULK_MAX_BYTES", str(1024 * 1024)))
+
+# 跨进程的实例级互斥：mysql（GET_LOCK，默认）/ none
+INSTANCE_LOCK_BACKEND = os.getenv("INSTANCE_LOCK", "mysql").lower()
+# 等待实例锁的最长秒数
+INSTANCE_LOCK_TIMEOUT = int(os.getenv("INSTANCE_LOCK_TIMEOUT", "10"))
+
+
+# =========================
+# SQL 语句
+# =========================
+
+# 版本守卫：新快照的版本不低于已入库版本时才覆盖（历史数据 version 为 NULL 时直接覆盖）
+# ON DUPLICATE KEY UPDATE 按顺序赋值，version 必须放在最后更新
+NEWER_VERSION = "(version IS NULL OR VALUES(version) >= version)"
+
+# 1. 原始审批数据表
+SQL_SAVE_RAW = """
+INSERT INTO lark_approval_raw (
+    instance_code,      -- 审批实例 code（唯一键）
+    approval_code,      -- 审批定义 code
+    status,             -- 审批状态
+    event_type,         -- 事件类型（固定值）
+    raw_json,           -- 原始 JSON 数据
+    version             -- 快照版本
+)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    status = IF({newer}, VALUES(status), status),              -- 实例状态更新
+    event_type = IF({newer}, VALUES(event_type), event_type),  -- 事件类型更新
+    raw_json = IF({newer}, VALUES(raw_json), raw_json),        -- 原始 JSON 覆盖更新
+    version = IF({newer}, VALUES(version), version)
+""".format(newer=NEWER_VERSION)
+
+# 2. 审批实例主表
+SQL_SAVE_INSTANCE = """
+INSERT INTO lark_approval_instance (
+    instance_code,       -- 审批实例 code
+    approval_code,       -- 审批定义 code
+    approval_name,       -- 审批名称
+    status,              -- 当前状态
+    applicant_user_id,   -- 申请人用户 ID
+    applicant_name,      -- 申请人姓名（通讯录解析）
+    department_id,       -- 申请人部门 ID
+    department_name,     -- 申请人部门名称（通讯录解析）
+    start_time,          -- 审批开始时间
+    end_time,            -- 审批结束时间
+    create_time,         -- 创建时间
+    update_time,         -- 更新时间
+    instance_hash,       -- 实例主表字段指纹
+    tasks_hash,          -- task_list 指纹
+    form_hash,           -- form 指纹
+    version,             -- 快照版本（旧快照不覆盖新快照）
+    refreshed_at         -- 最近一次从飞书拉取的时间（对账用）
+)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,NOW())
+ON DUPLICATE KEY UPDATE
+    refreshed_at = VALUES(refreshed_at),                           -- 每次拉取都刷新（不受版本守卫）
+    status = IF({newer}, VALUES(status), status),                  -- 状态更新
+    applicant_name = COALESCE(VALUES(applicant_name), applicant_name),     -- 未解析出名称时保留原值
+    department_name = COALESCE(VALUES(department_name), department_name),
+    end_time = IF({newer}, VALUES(end_time), end_time),            -- 结束时间更新
+    update_time = IF({newer}, VALUES(update_time), update_time),   -- 更新时间更新
+    instance_hash = IF({newer}, VALUES(instance_hash), instance_hash),
+    tasks_hash = IF({newer}, VALUES(tasks_hash), tasks_hash),
+    form_hash = IF({newer}, VALUES(form_hash), form_hash),
+    version = IF({newer}, VALUES(version), version)
+""".format(newer=NEWER_VERSION)
+
+# 3. 审批任务节点表
+SQL_SAVE_TASK = """
+INSERT INTO lark_approval_task (
+    task_id,         -- 任务 ID（唯一）
+    instance_code,   -- 审批实例 code
+    node_id,         -- 流程节点 ID
+    node_name,       -- 节点名称
+    node_type,       -- 节点类型
+    user_id,         -- 处理人 user_id
+    open_id,         -- 处理人 open_id
+    user_name,       -- 处理人姓名（通讯录解析）
+    status,          -- 任务状态
+    start_time,      -- 任务开始时间
+    end_time,        -- 任务结束时间
+    version          -- 所属实例快照版本
+)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    status = IF({newer}, VALUES(status), status),        -- 状态更新
+    user_name = COALESCE(VALUES(user_name), user_name),  -- 未解析出名称时保留原值
+    end_time = IF({newer}, VALUES(end_time), end_time),  -- 结束时间更新
+    version = IF({newer}, VALUES(version), version)
+""".format(newer=NEWER_VERSION)
+
+# 4. 表单字段原始表
+SQL_SAVE_FORM_FIELD = """
+INSERT INTO lark_approval_form_field (
+    instance_code,  -- 审批实例 code
+    field_id,       -- 字段 ID
+    field_name,     -- 字段名称
+    field_type,     -- 字段类型
+    field_value     -- 原始字段值
+)
+VALUES (%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    field_value = VALUES(field_value) -- 字段值更新
+"""
+
+# 5. 表单字段 KV 拆解表
+SQL_SAVE_FIELD_KV = """
+INSERT INTO lark_approval_field_kv (
+    approval_id,        -- 审批实例 ID
+    row_id,             -- 明细行 ID
+    widget_id,          -- 控件 ID
+    field_name,         -- 字段名称
+    field_type,         -- 字段类型
+    field_value_text,   -- 文本值
+    field_value_num,    -- 数值
+    currency,           -- 币种
+    extra_json,         -- 额外 JSON 数据
+    field_key,          -- 统一后的字段名
+    parent_widget_id,   -- 明细表控件 ID（明细单元格）
+    row_index           -- 明细行序号（明细单元格）
+)
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    field_name = VALUES(field_name),
+    field_type = VALUES(field_type),
+    field_key = VALUES(field_key),
+    parent_widget_id = VALUES(parent_widget_id),
+    row_index = VALUES(row_index),
+    field_value_text = VALUES(field_value_text),
+    field_value_num = VALUES(field_value_num),
+    currency = VALUES(currency),
+    extra_json = VALUES(extra_json)
+"""
+
+# 附件 / 图片转存后的对象 key 写回 KV 行
+# 只在实例 form 仍是下载时的版本（form_hash 未变）时写入，期间被新快照覆盖则放弃
+SQL_SAVE_ATTACHMENT_KEYS = """
+UPDATE lark_approval_field_kv kv
+JOIN lark_approval_instance i ON i.instance_code = kv.approval_id
+SET kv.attachment_keys = %s
+WHERE kv.approval_id = %s
+  AND kv.row_id = %s
+  AND kv.widget_id = %s
+  AND i.form_hash = %s
+"""
+
+# KV 行中参与比较的值字段（唯一键之外）
+FIELD_KV_VALUE_COLUMNS = (
+    "field_name",
+    "field_type",
+    "field_value_text",
+    "field_value_num",
+    "currency",
+    "extra_json",
+    "field_key",
+    "parent_widget_id",
+    "row_index",
+)
+
+
+# =========================
+# 行数据 → SQL 参数
+# =========================
+
+def raw_params(
+    instance_code: str,
+    raw_data: Dict[str, Any],
+    raw_json: str = None,
+    version: int = None,
+) -> Tuple:
+    return (
+        instance_code,                         # 审批实例 code
+        raw_data.get("approval_code"),         # 审批定义 code
+        raw_data.get("status"),                # 审批状态
+        "approval_instance",                   # 固定事件类型
+        raw_json or json_codec.dumps(raw_data),  # JSON 序列化（上层已序列化时直接复用）
+        version,                               # 快照版本
+    )
+
+
+def instance_params(instance: Dict[str, Any]) -> Tuple:
+    return (
+        instance.get("instance_code"),       # 实例 code
+        instance.get("approval_code"),       # 审批 code
+        instance.get("approval_name"),       # 审批名称
+        instance.get("status"),              # 状态
+        instance.get("applicant_user_id"),   # 申请人
+        instance.get("applicant_name"),      # 申请人姓名
+        instance.get("department_id"),       # 部门
+        instance.get("department_name"),     # 部门名称
+        instance.get("start_time"),          # 开始时间
+        instance.get("end_time"),            # 结束时间
+        instance.get("create_time"),         # 创建时间
+        instance.get("update_time"),         # 更新时间
+        instance.get("instance_hash"),       # 实例指纹
+        instance.get("tasks_hash"),          # 任务指纹
+        instance.get("form_hash"),           # 表单指纹
+        instance.get("version"),             # 快照版本
+    )
+
+
+def task_params(instance_code: str, task: Dict[str, Any], version: int = None) -> Tuple:
+    return (
+        task.get("id"),           # 任务 ID
+        instance_code,             # 实例 code
+        task.get("node_id"),       # 节点 ID
+        task.get("node_name"),     # 节点名
+        task.get("type"),          # 节点类型
+        task.get("user_id"),       # 用户 ID
+        task.get("open_id"),       # open_id
+        task.get("user_name"),     # 处理人姓名
+        task.get("status"),        # 状态
+        task.get("start_time"),    # 开始时间
+        task.get("end_time"),      # 结束时间
+        version,                   # 所属实例快照版本
+    )
+
+
+def form_field_params(instance_code: str, field: Dict[str, Any]) -> Tuple:
+    return (
+        instance_code,             # 实例 code
+        field["field_id"],         # 字段 ID
+        field["field_name"],       # 字段名
+        field["field_type"],       # 字段类型
+        field["field_value"],      # 字段值
+    )
+
+
+def field_kv_key(r: Dict[str, Any]) -> Tuple:
+    """
+    KV 行在单个实例内的唯一键：(row_id, widget_id)，顶层字段 row_id 为空串，缺失的 widget_id 为空串
+    """
+    return (r.get("row_id") or "", r.get("widget_id") or "")
+
+
+def field_kv_params(r: Dict[str, Any]) -> Tuple:
+    return (
+        r.get("approval_id"),        # 审批 ID
+        r.get("row_id") or "",       # 行 ID（顶层字段为空串）
+        r.get("widget_id") or "",    # 控件 ID（缺失时为空串）
+        r.get("field_name"),         # 字段名
+        r.get("field_type"),         # 类型
+        r.get("field_value_text"),   # 文本值
+        r.get("field_value_num"),    # 数值
+        r.get("currency"),           # 币种
+        r.get("extra_json"),          # 扩展 JSON
+        r.get("field_key"),          # 统一字段名
+        r.get("parent_widget_id"),   # 明细表控件 ID
+        r.get("row_index"),          # 明细行序号
+    )
+
+
+# =========================
+# 同步 / 异步仓储共用的 SQL 构建与对比逻辑
+# =========================
+
+def fingerprint_select_sql(count: int) -> str:
+    placeholders = ",".join(["%s"] * count)
+    return f"""
+    SELECT instance_code, instance_hash, tasks_hash, form_hash, version
+    FROM lark_approval_instance
+    WHERE instance_code IN ({placeholders})
+    """
+
+
+def field_kv_select_sql(count: int) -> str:
+    placeholders = ",".join(["%s"] * count)
+    return f"""
+    SELECT approval_id, row_id, widget_id, {", ".join(FIELD_KV_VALUE_COLUMNS)}
+    FROM lark_approval_field_kv
+    WHERE approval_id IN ({placeholders})
+    """
+
+
+def field_kv_delete_sql(count: int) -> str:
+    return f"""
+    DELETE FROM lark_approval_field_kv
+    WHERE (approval_id, row_id, widget_id) IN ({",".join(["(%s,%s,%s)"] * count)})
+    """
+
+
+def instance_lock_name(instance_code: str) -> str:
+    # GET_LOCK 名称最长 64 个字符
+    return f"lark_approval:{instance_code}"[:64]
+
+
+def instance_lock_sql(count: int) -> str:
+    """
+    一条语句获取多个实例锁，返回每个锁的结果（1 成功 / 0 超时）
+    """
+    return "SELECT " + ", ".join(
+        [f"GET_LOCK(%s, %s) AS l{i}" for i in range(count)]
+    )
+
+
+def instance_lock_params(instance_codes: List[str]) -> Tuple[List[str], List[Any]]:
+    """
+    按名称排序（多个进程以相同顺序加锁，避免死锁），返回 (锁名列表, SQL 参数)
+    """
+    names = sorted({instance_lock_name(c) for c in instance_codes})
+    params: List[Any] = []
+    for name in names:
+        params.extend((name, INSTANCE_LOCK_TIMEOUT))
+    return names, params
+
+
+SQL_RELEASE_INSTANCE_LOCKS = "SELECT RELEASE_ALL_LOCKS()"
+
+
+SQL_LIST_INSTANCE_CODES = """
+SELECT instance_code
+FROM lark_approval_instance
+WHERE instance_code > %s
+ORDER BY instance_code
+LIMIT %s
 """
 
-import json  # 用于将 dict 序列化为 JSON 字符串
-from typing import Dict, List, Any  # 类型注解，仅用于可读性和 IDE 提示
-from app.db.mysql import get_conn  # 获取 MySQL 数据库连接
+
+def amount_source_instance_sql(count: int) -> str:
+    placeholders = ",".join(["%s"] * count)
+    return f"""
+    SELECT instance_code, approval_code, department_id, status, start_time
+    FROM lark_approval_instance
+    WHERE instance_code IN ({placeholders})
+    """
+
+
+def mark_refreshed_sql(count: int) -> str:
+    placeholders = ",".join(["%s"] * count)
+    return f"""
+    UPDATE lark_approval_instance
+    SET refreshed_at = NOW()
+    WHERE instance_code IN ({placeholders})
+    """
+
+
+def stale_instances_sql(status_count: int, after: bool) -> str:
+    """
+    对账水位查询：走 idx_status_refreshed (status, refreshed_at)，
+    按 refreshed_at 从旧到新，(refreshed_at, instance_code) 作为同一轮内的翻页水位
+    """
+    placeholders = ",".join(["%s"] * status_count)
+    watermark = "AND (refreshed_at > %s OR (refreshed_at = %s AND instance_code > %s))" if after else ""
+    return f"""
+    SELECT instance_code, status, refreshed_at
+    FROM lark_approval_instance
+    WHERE status IN ({placeholders})
+      AND refreshed_at < NOW() - INTERVAL %s SECOND
+      {watermark}
+    ORDER BY refreshed_at, instance_code
+    LIMIT %s
+    """
+
+
+def diff_field_kv(
+    rows_by_instance: Dict[str, List[Dict[str, Any]]],
+    existing_rows: List[Dict[str, Any]],
+) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    对比目标 KV 行与已有行，返回 (需要 upsert 的参数列表, 需要删除的 (approval_id, row_id, widget_id) 列表)
+    """
+    existing: Dict[Tuple, Dict[str, Any]] = {
+        (r["approval_id"], *field_kv_key(r)): r for r in existing_rows
+    }
+
+    upserts: List[Tuple] = []
+    wanted = set()
+
+    for code, rows in rows_by_instance.items():
+        for r in rows:
+            key = (code, *field_kv_key(r))
+            wanted.add(key)
+
+            old = existing.get(key)
+            if old is None or not _same_kv_values(old, r):
+                upserts.append(field_kv_params(r))
+
+    deletes = [k for k in existing if k not in wanted]
+    return upserts, deletes
+
+
+def _same_kv_values(old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    for col in FIELD_KV_VALUE_COLUMNS:
+        a, b = old.get(col), new.get(col)
+        if col == "field_value_num" and a is not None and b is not None:
+            # 数据库返回 Decimal，统一转 float 比较
+            if float(a) != float(b):
+                return False
+        elif a != b:
+            return False
+    return True
+
+
+def batch_params(bundles: List[Dict[str, Any]]):
+    """
+    把 save_batch 的 bundles 展开为各表的参数
+    返回 (raw 行, instance 行, task 行, form_field 行, {instance_code: KV 行})
+    """
+    raw_rows: List[Tuple] = []
+    instance_rows: List[Tuple] = []
+    task_rows: List[Tuple] = []
+    form_rows: List[Tuple] = []
+    kv_rows: Dict[str, List[Dict[str, Any]]] = {}
+
+    for b in bundles:
+        code = b["instance_code"]
+        version = b.get("version")
+        if b.get("raw_data") is not None:
+            raw_rows.append(raw_params(code, b["raw_data"], b.get("raw_json"), version))
+        if b.get("instance"):
+            instance_rows.append(instance_params(b["instance"]))
+        task_rows.extend(task_params(code, t, version) for t in b.get("tasks") or [])
+        form_rows.extend(form_field_params(code, f) for f in b.get("form_fields") or [])
+        if b.get("kv_rows") is not None:
+            kv_rows[code] = b["kv_rows"]
+
+    return raw_rows, instance_rows, task_rows, form_rows, kv_rows
 
 
 class ApprovalRepository:
     """审批数据仓储类，专职负责数据库写入"""
 
-    def __init__(self):
-        # 初始化时获取一个数据库连接
-        # 所有方法共用该连接
-        self.conn = get_conn()
+    def __init__(self, pool=None):
+        # 不再长期持有连接：每次写入从连接池借用，用完立即归还
+        self.pool = pool or get_pool()
+
+        # unit_of_work 期间共用的连接（同一个仓储对象不要跨线程使用）
+        self._tx_conn = None
+
+    @contextmanager
+    def unit_of_work(self, lock_codes: List[str] = ()):
+        """
+        工作单元：块内所有写入共用一个连接、一个事务，结束时只提交一次
+
+            with repo.unit_of_work():
+                repo.save_raw_data(...)
+                repo.save_instance(...)
+                ...
+
+        - 块内抛出异常时整体回滚，不会出现只写了一半的审批实例
+        - 可以嵌套，内层并入最外层事务（用于把多个实例合并到一个事务）
+        - lock_codes：事务开始前获取这些实例的跨进程锁（GET_LOCK），提交后释放，
+          多个进程 / worker 对同一实例的读取-对比-写入因此串行（只在最外层生效）
+        """
+        if self._tx_conn is not None:
+            yield self._tx_conn
+            return
+
+        # 不用 pool.connection()：释放锁失败时需要丢弃连接
+        conn = self.pool.acquire()
+        discard = False
+        locked = False
+        try:
+            locked = self._lock_instances(conn, lock_codes)
+            # 连接本身是 autocommit，这里显式 BEGIN 开启事务
+            conn.begin()
+            self._tx_conn = conn
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._tx_conn = None
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            if locked and not discard and not self._release_instance_locks(conn, lock_codes):
+                discard = True
+            self.pool.release(conn, discard=discard)
+
+    @staticmethod
+    def _release_instance_locks(conn, instance_codes: List[str]) -> bool:
+        """
+        释放本连接持有的实例锁，返回是否成功
+
+        失败时不抛出（事务已提交 / 回滚，不能让调用方误以为写入失败），
+        由调用方丢弃连接：连接断开后 MySQL 会释放它持有的全部锁，避免锁随连接回到池中
+        """
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_RELEASE_INSTANCE_LOCKS)
+            return True
+        except Exception as e:
+            logger.warning(
+                "释放实例锁失败，丢弃连接：%s", e,
+                extra=fields(instance_code=",".join(list(instance_codes)[:10])),
+            )
+            return False
+
+    @staticmethod
+    def _lock_instances(conn, instance_codes: List[str]) -> bool:
+        """
+        获取实例锁，返回是否加了锁；超时抛出 RuntimeError（由上层重试）
+        """
+        if not instance_codes or INSTANCE_LOCK_BACKEND != "mysql":
+            return False
+
+        names, params = instance_lock_params(instance_codes)
+        with conn.cursor() as cursor:
+            cursor.execute(instance_lock_sql(len(names)), params)
+            row = cursor.fetchone() or {}
+
+        if not all(v == 1 for v in row.values()):
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_RELEASE_INSTANCE_LOCKS)
+            raise RuntimeError(f"等待审批实例锁超时（{INSTANCE_LOCK_TIMEOUT}s）：{names}")
+
+        return True
+
+    @contextmanager
+    def named_lock(self, name: str, timeout: int = 0):
+        """
+        跨进程的命名锁（GET_LOCK），yield 是否拿到锁；用于保证同一时刻只有一个进程执行某个后台任务
+
+            with repo.named_lock("lark_approval:reconcile") as locked:
+                if locked: ...
+
+        INSTANCE_LOCK=none 时不加锁，直接 yield True
+        """
+        if INSTANCE_LOCK_BACKEND != "mysql":
+            yield True
+            return
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (name, timeout))
+                row = cursor.fetchone() or {}
+            locked = row.get("locked") == 1
+            try:
+                yield locked
+            finally:
+                if locked:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+
+    @contextmanager
+    def _connection(self):
+        """
+        获取写入用的连接：
+        - 在 unit_of_work 中：复用事务连接
+        - 否则：从连接池借用一个连接，块结束后归还
+        """
+        if self._tx_conn is not None:
+            yield self._tx_conn
+            return
+
+        with self.pool.connection() as conn:
+            yield conn
+
+    def _commit(self, conn) -> None:
+        """
+        单独调用时立即提交；在 unit_of_work 中由工作单元统一提交
+        """
+        if self._tx_conn is None:
+            conn.commit()
+
+    @staticmethod
+    def _executemany(conn, sql: str, params: List[Tuple]) -> None:
+        """
+        多行写入：一条 INSERT 带多组 VALUES，超过 BULK_MAX_BYTES 自动切分
+        """
+        if not params:
+            return
+
+        with conn.cursor() as cursor:
+            cursor.max_stmt_length = BULK_MAX_BYTES
+            cursor.executemany(sql, params)
 
     # =========================
     # 1. 原始审批数据表
     # =========================
-    def save_raw_data(self, instance_code: str, raw_data: Dict[str, Any]):
+    @timed()
+    def save_raw_data(self, instance_code: str, raw_data: Dict[str, Any], version: int = None):
         """
         保存审批实例的原始 JSON 数据
         - instance_code：审批实例唯一标识
         - raw_data：Lark 返回的完整审批数据
+        - version：快照版本，低于已入库版本时不覆盖
         """
 
-        sql = """
-        INSERT INTO lark_approval_raw (
-            instance_code,      -- 审批实例 code（唯一键）
-            approval_code,      -- 审批定义 code
-            status,             -- 审批状态
-            event_type,         -- 事件类型（固定值）
-            raw_json            -- 原始 JSON 数据
-        )
-        VALUES (%s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            status = VALUES(status),          -- 实例状态更新
-            event_type = VALUES(event_type),  -- 事件类型更新
-            raw_json = VALUES(raw_json)       -- 原始 JSON 覆盖更新
-        """
-
-        # 使用游标执行 SQL
-        with self.conn.cursor() as cursor:
-            cursor.execute(
-                sql,
-                (
-                    instance_code,                         # 审批实例 code
-                    raw_data.get("approval_code"),         # 审批定义 code
-                    raw_data.get("status"),                # 审批状态
-                    "approval_instance",                   # 固定事件类型
-                    json.dumps(raw_data, ensure_ascii=False),  # JSON 序列化
-                ),
-            )
+        with self._connection() as conn:
+            # 使用游标执行 SQL
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_SAVE_RAW, raw_params(instance_code, raw_data, version=version))
 
-        # 提交事务
-        self.conn.commit()
+            # 提交事务
+            self._commit(conn)
 
     # =========================
     # 2. 审批实例主表
     # =========================
+    @timed()
     def save_instance(self, instance: Dict[str, Any]):
         """
         保存审批实例基础信息
         - instance：已经解析好的实例字段字典
         """
 
-        sql = """
-        INSERT INTO lark_approval_instance (
-            instance_code,       -- 审批实例 code
-            approval_code,       -- 审批定义 code
-            approval_name,       -- 审批名称
-            status,              -- 当前状态
-            applicant_user_id,   -- 申请人用户 ID
-            department_id,       -- 申请人部门 ID
-            start_time,          -- 审批开始时间
-            end_time,            -- 审批结束时间
-            create_time,         -- 创建时间
-            update_time          -- 更新时间
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON DUPLICATE KEY UPDATE
-            status = VALUES(status),          -- 状态更新
-            end_time = VALUES(end_time),      -- 结束时间更新
-            update_time = VALUES(update_time) -- 更新时间更新
-        """
-
-        with self.conn.cursor() as cursor:
-            cursor.execute(
-                sql,
-                (
-                    instance.get("instance_code"),       # 实例 code
-                    instance.get("approval_code"),       # 审批 code
-                    instance.get("approval_name"),       # 审批名称
-                    instance.get("status"),              # 状态
-                    instance.get("applicant_user_id"),   # 申请人
-                    instance.get("department_id"),       # 部门
-                    instance.get("start_time"),          # 开始时间
-                    instance.get("end_time"),            # 结束时间
-                    instance.get("create_time"),         # 创建时间
-                    instance.get("update_time"),         # 更新时间
-                ),
-            )
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_SAVE_INSTANCE, instance_params(instance))
 
-        self.conn.commit()
+            self._commit(conn)
 
     # =========================
     # 3. 审批任务节点表
     # =========================
-    def save_tasks(self, instance_code: str, tasks: List[Dict[str, Any]]):
+    @timed()
+    def save_tasks(self, instance_code: str, tasks: List[Dict[str, Any]], version: int = None):
         """
-        保存审批流程中的任务节点
+        保存审批流程中的任务节点（多行写入）
         - instance_code：所属审批实例
         - tasks：任务节点列表
+        - version：所属实例快照版本，低于已入库版本的任务不覆盖
         """
 
         # 没有任务直接返回
         if not tasks:
             return
 
-        sql = """
-        INSERT INTO lark_approval_task (
-            task_id,         -- 任务 ID（唯一）
-            instance_code,   -- 审批实例 code
-            node_id,         -- 流程节点 ID
-            node_name,       -- 节点名称
-            node_type,       -- 节点类型
-            user_id,         -- 处理人 user_id
-            open_id,         -- 处理人 open_id
-            status,          -- 任务状态
-            start_time,      -- 任务开始时间
-            end_time         -- 任务结束时间
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON DUPLICATE KEY UPDATE
-            status = VALUES(status),     -- 状态更新
-            end_time = VALUES(end_time)  -- 结束时间更新
-        """
-
-        with self.conn.cursor() as cursor:
-            for task in tasks:
-                cursor.execute(
-                    sql,
-                    (
-                        task.get("id"),           # 任务 ID
-                        instance_code,             # 实例 code
-                        task.get("node_id"),       # 节点 ID
-                        task.get("node_name"),     # 节点名
-                        task.get("type"),          # 节点类型
-                        task.get("user_id"),       # 用户 ID
-                        task.get("open_id"),       # open_id
-                        task.get("status"),        # 状态
-                        task.get("start_time"),    # 开始时间
-                        task.get("end_time"),      # 结束时间
-                    ),
-                )
-
-        self.conn.commit()
+        with self._connection() as conn:
+            self._executemany(
+                conn,
+                SQL_SAVE_TASK,
+                [task_params(instance_code, task, version) for task in tasks],
+            )
+            self._commit(conn)
 
     # =========================
     # 4. 表单字段原始表
     # =========================
+    @timed()
     def save_form_fields(self, instance_code: str, fields: List[Dict[str, Any]]):
         """
-        保存审批表单的原始字段数据
+        保存审批表单的原始字段数据（多行写入）
         - instance_code：审批实例
         - fields：表单字段列表
         """
@@ -176,76 +681,265 @@ class ApprovalRepository:
         if not fields:
             return
 
-        sql = """
-        INSERT INTO lark_approval_form_field (
-            instance_code,  -- 审批实例 code
-            field_id,       -- 字段 ID
-            field_name,     -- 字段名称
-            field_type,     -- 字段类型
-            field_value     -- 原始字段值
-        )
-        VALUES (%s,%s,%s,%s,%s)
-        ON DUPLICATE KEY UPDATE
-            field_value = VALUES(field_value) -- 字段值更新
-        """
-
-        with self.conn.cursor() as cursor:
-            for field in fields:
-                cursor.execute(
-                    sql,
-                    (
-                        instance_code,             # 实例 code
-                        field["field_id"],         # 字段 ID
-                        field["field_name"],       # 字段名
-                        field["field_type"],       # 字段类型
-                        field["field_value"],      # 字段值
-                    ),
-                )
-
-        self.conn.commit()
+        with self._connection() as conn:
+            self._executemany(
+                conn,
+                SQL_SAVE_FORM_FIELD,
+                [form_field_params(instance_code, field) for field in fields],
+            )
+            self._commit(conn)
 
     # =========================
     # 5. 表单字段 KV 拆解表
     # =========================
+    @timed()
     def save_field_kv(self, rows: List[Dict[str, Any]]):
         """
-        保存表单字段拆解后的 KV 数据
+        保存表单字段拆解后的 KV 数据（多行 upsert，按 approval_id + row_id + widget_id 幂等）
         - rows：已经拆好的 KV 行数据
         """
 
         if not rows:
             return
 
-        sql = """
-        INSERT INTO lark_approval_field_kv (
-            approval_id,        -- 审批实例 ID
-            row_id,             -- 明细行 ID
-            widget_id,          -- 控件 ID
-            field_name,         -- 字段名称
-            field_type,         -- 字段类型
-            field_value_text,   -- 文本值
-            field_value_num,    -- 数值
-            currency,           -- 币种
-            extra_json          -- 额外 JSON 数据
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """
-
-        with self.conn.cursor() as cursor:
-            for r in rows:
-                cursor.execute(
-                    sql,
-                    (
-                        r.get("approval_id"),        # 审批 ID
-                        r.get("row_id"),             # 行 ID
-                        r.get("widget_id"),          # 控件 ID
-                        r.get("field_name"),         # 字段名
-                        r.get("field_type"),         # 类型
-                        r.get("field_value_text"),   # 文本值
-                        r.get("field_value_num"),    # 数值
-                        r.get("currency"),           # 币种
-                        r.get("extra_json"),          # 扩展 JSON
-                    ),
+        with self._connection() as conn:
+            self._executemany(
+                conn,
+                SQL_SAVE_FIELD_KV,
+                [field_kv_params(r) for r in rows],
+            )
+            self._commit(conn)
+
+    @timed()
+    def sync_field_kv(self, rows_by_instance: Dict[str, List[Dict[str, Any]]]):
+        """
+        把实例的 KV 行同步为给定内容（可一次同步多个实例）
+        - rows_by_instance：{instance_code: 该实例完整的 KV 行}，空列表表示删除该实例全部 KV 行
+
+        先查出已有行做对比，再批量：
+        - 插入新增行 / 更新有变化的行（一条多行 upsert）
+        - 删除已不存在的行（一条 DELETE）
+        内容没有变化的行不会产生任何写入
+        """
+
+        if not rows_by_instance:
+            return
+
+        codes = list(rows_by_instance)
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(field_kv_select_sql(len(codes)), codes)
+                existing_rows = cursor.fetchall()
+
+            upserts, deletes = diff_field_kv(rows_by_instance, existing_rows)
+
+            self._executemany(conn, SQL_SAVE_FIELD_KV, upserts)
+
+            if deletes:
+                with conn.cursor() as cursor:
+                    cursor.execute(field_kv_delete_sql(len(deletes)), [v for k in deletes for v in k])
+
+            self._commit(conn)
+
+    @timed()
+    def save_attachment_keys(
+        self,
+        instance_code: str,
+        row_id: str,
+        widget_id: str,
+        keys: List[Optional[str]],
+        form_hash: Optional[str],
+    ) -> bool:
+        """
+        把附件 / 图片转存后的对象 key 写回 KV 行（attachment_keys，与字段值中的 URL 一一对应，失败为 null）
+        - form_hash：下载时实例的 form 指纹，已被新快照覆盖时不写入
+        - 返回是否写入
+        """
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                updated = cursor.execute(
+                    SQL_SAVE_ATTACHMENT_KEYS,
+                    (json_codec.dumps(keys), instance_code, row_id, widget_id, form_hash),
                 )
+            self._commit(conn)
+
+        return updated > 0
+
+    # =========================
+    # 6. 内容指纹
+    # =========================
+    def get_fingerprints(self, instance_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        查询已入库实例的内容指纹
+        - 返回 {instance_code: {instance_hash, tasks_hash, form_hash, version}}，未入库的实例不在结果中
+        """
+
+        if not instance_codes:
+            return {}
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(fingerprint_select_sql(len(instance_codes)), instance_codes)
+                rows = cursor.fetchall()
+
+        return {r["instance_code"]: r for r in rows}
+
+    def mark_refreshed(self, instance_codes: List[str]):
+        """
+        拉取后内容未变化（未重写实例主表）的实例，只刷新 refreshed_at
+        """
+        if not instance_codes:
+            return
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(mark_refreshed_sql(len(instance_codes)), instance_codes)
+            self._commit(conn)
+
+    # =========================
+    # 7. 对账
+    # =========================
+    def get_stale_instances(
+        self,
+        statuses: List[str],
+        stale_after: int,
+        limit: int,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        查询处于 statuses（未结束）且超过 stale_after 秒未从飞书刷新的实例，最久未刷新的在前
+        - after：上一页最后一行的 (refreshed_at, instance_code)，用于同一轮对账内翻页
+        - 返回 [{instance_code, status, refreshed_at}]
+        """
+        if not statuses or limit <= 0:
+            return []
+
+        params: List[Any] = [*statuses, stale_after]
+        if after is not None:
+            params.extend((after[0], after[0], after[1]))
+        params.append(limit)
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(stale_instances_sql(len(statuses), after is not None), params)
+                return list(cursor.fetchall())
+
+    # =========================
+    # 8. 跨实例批量写入
+    # =========================
+    @timed()
+    def save_batch(self, bundles: List[Dict[str, Any]]):
+        """
+        一次写入多个审批实例，供批量导入 / 历史回填 / 积压消化使用
+
+        所有实例在同一个事务中提交；每张表只发一条（超长时自动切分的）多行 INSERT。
+        bundles 中每一项为（值为 None / 空列表的部分不写）：
+        - instance_code：审批实例 code
+        - raw_data：Lark 返回的完整审批数据
+        - raw_json：raw_data 已序列化的 JSON（可选，传入时不再重复序列化）
+        - instance：实例主表字段（同 save_instance）
+        - tasks：任务节点列表（同 save_tasks）
+        - form_fields：表单字段列表（同 save_form_fields）
+        - kv_rows：该实例完整的 KV 行（同 sync_field_kv，None 表示不同步，空列表表示清空）
+        - version：快照版本（raw / instance / task 表按版本守卫，旧快照不覆盖新快照）
+
+        写入实例主表的同时在同一事务内增量维护金额汇总表（见 sync_amount_agg）
+        """
 
-        self.conn.commit()
+        if not bundles:
+            return
+
+        raw_rows, instance_rows, task_rows, form_rows, kv_rows = batch_params(bundles)
+
+        # 所有实例在同一个事务中写入，只提交一次
+        # 每张表的耗时记在与 save_* 相同的阶段名下
+        with self.unit_of_work() as conn:
+            with stage("save_raw_data"):
+                self._executemany(conn, SQL_SAVE_RAW, raw_rows)
+            with stage("save_instance"):
+                self._executemany(conn, SQL_SAVE_INSTANCE, instance_rows)
+            with stage("save_tasks"):
+                self._executemany(conn, SQL_SAVE_TASK, task_rows)
+            with stage("save_form_fields"):
+                self._executemany(conn, SQL_SAVE_FORM_FIELD, form_rows)
+            self.sync_field_kv(kv_rows)
+            self.sync_amount_agg(bundles)
+
+    # =========================
+    # 9. 金额汇总表
+    # =========================
+    @timed()
+    def sync_amount_agg(self, bundles: List[Dict[str, Any]]):
+        """
+        按本次写入的实例增量更新金额汇总表（格式同 save_batch 的 bundles，只处理带 instance 的项）
+
+        读出实例原有的贡献行（FOR UPDATE），旧贡献减去、新贡献加上后只写净变化；
+        调用方需持有实例锁（save_batch 由上层的 unit_of_work(lock_codes) 保证），
+        否则并发写同一实例时贡献行可能被重复计算
+        """
+        if not AMOUNT_AGG_ENABLED:
+            return
+
+        codes = [b["instance_code"] for b in bundles if b.get("instance")]
+        if not codes:
+            return
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(contrib_select_sql(len(codes)), codes)
+                existing_rows = cursor.fetchall()
+
+            deltas, upserts, deletes = diff_amount_contrib(bundles, existing_rows)
+
+            # deltas 已按汇总键排序：并发事务对汇总行加锁的顺序一致，不会互相死锁
+            self._executemany(conn, SQL_APPLY_AMOUNT_AGG, deltas)
+            self._executemany(conn, SQL_SAVE_AMOUNT_CONTRIB, upserts)
+
+            if deletes:
+                with conn.cursor() as cursor:
+                    cursor.execute(contrib_delete_sql(len(deletes)), [v for k in deletes for v in k])
+
+            self._commit(conn)
+
+    def list_instance_codes(self, after: str = "", limit: int = 200) -> List[str]:
+        """
+        按 instance_code 顺序翻页列出已入库的实例（重建汇总表等离线任务使用）
+        """
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_LIST_INSTANCE_CODES, (after, limit))
+                return [r["instance_code"] for r in cursor.fetchall()]
+
+    def get_amount_sources(self, instance_codes: List[str]) -> List[Dict[str, Any]]:
+        """
+        从实例主表和 KV 表读出重新计算金额贡献所需的数据，返回 sync_amount_agg 可直接使用的 bundles
+        """
+        if not instance_codes:
+            return []
+
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(amount_source_instance_sql(len(instance_codes)), instance_codes)
+                instances = cursor.fetchall()
+                cursor.execute(field_kv_select_sql(len(instance_codes)), instance_codes)
+                kv_rows = cursor.fetchall()
+
+        rows_by_instance: Dict[str, List[Dict[str, Any]]] = {r["instance_code"]: [] for r in instances}
+        for r in kv_rows:
+            if r["approval_id"] in rows_by_instance:
+                rows_by_instance[r["approval_id"]].append(r)
+
+        return [
+            {"instance_code": r["instance_code"], "instance": r, "kv_rows": rows_by_instance[r["instance_code"]]}
+            for r in instances
+        ]
+
+    def reset_amount_agg(self):
+        """
+        清空金额汇总表和贡献行（全量重建前使用，执行期间不能有写入）
+        """
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("TRUNCATE TABLE lark_approval_amount_agg")
+                cursor.execute("TRUNCATE TABLE lark_approval_amount_contrib")
@@ -0,0 +1,276 @@
+"""
+审批数据仓储层（asyncio 版，aiomysql）
+
+与 ApprovalRepository 共用 SQL 语句、参数构建和 KV 对比逻辑，写入结果完全一致；
+区别只在于等待数据库时让出事件循环。
+
+事务连接保存在 ContextVar 中，每个协程（任务）各自独立，
+因此同一个仓储对象可以被多个并发的回调协程共用。
+"""
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.mysql_async import async_connection
+from app.repository.amount_agg import (
+    AMOUNT_AGG_ENABLED,
+    SQL_APPLY_AMOUNT_AGG,
+    SQL_SAVE_AMOUNT_CONTRIB,
+    contrib_delete_sql,
+    contrib_select_sql,
+    diff_amount_contrib,
+)
+from app.repository.approval_repo import (
+    BULK_MAX_BYTES,
+    INSTANCE_LOCK_BACKEND,
+    INSTANCE_LOCK_TIMEOUT,
+    SQL_RELEASE_INSTANCE_LOCKS,
+    SQL_SAVE_FIELD_KV,
+    SQL_SAVE_FORM_FIELD,
+    SQL_SAVE_INSTANCE,
+    SQL_SAVE_RAW,
+    SQL_SAVE_TASK,
+    batch_params,
+    diff_field_kv,
+    field_kv_delete_sql,
+    field_kv_params,
+    field_kv_select_sql,
+    fingerprint_select_sql,
+    instance_lock_params,
+    instance_lock_sql,
+    mark_refreshed_sql,
+)
+from app.utils.log import fields, get_logger
+from app.utils.metrics import stage, timed
+
+logger = get_logger(__name__)
+
+
+# 当前协程 unit_of_work 中的事务连接（ContextVar 应为模块级对象，不随仓储对象创建）
+_tx_conn_var: ContextVar[Optional[Any]] = ContextVar("approval_repo_tx_conn", default=None)
+
+
+class AsyncApprovalRepository:
+    """审批数据仓储类（异步），专职负责数据库写入"""
+
+    def __init__(self):
+        self._tx_conn = _tx_conn_var
+
+    @asynccontextmanager
+    async def unit_of_work(self, lock_codes: List[str] = ()):
+        """
+        工作单元：块内所有写入共用一个连接、一个事务，结束时只提交一次（可嵌套）
+        lock_codes 含义同 ApprovalRepository.unit_of_work
+
+            async with repo.unit_of_work([instance_code]):
+                await repo.save_batch(...)
+        """
+        conn = self._tx_conn.get()
+        if conn is not None:
+            yield conn
+            return
+
+        async with async_connection() as conn:
+            locked = await self._lock_instances(conn, lock_codes)
+            try:
+                await conn.begin()
+                token = self._tx_conn.set(conn)
+                try:
+                    yield conn
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                finally:
+                    self._tx_conn.reset(token)
+            finally:
+                if locked:
+                    await self._release_instance_locks(conn, lock_codes)
+
+    @staticmethod
+    async def _release_instance_locks(conn, instance_codes: List[str]) -> None:
+        """
+        释放实例锁；失败时记录日志并关闭连接（aiomysql 不会把已关闭的连接放回池中，
+        连接断开后 MySQL 释放它持有的全部锁），不向调用方抛出
+        """
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(SQL_RELEASE_INSTANCE_LOCKS)
+        except Exception as e:
+            logger.warning(
+                "释放实例锁失败，丢弃连接：%s", e,
+                extra=fields(instance_code=",".join(list(instance_codes)[:10])),
+            )
+            conn.close()
+
+    @staticmethod
+    async def _lock_instances(conn, instance_codes: List[str]) -> bool:
+        if not instance_codes or INSTANCE_LOCK_BACKEND != "mysql":
+            return False
+
+        names, params = instance_lock_params(instance_codes)
+        async with conn.cursor() as cursor:
+            await cursor.execute(instance_lock_sql(len(names)), params)
+            row = await cursor.fetchone() or {}
+
+        if not all(v == 1 for v in row.values()):
+            async with conn.cursor() as cursor:
+                await cursor.execute(SQL_RELEASE_INSTANCE_LOCKS)
+            raise RuntimeError(f"等待审批实例锁超时（{INSTANCE_LOCK_TIMEOUT}s）：{names}")
+
+        return True
+
+    @asynccontextmanager
+    async def _connection(self):
+        conn = self._tx_conn.get()
+        if conn is not None:
+            yield conn
+            return
+
+        async with async_connection() as conn:
+            yield conn
+
+    async def _commit(self, conn) -> None:
+        if self._tx_conn.get() is None:
+            await conn.commit()
+
+    @staticmethod
+    async def _executemany(conn, sql: str, params: List[Tuple]) -> None:
+        if not params:
+            return
+
+        async with conn.cursor() as cursor:
+            cursor.max_stmt_length = BULK_MAX_BYTES
+            await cursor.executemany(sql, params)
+
+    # =========================
+    # 单表写入（与同步版同名方法含义一致；耗时记在 save_batch 内同名阶段下）
+    # =========================
+    async def save_raw_data(self, instance_code: str, raw_data: Dict[str, Any], version: int = None):
+        await self.save_batch([{"instance_code": instance_code, "raw_data": raw_data, "version": version}])
+
+    async def save_instance(self, instance: Dict[str, Any]):
+        await self.save_batch([{"instance_code": instance.get("instance_code"), "instance": instance}])
+
+    async def save_tasks(self, instance_code: str, tasks: List[Dict[str, Any]], version: int = None):
+        await self.save_batch([{"instance_code": instance_code, "tasks": tasks, "version": version}])
+
+    async def save_form_fields(self, instance_code: str, fields: List[Dict[str, Any]]):
+        await self.save_batch([{"instance_code": instance_code, "form_fields": fields}])
+
+    @timed()
+    async def save_field_kv(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+
+        async with self._connection() as conn:
+            await self._executemany(conn, SQL_SAVE_FIELD_KV, [field_kv_params(r) for r in rows])
+            await self._commit(conn)
+
+    @timed()
+    async def sync_field_kv(self, rows_by_instance: Dict[str, List[Dict[str, Any]]]):
+        """
+        把实例的 KV 行同步为给定内容，规则同 ApprovalRepository.sync_field_kv
+        """
+        if not rows_by_instance:
+            return
+
+        codes = list(rows_by_instance)
+
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(field_kv_select_sql(len(codes)), codes)
+                existing_rows = await cursor.fetchall()
+
+            upserts, deletes = diff_field_kv(rows_by_instance, existing_rows)
+
+            await self._executemany(conn, SQL_SAVE_FIELD_KV, upserts)
+
+            if deletes:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(field_kv_delete_sql(len(deletes)), [v for k in deletes for v in k])
+
+            await self._commit(conn)
+
+    # =========================
+    # 内容指纹
+    # =========================
+    async def get_fingerprints(self, instance_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not instance_codes:
+            return {}
+
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(fingerprint_select_sql(len(instance_codes)), instance_codes)
+                rows = await cursor.fetchall()
+
+        return {r["instance_code"]: r for r in rows}
+
+    async def mark_refreshed(self, instance_codes: List[str]):
+        """
+        同 ApprovalRepository.mark_refreshed
+        """
+        if not instance_codes:
+            return
+
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(mark_refreshed_sql(len(instance_codes)), instance_codes)
+            await self._commit(conn)
+
+    # =========================
+    # 跨实例批量写入
+    # =========================
+    @timed()
+    async def save_batch(self, bundles: List[Dict[str, Any]]):
+        """
+        一次写入多个审批实例，bundles 格式同 ApprovalRepository.save_batch
+        """
+        if not bundles:
+            return
+
+        raw_rows, instance_rows, task_rows, form_rows, kv_rows = batch_params(bundles)
+
+        async with self.unit_of_work() as conn:
+            with stage("save_raw_data"):
+                await self._executemany(conn, SQL_SAVE_RAW, raw_rows)
+            with stage("save_instance"):
+                await self._executemany(conn, SQL_SAVE_INSTANCE, instance_rows)
+            with stage("save_tasks"):
+                await self._executemany(conn, SQL_SAVE_TASK, task_rows)
+            with stage("save_form_fields"):
+                await self._executemany(conn, SQL_SAVE_FORM_FIELD, form_rows)
+            await self.sync_field_kv(kv_rows)
+            await self.sync_amount_agg(bundles)
+
+    # =========================
+    # 金额汇总表
+    # =========================
+    @timed()
+    async def sync_amount_agg(self, bundles: List[Dict[str, Any]]):
+        """
+        增量更新金额汇总表，规则同 ApprovalRepository.sync_amount_agg
+        """
+        if not AMOUNT_AGG_ENABLED:
+            return
+
+        codes = [b["instance_code"] for b in bundles if b.get("instance")]
+        if not codes:
+            return
+
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(contrib_select_sql(len(codes)), codes)
+                existing_rows = await cursor.fetchall()
+
+            deltas, upserts, deletes = diff_amount_contrib(bundles, existing_rows)
+
+            await self._executemany(conn, SQL_APPLY_AMOUNT_AGG, deltas)
+            await self._executemany(conn, SQL_SAVE_AMOUNT_CONTRIB, upserts)
+
+            if deletes:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(contrib_delete_sql(len(deletes)), [v for k in deletes for v in k])
+
+            await self._commit(conn)
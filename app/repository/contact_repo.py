@@ -0,0 +1,72 @@
+"""
+通讯录维表的仓储层（Repository）
+
+职责：
+- 按 ID 批量读取近期解析过的用户 / 部门名称
+- 写入（刷新）飞书返回的名称
+"""
+
+from typing import Dict, List  # 类型注解
+from app.db.mysql import get_pool  # MySQL 连接池
+
+
+class ContactDimRepository:
+    """通讯录维表（lark_contact_dim）读写，kind 为 user / department"""
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+
+    def get_names(self, kind: str, ids: List[str], max_age: int) -> Dict[str, str]:
+        """
+        返回最近 max_age 秒内刷新过的 {ID: 名称}
+        """
+        if not ids:
+            return {}
+
+        placeholders = ",".join(["%s"] * len(ids))
+        sql = f"""
+        SELECT contact_id, name
+        FROM lark_contact_dim
+        WHERE kind = %s
+          AND contact_id IN ({placeholders})
+          AND updated_at >= NOW() - INTERVAL %s SECOND
+        """
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, (kind, *ids, max_age))
+                rows = cursor.fetchall()
+
+        return {r["contact_id"]: r["name"] for r in rows}
+
+    def save(self, kind: str, items: Dict[str, dict]) -> None:
+        """
+        写入飞书返回的用户 / 部门信息（已存在则刷新名称和时间）
+        """
+        if not items:
+            return
+
+        sql = """
+        INSERT INTO lark_contact_dim (
+            kind,          -- user / department
+            contact_id,    -- user_id / department_id
+            name,          -- 名称
+            en_name,       -- 英文名
+            updated_at     -- 最近一次从飞书刷新的时间
+        )
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name),
+            en_name = VALUES(en_name),
+            updated_at = VALUES(updated_at)
+        """
+
+        params = [
+            (kind, contact_id, item.get("name"), item.get("en_name"))
+            for contact_id, item in items.items()
+        ]
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany(sql, params)
+            conn.commit()
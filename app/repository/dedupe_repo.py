@@ -0,0 +1,78 @@
+"""
+回调去重表的仓储层（Repository）
+
+职责：
+- 查询去重键是否在有效期内处理过
+- 记录处理成功的去重键
+- 清理过期记录
+"""
+
+from typing import List  # 类型注解
+from app.db.mysql import get_pool  # MySQL 连接池
+
+
+class CallbackDedupeRepository:
+    """回调去重表（lark_approval_callback_dedupe）读写"""
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+
+    def any_seen(self, keys: List[str], window: int) -> bool:
+        """
+        keys 中任意一个在最近 window 秒内处理过，返回 True
+        """
+        if not keys:
+            return False
+
+        placeholders = ",".join(["%s"] * len(keys))
+        sql = f"""
+        SELECT 1
+        FROM lark_approval_callback_dedupe
+        WHERE dedupe_key IN ({placeholders})
+          AND created_at >= NOW() - INTERVAL %s SECOND
+        LIMIT 1
+        """
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, (*keys, window))
+                return cursor.fetchone() is not None
+
+    def mark(self, keys: List[str], instance_code: str) -> None:
+        """
+        记录处理成功的去重键（已存在则刷新时间）
+        """
+        if not keys:
+            return
+
+        sql = """
+        INSERT INTO lark_approval_callback_dedupe (
+            dedupe_key,     -- 去重键
+            instance_code,  -- 审批实例 code
+            created_at      -- 处理时间
+        )
+        VALUES (%s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            created_at = VALUES(created_at)
+        """
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany(sql, [(k, instance_code) for k in keys])
+            conn.commit()
+
+    def purge(self, window: int) -> int:
+        """
+        删除超过 window 秒的记录，返回删除行数
+        """
+        sql = """
+        DELETE FROM lark_approval_callback_dedupe
+        WHERE created_at < NOW() - INTERVAL %s SECOND
+        """
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                deleted = cursor.execute(sql, (window,))
+            conn.commit()
+
+        return deleted
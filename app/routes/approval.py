@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Request  # FastAPI 路由与请求对象
 from fastapi.responses import JSONResponse  # 用于返回 JSON 响应
+from starlette.concurrency import run_in_threadpool  # 同步代码放到线程池执行，避免阻塞事件循环
 import datetime  # 生成当前时间戳
-import traceback  # 打印完整异常堆栈，便于排查问题
 
 # 引入审批回调的业务服务层
 # Controller 层不直接处理业务逻辑
 from app.services.approval_service import ApprovalService
+from app.services.callback_worker import get_callback_pool, callback_mode
+from app.utils.log import dump_payload, fields, get_logger
+
+logger = get_logger(__name__)
 
 # 创建路由对象，供 main.py 引入注册
 router = APIRouter()
@@ -20,28 +24,47 @@ async def approval_callback(request: Request):
     1. 接收并读取飞书回调的原始 JSON
     2. 做最基础的数据存在性校验
     3. 将完整数据交给 Service 层处理
+
+    入队模式（默认）下只入队不处理，由后台 Worker 完成 拉取 → 解析 → 入库，
+    飞书可以在几毫秒内拿到 200，避免超时重推
     """
     try:
         # 读取 HTTP 请求体中的 JSON 数据
         data = await request.json()
 
-        # 打印原始回调内容，便于调试和问题追溯
-        print("\n==== 收到审批回调（原始） ====")
-        print(data)
-        print("=================================\n")
-
         # 从回调数据中获取审批实例 code
         instance_code = data.get("instance_code")
 
+        # 按采样输出原始回调内容（DEBUG），便于调试和问题追溯
+        dump_payload(logger, "收到审批回调（原始）", data, instance_code=instance_code)
+
         # 如果没有 instance_code，说明不是有效的审批回调
         if not instance_code:
             raise ValueError("回调数据中缺少 instance_code")
 
-        # 实例化审批业务服务
-        service = ApprovalService()
+        mode = callback_mode()
+
+        if mode == "queue":
+            # 入队，由后台 Worker 处理
+            if not get_callback_pool().submit(data):
+                # 队列已满 / 正在停机：返回 503，飞书稍后会重推
+                logger.warning("回调队列已满，返回 503", extra=fields(instance_code=instance_code))
+                return JSONResponse(
+                    status_code=503,
+                    content={
+                        "code": -1,
+                        "msg": "callback queue full",
+                    }
+                )
+        elif mode == "async":
+            # 异步模式：在事件循环中处理，等待飞书 / 数据库期间可以处理其它回调
+            await ApprovalService().aprocess_callback(data)
+        else:
+            # 同步模式：实例化审批业务服务，在线程池中处理
+            service = ApprovalService()
 
-        # 将原始回调数据交由 Service 层统一处理
-        service.process_callback(data)
+            # 将原始回调数据交由 Service 层统一处理
+            await run_in_threadpool(service.process_callback, data)
 
         # 正常处理完成，返回成功响应
         return JSONResponse(
@@ -54,12 +77,8 @@ async def approval_callback(request: Request):
         )
 
     except Exception as e:
-        # 捕获所有异常，避免回调接口直接崩溃
-        print("\n==== 回调处理异常 ====")
-        print(e)
-
-        # 打印完整异常堆栈信息
-        traceback.print_exc()
+        # 捕获所有异常，避免回调接口直接崩溃，记录完整异常堆栈
+        logger.exception("回调处理异常：%s", e)
 
         # 返回错误响应，飞书侧会记录失败
         return JSONResponse(
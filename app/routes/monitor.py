@@ -0,0 +1,125 @@
+from fastapi import APIRouter  # FastAPI 路由
+
+# 运行状态查询，供监控 / 排查使用
+from app.db.mysql import pool_stats
+from app.db.mysql_async import async_pool_stats
+from app.services.attachment_pipeline import get_attachment_pipeline
+from app.services.callback_worker import get_callback_pool
+from app.services.contact_resolver import get_contact_resolver
+from app.services.idempotency import get_idempotency_guard
+from app.services.rate_limiter import rate_limiter_stats
+from app.services.reconcile import get_reconcile_sweeper
+from app.utils.log import logging_stats
+
+# 创建路由对象，供 main.py 引入注册
+router = APIRouter(prefix="/monitor")
+
+
+@router.get("/callback-queue")
+def callback_queue_stats():
+    """
+    回调后台处理池状态：队列深度、处理中数量、成功 / 失败 / 重试次数
+    """
+    return get_callback_pool().stats()
+
+
+@router.get("/db-pool")
+def db_pool_stats():
+    """
+    数据库连接池状态：连接总数、空闲 / 借出数量、等待与超时次数
+    """
+    return pool_stats()
+
+
+@router.get("/idempotency")
+def idempotency_stats():
+    """
+    回调去重状态：命中 / 未命中次数、命中率、缓存条目数
+    """
+    return get_idempotency_guard().stats()
+
+
+@router.get("/contacts")
+def contact_stats():
+    """
+    名称解析状态：缓存命中率、维表命中 / 飞书查询 / 未解析 / 失败次数
+    """
+    return get_contact_resolver().stats()
+
+
+@router.get("/reconcile")
+def reconcile_stats():
+    """
+    对账任务状态：执行 / 跳过轮数，刷新 / 有变化 / 失败的实例数，最近一轮结果
+    """
+    return get_reconcile_sweeper().stats()
+
+
+@router.get("/attachments")
+def attachment_stats():
+    """
+    附件转存状态：队列深度，下载 / 去重 / 失败 / 丢弃数，写回 KV 行的次数
+    """
+    return get_attachment_pipeline().stats()
+
+
+@router.get("/rate-limit")
+def rate_limit_stats():
+    """
+    飞书接口限流状态：各接口当前速率、排队 / 等待时间、被限流次数
+    """
+    return rate_limiter_stats()
+
+
+# ----------------------------------------------------------------------
+# 导出为 Prometheus 指标（供 /metrics 使用）
+# ----------------------------------------------------------------------
+
+# 各组件 stats() 中的累计值，其余数值字段按 gauge 导出
+_COUNTER_FIELDS = {
+    "processed", "failed", "retried", "rejected",
+    "created_total", "closed_total", "checkouts", "waits", "timeouts", "ping_failures",
+    "hits", "misses", "acquired", "waited", "throttled", "wait_seconds_total", "dropped",
+    "dim_hits", "fetched", "unresolved", "failures", "coalesced", "flushed_groups",
+    "sweeps", "skipped", "refreshed", "changed",
+    "submitted", "downloaded", "deduped", "bytes_total", "recorded", "discarded",
+}
+
+
+def _stats_samples(prefix: str, stats, labels=None):
+    labels = labels or {}
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            continue
+        if key in _COUNTER_FIELDS:
+            name = key if key.endswith("_total") else f"{key}_total"
+            yield f"{prefix}_{name}", "counter", f"{prefix} {key}", labels, value
+        else:
+            yield f"{prefix}_{key}", "gauge", f"{prefix} {key}", labels, value
+
+
+def runtime_samples():
+    """
+    回调队列 / 连接池 / 去重 / 对账 / 附件转存 / 名称解析 / 限流 / 日志队列的当前状态
+    """
+    yield from _stats_samples("callback_queue", get_callback_pool().stats())
+    yield from _stats_samples("db_pool", pool_stats())
+    yield from _stats_samples("async_db_pool", async_pool_stats())
+
+    idempotency = get_idempotency_guard().stats()
+    yield from _stats_samples("idempotency", idempotency)
+    yield from _stats_samples("idempotency_cache", idempotency.get("cache") or {})
+
+    yield from _stats_samples("reconcile", get_reconcile_sweeper().stats())
+    yield from _stats_samples("attachments", get_attachment_pipeline().stats())
+
+    contacts = get_contact_resolver().stats()
+    yield from _stats_samples("contacts", contacts)
+    yield from _stats_samples("contacts_cache", contacts.get("cache") or {})
+
+    for endpoint, stats in rate_limiter_stats().items():
+        yield from _stats_samples("lark_rate_limit", stats, {"endpoint": endpoint})
+
+    yield from _stats_samples("log_queue", logging_stats())
@@ -0,0 +1,72 @@
+"""
+回填某个审批定义在时间窗口内的历史审批实例
+
+    python -m app.scripts.backfill --approval-code XXX --start 2024-01-01 --end 2024-02-01 \
+        [--concurrency 8] [--batch-size 50] [--checkpoint backfill.json] [--retry-failed]
+
+- 时间可以是日期（YYYY-MM-DD，按本地时区）或毫秒时间戳
+- 指定 --checkpoint 后，中断重跑会从上次完成的页继续
+- 飞书地址取自 LARK_BASE_URL，可以指向本地的假飞书服务
+"""
+
+import argparse
+import datetime
+import json
+
+from app.services.attachment_pipeline import get_attachment_pipeline
+from app.services.backfill import BackfillRunner
+from app.utils.log import setup_logging, shutdown_logging
+
+
+def _parse_time(value: str) -> int:
+    """
+    日期 / 毫秒时间戳 → 毫秒时间戳
+    """
+    if value.isdigit():
+        return int(value)
+    dt = datetime.datetime.strptime(value, "%Y-%m-%d")
+    return int(dt.timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填飞书历史审批实例")
+    parser.add_argument("--approval-code", required=True, help="审批定义 code")
+    parser.add_argument("--start", required=True, help="开始时间（YYYY-MM-DD 或毫秒时间戳）")
+    parser.add_argument("--end", required=True, help="结束时间（YYYY-MM-DD 或毫秒时间戳）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发拉取实例详情的线程数")
+    parser.add_argument("--batch-size", type=int, default=50, help="每个事务写入的实例数")
+    parser.add_argument("--page-size", type=int, default=100, help="实例列表每页条数")
+    parser.add_argument("--checkpoint", help="checkpoint 文件路径（用于续跑）")
+    parser.add_argument("--retry-failed", action="store_true", help="只重试 checkpoint 中失败的实例")
+    args = parser.parse_args()
+
+    setup_logging()
+    # 附件转存处理池需显式启动（ATTACHMENT_PIPELINE 未开启时什么也不做）
+    get_attachment_pipeline().start()
+    try:
+        report = _run(args)
+    finally:
+        # 等待已入队的附件转存完成（ATTACHMENT_PIPELINE 未开启时什么也不做）
+        get_attachment_pipeline().stop()
+        shutdown_logging()
+
+    # 汇总报告是命令的输出结果，直接写 stdout
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def _run(args):
+    runner = BackfillRunner(
+        approval_code=args.approval_code,
+        start_time=_parse_time(args.start),
+        end_time=_parse_time(args.end),
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        page_size=args.page_size,
+        checkpoint_path=args.checkpoint,
+    )
+
+    return runner.retry_failed() if args.retry_failed else runner.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+一次性整理 lark_approval_field_kv：删除重复行
+
+历史上 KV 表是纯 INSERT，每次回调都会追加一整份 KV 行。
+本脚本按 (approval_id, row_id, widget_id) 只保留 id 最大（最新）的一行，
+并把 row_id / widget_id 的 NULL 统一为空串，之后才能执行 sql/003_field_kv_unique.sql。
+
+按 approval_id 分批处理，每批一个事务，避免长时间锁表：
+
+    python -m app.scripts.compact_field_kv [--batch-size 200] [--dry-run]
+"""
+
+import argparse
+import time
+
+from app.db.mysql import get_pool
+from app.utils.log import fields, get_logger, setup_logging, shutdown_logging
+
+logger = get_logger(__name__)
+
+
+def _next_batch(conn, after: str, batch_size: int):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT DISTINCT approval_id
+            FROM lark_approval_field_kv
+            WHERE approval_id > %s
+            ORDER BY approval_id
+            LIMIT %s
+            """,
+            (after, batch_size),
+        )
+        return [r["approval_id"] for r in cursor.fetchall()]
+
+
+def _count_duplicates(conn, codes) -> int:
+    placeholders = ",".join(["%s"] * len(codes))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COALESCE(SUM(cnt - 1), 0) AS dup
+            FROM (
+                SELECT COUNT(*) AS cnt
+                FROM lark_approval_field_kv
+                WHERE approval_id IN ({placeholders})
+                GROUP BY approval_id, COALESCE(row_id, ''), COALESCE(widget_id, '')
+                HAVING COUNT(*) > 1
+            ) t
+            """,
+            codes,
+        )
+        return int(cursor.fetchone()["dup"])
+
+
+def _compact_batch(conn, codes) -> int:
+    placeholders = ",".join(["%s"] * len(codes))
+
+    conn.begin()
+    try:
+        with conn.cursor() as cursor:
+            # 每组只保留 id 最大的一行
+            deleted = cursor.execute(
+                f"""
+                DELETE kv
+                FROM lark_approval_field_kv kv
+                JOIN (
+                    SELECT approval_id,
+                           COALESCE(row_id, '') AS row_key,
+                           COALESCE(widget_id, '') AS widget_key,
+                           MAX(id) AS keep_id
+                    FROM lark_approval_field_kv
+                    WHERE approval_id IN ({placeholders})
+                    GROUP BY approval_id, COALESCE(row_id, ''), COALESCE(widget_id, '')
+                    HAVING COUNT(*) > 1
+                ) k
+                  ON kv.approval_id = k.approval_id
+                 AND COALESCE(kv.row_id, '') = k.row_key
+                 AND COALESCE(kv.widget_id, '') = k.widget_key
+                 AND kv.id < k.keep_id
+                """,
+                codes,
+            )
+
+            cursor.execute(
+                f"""
+                UPDATE lark_approval_field_kv
+                SET row_id = COALESCE(row_id, ''), widget_id = COALESCE(widget_id, '')
+                WHERE approval_id IN ({placeholders})
+                  AND (row_id IS NULL OR widget_id IS NULL)
+                """,
+                codes,
+            )
+
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return deleted
+
+
+def compact_field_kv(batch_size: int = 200, dry_run: bool = False) -> int:
+    """
+    整理 KV 表，返回删除（dry_run 时为将要删除）的行数
+    """
+    total = 0
+    batches = 0
+    after = ""
+    started = time.monotonic()
+
+    with get_pool().connection() as conn:
+        while True:
+            codes = _next_batch(conn, after, batch_size)
+            if not codes:
+                break
+
+            if dry_run:
+                total += _count_duplicates(conn, codes)
+            else:
+                total += _compact_batch(conn, codes)
+
+            batches += 1
+            after = codes[-1]
+            logger.info("整理进度", extra=fields(batch=batches, approval_id=after, duplicates=total))
+
+    action = "将删除" if dry_run else "已删除"
+    logger.info("完成：%s %d 行重复数据，耗时 %.1fs", action, total, time.monotonic() - started)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="删除 lark_approval_field_kv 中的重复行")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的 approval_id 数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        compact_field_kv(batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+回填 / 重建金额汇总表（lark_approval_amount_agg）
+
+执行 sql/008_amount_agg.sql 后回填已有数据，或修改 AMOUNT_AGG_FIELD_KEYS / AMOUNT_AGG_TZ 后重新计算：
+
+    python -m app.scripts.rebuild_amount_agg [--batch-size 200] [--reset]
+
+- 按 instance_code 分批，从实例主表和 KV 表重新计算每个实例的金额贡献，
+  与已有贡献行对比后只把增量写入汇总表；每批一个事务并持有实例锁，可以在服务运行时执行
+- 重复执行结果不变；汇总表本身与贡献行不一致（例如被手工修改）时加 --reset：
+  先清空两张表再全量计算，执行期间需暂停回调写入
+"""
+
+import argparse
+import time
+
+from app.repository.amount_agg import AMOUNT_AGG_ENABLED
+from app.repository.approval_repo import ApprovalRepository
+from app.utils.log import fields, get_logger, setup_logging, shutdown_logging
+
+logger = get_logger(__name__)
+
+
+def rebuild_amount_agg(batch_size: int = 200, reset: bool = False) -> int:
+    """
+    重新计算全部实例的金额贡献，返回处理的实例数
+    """
+    repo = ApprovalRepository()
+    total = 0
+    batches = 0
+    after = ""
+    started = time.monotonic()
+
+    if reset:
+        repo.reset_amount_agg()
+        logger.info("已清空金额汇总表")
+
+    while True:
+        codes = repo.list_instance_codes(after, batch_size)
+        if not codes:
+            break
+
+        # 读取与写入在实例锁内完成，不会与同时到达的回调交错
+        with repo.unit_of_work(codes):
+            repo.sync_amount_agg(repo.get_amount_sources(codes))
+
+        total += len(codes)
+        batches += 1
+        after = codes[-1]
+        logger.info("重建进度", extra=fields(batch=batches, instance_code=after, instances=total))
+
+    logger.info("完成：已处理 %d 个实例，耗时 %.1fs", total, time.monotonic() - started)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填 / 重建审批金额汇总表")
+    parser.add_argument("--batch-size", type=int, default=200, help="每个事务处理的实例数")
+    parser.add_argument("--reset", action="store_true", help="先清空汇总表和贡献行再全量计算")
+    args = parser.parse_args()
+
+    if not AMOUNT_AGG_ENABLED:
+        parser.error("AMOUNT_AGG 已关闭，不维护金额汇总表")
+
+    setup_logging()
+    try:
+        rebuild_amount_agg(batch_size=args.batch_size, reset=args.reset)
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
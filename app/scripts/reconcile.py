@@ -0,0 +1,61 @@
+"""
+立即执行一轮未结束审批实例的对账（也可由 cron 定期调用，代替服务进程内的定时对账）
+
+    python -m app.scripts.reconcile [--stale-after 1800] [--max 200] [--qps 2] [--statuses PENDING]
+
+- 只处理超过 --stale-after 秒未从飞书刷新的实例，最久未刷新的优先
+- 多个进程同时执行时只有一个会真正对账（MySQL 命名锁），其余直接返回 skipped=locked
+"""
+
+import argparse
+import json
+import os
+
+from app.services.attachment_pipeline import get_attachment_pipeline
+from app.services.reconcile import ReconcileSweeper
+from app.utils.log import setup_logging, shutdown_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对账未结束的飞书审批实例")
+    parser.add_argument("--stale-after", type=int, default=int(os.getenv("RECONCILE_STALE_AFTER", "1800")),
+                        help="超过该秒数未刷新的实例才会被选中")
+    parser.add_argument("--max", type=int, default=int(os.getenv("RECONCILE_MAX_PER_SWEEP", "200")),
+                        help="本轮最多处理的实例数")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("RECONCILE_BATCH_SIZE", "50")),
+                        help="每个事务写入的实例数")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("RECONCILE_CONCURRENCY", "2")),
+                        help="并发拉取实例详情的线程数")
+    parser.add_argument("--qps", type=float, default=float(os.getenv("RECONCILE_QPS", "2")),
+                        help="拉取实例详情的速率上限")
+    parser.add_argument("--statuses", default=os.getenv("RECONCILE_STATUSES", "PENDING"),
+                        help="视为未结束的状态，逗号分隔")
+    args = parser.parse_args()
+
+    sweeper = ReconcileSweeper(
+        stale_after=args.stale_after,
+        statuses=args.statuses.upper().split(","),
+        max_per_sweep=args.max,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        qps=args.qps,
+        # 独立进程没有回调队列，不需要让路
+        yield_queue_depth=None,
+    )
+
+    setup_logging()
+    # 附件转存处理池需显式启动（ATTACHMENT_PIPELINE 未开启时什么也不做）
+    get_attachment_pipeline().start()
+    try:
+        report = sweeper.run_once()
+    finally:
+        # 等待已入队的附件转存完成（ATTACHMENT_PIPELINE 未开启时什么也不做）
+        get_attachment_pipeline().stop()
+        shutdown_logging()
+
+    # 本轮报告是命令的输出结果，直接写 stdout
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,36 @@
 职责：
 1. 接收回调 payload（至少 instance_code）
 2. 调用飞书审批 API 获取完整审批实例
-3. 解析 form 字段
+3. 解析 form 字段，补全申请人 / 部门 / 处理人名称
 4. 写入数据库（raw / instance / tasks / form_fields / field_kv）
+5. 提交后把图片 / 附件交给后台转存（attachment_pipeline，可选）
+
+process_callback 为同步版本（后台 Worker / 脚本使用）；
+aprocess_callback 为 asyncio 版本，拉取和入库期间让出事件循环，单个进程可同时处理多个回调
 """
 
-import json
+import asyncio
 from typing import Dict, Any, List, Optional
 
-from app.services.lark_approval_api import get_approval_instance
+from app.services.attachment_pipeline import get_attachment_pipeline
+from app.services.lark_approval_api import aget_approval_instance, get_approval_instance
+from app.services.contact_resolver import DEPARTMENT, USER, ContactNames, get_contact_resolver
+from app.services.idempotency import get_idempotency_guard
 from app.repository.approval_repo import ApprovalRepository
+from app.repository.approval_repo_async import AsyncApprovalRepository
+from app.utils import json_codec
+from app.utils.fingerprint import fingerprint
+from app.utils.approval_parser import get_field_mapping_registry
+from app.utils.log import fields, get_logger
+from app.utils.metrics import get_metrics_registry, timed
+
+
+logger = get_logger(__name__)
+
+STALE_SNAPSHOTS_TOTAL = get_metrics_registry().counter(
+    "approval_stale_snapshots_total",
+    "Fetched snapshots discarded because a newer version is already stored",
+)
 
 
 class ApprovalService:
@@ -20,8 +41,21 @@ class ApprovalService:
     审批业务服务：拉取 → 解析 → 入库
     """
 
-    def __init__(self):
-        self.repo = ApprovalRepository()
+    def __init__(self, repo=None, idempotency=None, async_repo=None, contacts=None, attachments=None):
+        # repo / idempotency / contacts / attachments 可注入（压测时替换为内存实现），
+        # 默认使用 MySQL 仓储、进程级去重器、进程级名称解析器和进程级附件转存
+        self.repo = repo if repo is not None else ApprovalRepository()
+        self.idempotency = idempotency if idempotency is not None else get_idempotency_guard()
+        self.contacts = contacts if contacts is not None else get_contact_resolver()
+        self.attachments = attachments if attachments is not None else get_attachment_pipeline()
+        self._async_repo = async_repo
+
+    @property
+    def async_repo(self) -> AsyncApprovalRepository:
+        # 只有走异步路径时才需要，按需创建
+        if self._async_repo is None:
+            self._async_repo = AsyncApprovalRepository()
+        return self._async_repo
 
     def process_callback(self, callback_payload: Dict[str, Any]) -> None:
         """
@@ -31,31 +65,79 @@ class ApprovalService:
         if not instance_code:
             raise ValueError("回调数据缺少 instance_code")
 
+        # 0. 去重窗口内已处理过的重复回调，直接确认
+        if self.idempotency.seen(callback_payload):
+            return
+
         # 1. 拉取完整审批实例
         approval_instance = get_approval_instance(instance_code)
 
-        # 2. 保存 raw（兜底，完整 JSON）
-        self.repo.save_raw_data(instance_code, approval_instance)
+        # 2. 解析并在一个事务中入库（只写内容有变化的部分）
+        self.persist_instance(instance_code, approval_instance)
 
-        # 3. 保存审批实例主表
-        instance_row = self._build_instance_row(approval_instance)
-        self.repo.save_instance(instance_row)
+        # 3. 处理成功后记录去重键
+        self.idempotency.mark(callback_payload)
 
-        # 4. 保存任务节点
-        task_list = approval_instance.get("task_list") or []
-        self.repo.save_tasks(instance_code, task_list)
+    def process_callbacks(self, callback_payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量处理多个回调（消化积压时使用）：
+        同一实例只拉取一次，最后在同一个事务中写入所有拉取成功的实例
 
-        # 5. 保存表单字段（原始 form）
-        form_fields = self._normalize_form(approval_instance.get("form"))
-        self.repo.save_form_fields(instance_code, form_fields)
+        返回拉取失败的实例对应的回调（由调用方逐个重试）；
+        单个实例拉取失败（已删除、无权限等）不影响同批其它实例，入库失败时整体抛出
+        """
+        pending: Dict[str, List[Dict[str, Any]]] = {}
 
-        # 6. ✅ 保存 KV 拆解字段
-        kv_rows = self._build_field_kv_rows(
-            instance_code=instance_code,
-            form_raw=approval_instance.get("form"),
-        )
-        if kv_rows:
-            self.repo.save_field_kv(kv_rows)
+        for payload in callback_payloads:
+            instance_code = payload.get("instance_code")
+            if not instance_code:
+                raise ValueError("回调数据缺少 instance_code")
+
+            if self.idempotency.seen(payload):
+                continue
+
+            pending.setdefault(instance_code, []).append(payload)
+
+        instances: Dict[str, Dict[str, Any]] = {}
+        failed: List[Dict[str, Any]] = []
+        for code, payloads in pending.items():
+            try:
+                instances[code] = get_approval_instance(code)
+            except Exception as e:
+                failed.extend(payloads)
+                logger.warning("批量处理中拉取实例失败：%s", e, extra=fields(instance_code=code))
+
+        if instances:
+            self.persist_instances(instances)
+
+            for code in instances:
+                for payload in pending[code]:
+                    self.idempotency.mark(payload)
+
+        return failed
+
+    async def aprocess_callback(self, callback_payload: Dict[str, Any]) -> None:
+        """
+        处理飞书审批回调（asyncio 版本，步骤同 process_callback）
+        """
+        instance_code = callback_payload.get("instance_code")
+        if not instance_code:
+            raise ValueError("回调数据缺少 instance_code")
+
+        if await self._idempotency_call(self.idempotency.seen, callback_payload):
+            return
+
+        approval_instance = await aget_approval_instance(instance_code)
+
+        await self.apersist_instance(instance_code, approval_instance)
+
+        await self._idempotency_call(self.idempotency.mark, callback_payload)
+
+    async def _idempotency_call(self, func, payload: Dict[str, Any]):
+        # 进程内去重只查内存，直接调用；MySQL 去重表为阻塞 I/O，放到线程中执行
+        if getattr(self.idempotency, "repo", None) is None:
+            return func(payload)
+        return await asyncio.to_thread(func, payload)
 
     def process_instance_code(self, instance_code: str) -> None:
         """
@@ -63,6 +145,187 @@ class ApprovalService:
         """
         self.process_callback({"instance_code": instance_code})
 
+    # ------------------------------------------------------------------
+    # 解析 / 入库
+    # ------------------------------------------------------------------
+
+    def persist_instance(self, instance_code: str, approval_instance: Dict[str, Any]) -> None:
+        """
+        在一个事务中写入单个审批实例，只提交一次；内容未变化的部分跳过
+        """
+        # 名称解析可能访问飞书，放在事务 / 实例锁之外
+        contacts = self.contacts.resolve([approval_instance])
+
+        # 实例锁保证多进程下同一实例的 读指纹 → 对比 → 写入 不会交错
+        with self.repo.unit_of_work([instance_code]):
+            previous = self.repo.get_fingerprints([instance_code]).get(instance_code)
+            bundle = self.build_bundle(instance_code, approval_instance, previous, contacts)
+            if bundle:
+                self.repo.save_batch([bundle])
+            else:
+                # 内容未变化：只记录本次已从飞书确认过（对账不再选中）
+                self.repo.mark_refreshed([instance_code])
+
+        # 事务提交后再转存附件（后台线程，不阻塞回调）
+        if bundle:
+            self.attachments.submit_bundles([bundle])
+
+    async def apersist_instance(self, instance_code: str, approval_instance: Dict[str, Any]) -> None:
+        """
+        persist_instance 的 asyncio 版本
+        """
+        contacts = await self.contacts.aresolve([approval_instance])
+
+        repo = self.async_repo
+        async with repo.unit_of_work([instance_code]):
+            previous = (await repo.get_fingerprints([instance_code])).get(instance_code)
+            bundle = self.build_bundle(instance_code, approval_instance, previous, contacts)
+            if bundle:
+                await repo.save_batch([bundle])
+            else:
+                await repo.mark_refreshed([instance_code])
+
+        if bundle:
+            self.attachments.submit_bundles([bundle])
+
+    def persist_instances(self, instances: Dict[str, Dict[str, Any]]) -> int:
+        """
+        在一个事务中写入多个审批实例（每张表一条多行写入）
+        - instances：{instance_code: 飞书审批实例}
+        - 返回内容有变化、实际写入的实例数
+        """
+        if not instances:
+            return 0
+
+        # 所有实例中出现的用户 / 部门合并成一次批量解析
+        contacts = self.contacts.resolve(instances.values())
+
+        with self.repo.unit_of_work(list(instances)):
+            previous = self.repo.get_fingerprints(list(instances))
+            built = {
+                code: self.build_bundle(code, approval_instance, previous.get(code), contacts)
+                for code, approval_instance in instances.items()
+            }
+            bundles = [b for b in built.values() if b]
+            self.repo.save_batch(bundles)
+            self.repo.mark_refreshed([code for code, b in built.items() if not b])
+
+        self.attachments.submit_bundles(bundles)
+        return len(bundles)
+
+    def build_bundle(
+        self,
+        instance_code: str,
+        approval_instance: Dict[str, Any],
+        previous: Optional[Dict[str, Any]] = None,
+        contacts: Optional[ContactNames] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        把飞书审批实例解析为一次入库所需的数据（格式见 ApprovalRepository.save_batch）
+
+        previous 为已入库的指纹（ApprovalRepository.get_fingerprints 的结果）：
+        - 实例主表字段 / task_list / form 分别计算指纹，只保留有变化的部分
+        - 只有任务变化时，只写 task 表和 instance 表（instance 表保存最新指纹）
+        - raw 在实例主表字段或 form 变化时重写
+        - 全部未变化时返回 None
+        - 快照版本低于已入库版本（乱序到达的旧快照）时丢弃，返回 None
+
+        contacts 为 ContactResolver.resolve 的结果，用于写入申请人 / 部门 / 处理人名称；
+        名称不参与指纹计算（只有名称变化时不重写）
+        """
+        previous = previous or {}
+        version = self._snapshot_version(approval_instance)
+
+        if previous.get("version") is not None and version is not None and version < previous["version"]:
+            STALE_SNAPSHOTS_TOTAL.inc()
+            logger.info(
+                "丢弃过期快照（版本 %s < 已入库 %s）", version, previous["version"],
+                extra=fields(instance_code=instance_code),
+            )
+            return None
+
+        form_raw = approval_instance.get("form")
+        task_list = approval_instance.get("task_list") or []
+        instance_row = self._build_instance_row(approval_instance)
+
+        hashes = {
+            "instance_hash": fingerprint(instance_row),
+            "tasks_hash": fingerprint(task_list),
+            "form_hash": fingerprint(form_raw),
+        }
+
+        instance_changed = previous.get("instance_hash") != hashes["instance_hash"]
+        tasks_changed = previous.get("tasks_hash") != hashes["tasks_hash"]
+        form_changed = previous.get("form_hash") != hashes["form_hash"]
+
+        if not (instance_changed or tasks_changed or form_changed):
+            return None
+
+        instance_row.update(hashes)
+        instance_row["version"] = version
+
+        users = (contacts or {}).get(USER) or {}
+        departments = (contacts or {}).get(DEPARTMENT) or {}
+        instance_row["applicant_name"] = users.get(instance_row["applicant_user_id"])
+        instance_row["department_name"] = departments.get(instance_row["department_id"])
+
+        # form 只解码一次，form_field 表和 KV 表共用
+        form_fields = self._decode_form(
+            form_raw,
+            approval_code=approval_instance.get("approval_code"),
+        ) if form_changed else []
+
+        return {
+            "instance_code": instance_code,
+
+            # 快照版本（各表的版本守卫使用）
+            "version": version,
+
+            # raw（兜底，完整 JSON，只序列化一次）
+            "raw_data": approval_instance if (instance_changed or form_changed) else None,
+            "raw_json": json_codec.dumps(approval_instance) if (instance_changed or form_changed) else None,
+
+            # 审批实例主表（保存最新指纹，有任何变化都要写）
+            "instance": instance_row,
+
+            # 任务节点（复制后补充处理人姓名，不修改原始数据）
+            "tasks": [
+                dict(t, user_name=users.get(t.get("user_id")))
+                for t in task_list
+            ] if tasks_changed else [],
+
+            # 表单字段（原始 form）
+            "form_fields": self._normalize_form(form_fields) if form_changed else [],
+
+            # KV 拆解字段（None 表示不同步；form 变化时同步为完整的新内容）
+            "kv_rows": self._build_field_kv_rows(
+                instance_code=instance_code,
+                form_raw=form_fields,
+            ) if form_changed else None,
+        }
+
+    # ------------------------------------------------------------------
+    # 快照版本
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _snapshot_version(approval_instance: Dict[str, Any]) -> Optional[int]:
+        """
+        快照版本：实例 / 任务 / 时间线中最晚的时间戳（毫秒）
+
+        飞书实例详情没有版本号，但审批只会向前推进，每一步都会产生更晚的时间戳，
+        因此同一实例较晚拉取的快照版本不会更低；没有任何时间戳时返回 None（不做守卫）
+        """
+        stamps = [approval_instance.get("start_time"), approval_instance.get("end_time")]
+        for task in approval_instance.get("task_list") or []:
+            stamps.append(task.get("start_time"))
+            stamps.append(task.get("end_time"))
+        for event in approval_instance.get("timeline") or []:
+            stamps.append(event.get("create_time"))
+
+        values = [int(s) for s in stamps if s is not None and str(s).isdigit()]
+        return max(values) if values else None
+
     # ------------------------------------------------------------------
     # instance 表
     # ------------------------------------------------------------------
@@ -90,105 +353,167 @@ class ApprovalService:
         }
 
     # ------------------------------------------------------------------
-    # form 原表
+    # form 解码（单次）
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def _normalize_form(form_raw) -> List[Dict[str, Any]]:
+    @classmethod
+    def _decode_form(cls, form_raw, approval_code: Optional[str] = None) -> List["FormField"]:
         """
-        把飞书 form 字段解析为 lark_approval_form_field
+        一次性解码飞书 form：
+        - form 字符串只 loads 一次
+        - 每个字段的 value 只 dumps 一次，form_field 表与 KV 表共用
+        - 明细表（fieldList）的每一行、每一列解码为 children，供 KV 表展开
+        - field_key 为按 approval_code 字段映射（approval_parser）统一后的字段名
+
+        传入已解码的 FormField 列表时原样返回，方便各步骤共用同一份结果
+        （不计入 decode_form 阶段耗时，每个实例只记一次真正的解码）
         """
+        if isinstance(form_raw, list) and form_raw and isinstance(form_raw[0], FormField):
+            return form_raw
+        return cls._decode_raw_form(form_raw, approval_code)
+
+    @classmethod
+    @timed("decode_form")
+    def _decode_raw_form(cls, form_raw, approval_code: Optional[str] = None) -> List["FormField"]:
         if not form_raw:
             return []
 
         if isinstance(form_raw, str):
             try:
-                form_list = json.loads(form_raw)
-            except json.JSONDecodeError:
+                form_list = json_codec.loads(form_raw)
+            except json_codec.JSONDecodeError:
                 return []
         elif isinstance(form_raw, list):
             form_list = form_raw
         else:
             return []
 
-        result: List[Dict[str, Any]] = []
+        mapping = get_field_mapping_registry().get(approval_code, form_list)
+        result: List[FormField] = []
 
         for f in form_list:
-            result.append({
-                "field_id": f.get("id"),
-                "field_name": f.get("name"),
-                "field_type": f.get("type"),
-                "field_value": json.dumps(f.get("value"), ensure_ascii=False),
-            })
+            field = cls._decode_field(f, mapping.field_key(f))
+
+            # 明细表：按行展开，row_id 为行序号
+            if f.get("type") == "fieldList" and isinstance(f.get("value"), list):
+                for row_index, row in enumerate(f["value"]):
+                    for col in row or []:
+                        field.children.append(cls._decode_field(
+                            col,
+                            mapping.column_key(col),
+                            parent_id=field.field_id,
+                            row_index=row_index,
+                        ))
+
+            result.append(field)
 
         return result
 
+    @classmethod
+    def _decode_field(
+        cls,
+        f: Dict[str, Any],
+        field_key: Optional[str],
+        parent_id: Optional[str] = None,
+        row_index: Optional[int] = None,
+    ) -> "FormField":
+        value = f.get("value")
+        value_json = json_codec.dumps(value)
+        text_value, num_value, currency = cls._extract_value(value, value_json)
+
+        return FormField(
+            field_id=f.get("id"),
+            name=f.get("name"),
+            type=f.get("type"),
+            row_id=str(row_index) if row_index is not None else (f.get("row_id") or ""),
+            value=value,
+            value_json=value_json,
+            text=text_value,
+            num=num_value,
+            currency=currency,
+            field_key=field_key,
+            parent_id=parent_id,
+            row_index=row_index,
+        )
+
+    # ------------------------------------------------------------------
+    # form 原表
+    # ------------------------------------------------------------------
+
+    @classmethod
+    @timed("normalize_form")
+    def _normalize_form(cls, form_raw) -> List[Dict[str, Any]]:
+        """
+        把飞书 form 字段解析为 lark_approval_form_field
+        - form_raw：form 原始值，或 _decode_form 的结果
+        """
+        return [
+            {
+                "field_id": f.field_id,
+                "field_name": f.name,
+                "field_type": f.type,
+                "field_value": f.value_json,
+            }
+            for f in cls._decode_form(form_raw)
+        ]
+
     # ------------------------------------------------------------------
     # KV 拆解表（lark_approval_field_kv）
     # ------------------------------------------------------------------
 
+    @timed("build_field_kv_rows")
     def _build_field_kv_rows(
         self,
         instance_code: str,
         form_raw,
+        approval_code: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
         """
         把飞书 form 拆解成 KV 行
+        - form_raw：form 原始值，或 _decode_form 的结果
+        - 明细表除了自身一行（整表 JSON），每个单元格再展开为一行：
+          row_id / row_index 为行序号，parent_widget_id 为明细表控件 ID，
+          数量 / 单价等数值落在 field_value_num，可直接用 SQL 聚合
         """
-        form_list = self._parse_form(form_raw)
-        if not form_list:
-            return []
-
         rows: List[Dict[str, Any]] = []
 
-        for field in form_list:
-            widget_id = field.get("id")
-            field_name = field.get("name")
-            field_type = field.get("type")
-            value = field.get("value")
-
-            # 明细行（如表格控件）
-            row_id = field.get("row_id")
-
-            text_value, num_value, currency = self._extract_value(value)
-
-            rows.append({
-                "approval_id": instance_code,
-                "row_id": row_id,
-                "widget_id": widget_id,
-
-                "field_name": field_name,
-                "field_type": field_type,
-
-                "field_value_text": text_value,
-                "field_value_num": num_value,
-                "currency": currency,
-
-                "extra_json": json.dumps(value, ensure_ascii=False),
-            })
+        for f in self._decode_form(form_raw, approval_code=approval_code):
+            rows.append(self._kv_row(instance_code, f))
+            for child in f.children:
+                rows.append(self._kv_row(instance_code, child))
 
         return rows
 
     @staticmethod
-    def _parse_form(form_raw) -> List[Dict[str, Any]]:
-        if not form_raw:
-            return []
+    def _kv_row(instance_code: str, f: "FormField") -> Dict[str, Any]:
+        return {
+            "approval_id": instance_code,
+            # 明细行序号，顶层字段为空串
+            "row_id": f.row_id,
+            "widget_id": f.field_id,
 
-        if isinstance(form_raw, str):
-            try:
-                return json.loads(form_raw)
-            except json.JSONDecodeError:
-                return []
+            "field_name": f.name,
+            "field_type": f.type,
+            "field_key": f.field_key,
 
-        if isinstance(form_raw, list):
-            return form_raw
+            "parent_widget_id": f.parent_id,
+            "row_index": f.row_index,
+
+            "field_value_text": f.text,
+            "field_value_num": f.num,
+            "currency": f.currency,
 
-        return []
+            "extra_json": f.value_json,
+        }
 
     @staticmethod
-    def _extract_value(value) -> tuple[Optional[str], Optional[float], Optional[str]]:
+    def _extract_value(
+        value,
+        value_json: Optional[str] = None,
+    ) -> tuple[Optional[str], Optional[float], Optional[str]]:
         """
         根据 value 类型拆解 text / number / currency
+        - value_json：value 已序列化好的 JSON，传入时直接复用，不再重复 dumps
         """
         if value is None:
             return None, None, None
@@ -202,7 +527,7 @@ class ApprovalService:
                     value.get("currency"),
                 )
             # 其它结构 → 直接转字符串
-            return json.dumps(value, ensure_ascii=False), None, None
+            return value_json or json_codec.dumps(value), None, None
 
         # 数值
         if isinstance(value, (int, float)):
@@ -213,4 +538,58 @@ class ApprovalService:
             return value, None, None
 
         # 数组 / 其它
-        return json.dumps(value, ensure_ascii=False), None, None
+        return value_json or json_codec.dumps(value), None, None
+
+
+class FormField:
+    """
+    单个表单字段的解码结果（__slots__，大明细表单下节省内存和属性访问开销）
+    """
+
+    __slots__ = (
+        "field_id",
+        "name",
+        "type",
+        "row_id",
+        "value",
+        "value_json",
+        "text",
+        "num",
+        "currency",
+        "field_key",
+        "parent_id",
+        "row_index",
+        "children",
+    )
+
+    def __init__(
+        self,
+        field_id,
+        name,
+        type,
+        row_id,
+        value,
+        value_json,
+        text,
+        num,
+        currency,
+        field_key=None,
+        parent_id=None,
+        row_index=None,
+    ):
+        self.field_id = field_id
+        self.name = name
+        self.type = type
+        self.row_id = row_id
+        self.value = value
+        self.value_json = value_json
+        self.text = text
+        self.num = num
+        self.currency = currency
+        # 统一后的字段名（见 approval_parser 字段映射）
+        self.field_key = field_key
+        # 明细单元格：所属明细表控件 ID、行序号
+        self.parent_id = parent_id
+        self.row_index = row_index
+        # 明细表的单元格（仅 fieldList）
+        self.children: List["FormField"] = []
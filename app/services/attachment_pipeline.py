@@ -0,0 +1,364 @@
+"""
+附件 / 图片转存（不在回调关键路径上）
+
+飞书实例详情中的图片 / 附件控件只给出有时效的下载 URL，过期后无法再取回原文件。
+实例入库（事务提交）后，把 form 有变化的实例中的图片 / 附件 KV 行放入有界队列，
+由固定数量的后台线程：
+1. 流式下载（iter_content 分块写入临时文件，边写边计算 sha256，不把整个文件读入内存）
+2. 按内容哈希存入对象存储（attachment_store），已存在的相同内容不再上传（同一张发票 / 收据只存一份）
+3. 把对象 key 写回 KV 行的 attachment_keys（与字段值中的 URL 一一对应，失败为 null）
+
+队列满时丢弃并计数，不阻塞回调处理；该实例下次 form 变化时会重新转存。
+处理池由应用 lifespan（或脚本入口）启动和停止；未启动或停止后提交的任务同样丢弃并计数。
+"""
+
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.services.attachment_store import ObjectStore, content_key, create_object_store
+from app.services.lark_http import get_lark_http
+from app.utils import json_codec
+from app.utils.log import fields, get_logger
+from app.utils.metrics import stage
+
+logger = get_logger(__name__)
+
+
+# 队列中的停止信号
+_STOP = object()
+
+# 需要转存的控件类型
+DEFAULT_WIDGET_TYPES = ("image", "imageV2", "attachment", "attachmentV2")
+
+
+class AttachmentTooLarge(Exception):
+    """文件超过 max_bytes，放弃转存"""
+
+
+def attachment_jobs(bundle: Dict[str, Any], widget_types) -> List[Dict[str, Any]]:
+    """
+    从 save_batch 的 bundle 中取出需要转存的 KV 行（只有 form 变化、带 kv_rows 的 bundle 才有）
+    """
+    jobs = []
+    form_hash = (bundle.get("instance") or {}).get("form_hash")
+
+    for r in bundle.get("kv_rows") or []:
+        if r.get("field_type") not in widget_types or not r.get("extra_json"):
+            continue
+        try:
+            value = json_codec.loads(r["extra_json"])
+        except json_codec.JSONDecodeError:
+            continue
+
+        urls = value if isinstance(value, list) else [value]
+        urls = [u for u in urls if isinstance(u, str) and u.startswith("http")]
+        if urls:
+            jobs.append({
+                "instance_code": bundle["instance_code"],
+                "row_id": r.get("row_id") or "",
+                "widget_id": r.get("widget_id") or "",
+                "form_hash": form_hash,
+                "urls": urls,
+            })
+
+    return jobs
+
+
+class AttachmentPipeline:
+    """
+    有界队列 + 固定线程数的附件转存
+
+    - store：对象存储，默认按 ATTACHMENT_STORE 创建
+    - repo：写回 KV 行的仓储，默认 ApprovalRepository
+    - concurrency：同时下载的线程数
+    - queue_size：等待转存的 KV 行上限，满时丢弃
+    - chunk_size：流式下载 / 写入的分块大小（字节）
+    - max_bytes：单个文件上限，超过时放弃（不写入存储）
+    - widget_types：需要转存的控件类型
+    - drain_timeout：stop 时等待队列处理完的默认秒数
+    - enabled：为 False 时 submit 不做任何事
+    """
+
+    def __init__(
+        self,
+        store: Optional[ObjectStore] = None,
+        repo=None,
+        concurrency: int = 4,
+        queue_size: int = 1000,
+        chunk_size: int = 64 * 1024,
+        max_bytes: int = 50 * 1024 * 1024,
+        widget_types=DEFAULT_WIDGET_TYPES,
+        drain_timeout: float = 30.0,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.drain_timeout = drain_timeout
+        self._store = store
+        self._repo = repo
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = max(1024, chunk_size)
+        self.max_bytes = max_bytes
+        self.widget_types = set(widget_types)
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._accepting = False
+        # stop 之后不再启动（停机过程中仍在处理的回调不会把线程重新拉起）
+        self._stopped = False
+
+        # 运行统计
+        self._submitted = 0
+        self._dropped = 0
+        self._downloaded = 0
+        self._deduped = 0
+        self._bytes = 0
+        self._failed = 0
+        self._recorded = 0
+        self._discarded = 0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def store(self) -> ObjectStore:
+        # 第一次转存时才创建（未开启时不需要存储配置）
+        if self._store is None:
+            self._store = create_object_store()
+        return self._store
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            from app.repository.approval_repo import ApprovalRepository
+
+            self._repo = ApprovalRepository()
+        return self._repo
+
+    def start(self) -> None:
+        """
+        启动后台线程（未开启、已启动或已停止时无副作用）
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._accepting or self._stopped:
+                return
+            for i in range(self.concurrency):
+                t = threading.Thread(target=self._run, name=f"approval-attachment-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._accepting = True
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        停止接收新任务，在 timeout（默认 drain_timeout）秒内处理完队列后让线程退出；未处理完的任务丢弃
+        """
+        timeout = self.drain_timeout if timeout is None else timeout
+        with self._lock:
+            self._stopped = True
+            if not self._accepting:
+                return
+            self._accepting = False
+            threads, self._threads = self._threads, []
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # 丢弃剩余任务，保证停止信号能放进队列
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        for _ in threads:
+            self._queue.put(_STOP)
+        for t in threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    # ------------------------------------------------------------------
+    # 入队
+    # ------------------------------------------------------------------
+
+    def submit_bundles(self, bundles: List[Dict[str, Any]]) -> int:
+        """
+        实例入库（事务提交）后调用：把 bundle 中需要转存的 KV 行放入队列，返回入队数
+        不阻塞；处理池未运行（未启动 / 已停止）时丢弃并计数
+        """
+        if not self.enabled:
+            return 0
+
+        jobs = [job for b in bundles for job in attachment_jobs(b, self.widget_types)]
+        if not jobs:
+            return 0
+
+        # 在锁内入队（put_nowait 不阻塞）：与 stop 互斥，停止之后不会再有任务进入队列
+        full = []
+        with self._lock:
+            running = self._accepting
+            for job in jobs if running else ():
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    full.append(job)
+            queued = len(jobs) - len(full) if running else 0
+            self._submitted += queued
+            self._dropped += len(jobs) - queued
+
+        if not running:
+            logger.warning(
+                "附件转存处理池未运行（未启动或已停止），丢弃",
+                extra=fields(instance_code=jobs[0]["instance_code"], jobs=len(jobs)),
+            )
+        for job in full:
+            logger.warning("附件转存队列已满，丢弃", extra=fields(instance_code=job["instance_code"]))
+        return queued
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self._accepting,
+                "concurrency": self.concurrency,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "submitted": self._submitted,
+                "dropped": self._dropped,
+                "downloaded": self._downloaded,
+                "deduped": self._deduped,
+                "bytes_total": self._bytes,
+                "failed": self._failed,
+                "recorded": self._recorded,
+                "discarded": self._discarded,
+            }
+
+    # ------------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                self.process(job)
+            except Exception as e:
+                logger.exception("附件转存失败：%s", e, extra=fields(instance_code=job.get("instance_code")))
+            finally:
+                self._queue.task_done()
+
+    def process(self, job: Dict[str, Any]) -> List[Optional[str]]:
+        """
+        转存一个 KV 行中的全部文件并写回 key，返回与 URL 对应的 key 列表
+        """
+        keys: List[Optional[str]] = []
+        for url in job["urls"]:
+            try:
+                keys.append(self._store_url(url))
+            except Exception as e:
+                keys.append(None)
+                with self._lock:
+                    self._failed += 1
+                # URL 带签名，日志中不输出
+                logger.warning(
+                    "下载附件失败：%s", e,
+                    extra=fields(instance_code=job["instance_code"], widget_id=job["widget_id"]),
+                )
+
+        recorded = self.repo.save_attachment_keys(
+            job["instance_code"], job["row_id"], job["widget_id"], keys, job.get("form_hash"),
+        )
+        with self._lock:
+            if recorded:
+                self._recorded += 1
+            else:
+                # 下载期间实例已被新快照覆盖（或 key 与已记录的相同）
+                self._discarded += 1
+        return keys
+
+    def _store_url(self, url: str) -> str:
+        with stage("attachment_download"):
+            fd, tmp_path = tempfile.mkstemp(prefix="attachment-", dir=self.store.staging_dir())
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    sha256, size, content_type = self._download(url, fh)
+
+                key = content_key(sha256)
+                if self.store.exists(key):
+                    deduped = True
+                else:
+                    deduped = False
+                    with stage("attachment_store"):
+                        self.store.put_file(key, tmp_path, content_type)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        with self._lock:
+            self._downloaded += 1
+            self._bytes += size
+            if deduped:
+                self._deduped += 1
+        return key
+
+    def _download(self, url: str, fh):
+        """
+        流式下载到 fh，返回 (sha256, 字节数, Content-Type)
+        """
+        resp = get_lark_http().get(url, "attachment", stream=True)
+        try:
+            if resp.status_code >= 400:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise AttachmentTooLarge(f"超过 {self.max_bytes} 字节")
+                digest.update(chunk)
+                fh.write(chunk)
+
+            return digest.hexdigest(), size, resp.headers.get("Content-Type")
+        finally:
+            resp.close()
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_pipeline: Optional[AttachmentPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_attachment_pipeline() -> AttachmentPipeline:
+    """
+    获取进程内唯一的附件转存处理池（按环境变量配置，ATTACHMENT_PIPELINE=1 时开启）
+    """
+    global _pipeline
+
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                types = os.getenv("ATTACHMENT_WIDGET_TYPES", ",".join(DEFAULT_WIDGET_TYPES))
+                _pipeline = AttachmentPipeline(
+                    concurrency=int(os.getenv("ATTACHMENT_CONCURRENCY", "4")),
+                    queue_size=int(os.getenv("ATTACHMENT_QUEUE_SIZE", "1000")),
+                    chunk_size=int(os.getenv("ATTACHMENT_CHUNK_SIZE", str(64 * 1024))),
+                    max_bytes=int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024))),
+                    widget_types=[t.strip() for t in types.split(",") if t.strip()],
+                    drain_timeout=float(os.getenv("ATTACHMENT_DRAIN_TIMEOUT", "30")),
+                    enabled=os.getenv("ATTACHMENT_PIPELINE", "0").lower() in ("1", "true", "yes"),
+                )
+
+    return _pipeline
@@ -0,0 +1,134 @@
+"""
+附件 / 图片的对象存储（按内容寻址）
+
+key 由文件内容的 sha256 决定（ab/cd/<sha256>），内容相同的文件只存一份。
+下载先分块写入本地临时文件，完成后整体交给存储：
+- local：同一文件系统内 os.replace，原子可见，不会出现写了一半的对象
+- s3：upload_file 从磁盘分段上传（需要 boto3），同样不把整个文件读入内存
+
+自定义存储实现 ObjectStore 的 exists / put_file 即可，通过 AttachmentPipeline(store=...) 注入。
+"""
+
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+def content_key(sha256: str) -> str:
+    """
+    内容哈希 → 存储 key（两级目录，避免单个目录下文件过多）
+    """
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class ObjectStore(ABC):
+    """
+    对象存储接口（未实现 exists / put_file 的子类无法实例化）
+    """
+
+    name = "base"
+
+    def staging_dir(self) -> Optional[str]:
+        """
+        下载临时文件所在目录（None 表示系统临时目录）
+        """
+        return None
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """
+        key 是否已存在
+        """
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        """
+        把已下载完成的本地文件存为 key（调用方负责删除仍然存在的 path）
+        """
+
+
+class LocalObjectStore(ObjectStore):
+    """
+    本地目录存储：root/<key>，临时文件放在 root/.staging（与目标同一文件系统，可原子改名）
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._staging = os.path.join(self.root, ".staging")
+        os.makedirs(self._staging, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def staging_dir(self) -> Optional[str]:
+        return self._staging
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except OSError:
+            # 临时目录与 root 不在同一文件系统时退化为复制
+            shutil.copyfile(path, target + ".part")
+            os.replace(target + ".part", target)
+
+
+class S3ObjectStore(ObjectStore):
+    """
+    S3 兼容存储（需要 boto3）：s3://bucket/prefix<key>，endpoint_url 可指向 MinIO 等
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise RuntimeError("ATTACHMENT_STORE=s3 需要安装 boto3") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._client_error = ClientError
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        extra = {"ContentType": content_type} if content_type else None
+        self._client.upload_file(path, self.bucket, self.prefix + key, ExtraArgs=extra)
+
+
+def create_object_store() -> ObjectStore:
+    """
+    按环境变量创建对象存储：ATTACHMENT_STORE=local（默认）/ s3
+    """
+    backend = os.getenv("ATTACHMENT_STORE", "local").lower()
+
+    if backend == "local":
+        return LocalObjectStore(os.getenv("ATTACHMENT_DIR", "attachments"))
+    if backend == "s3":
+        bucket = os.getenv("ATTACHMENT_S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("ATTACHMENT_STORE=s3 需要设置 ATTACHMENT_S3_BUCKET")
+        return S3ObjectStore(
+            bucket,
+            prefix=os.getenv("ATTACHMENT_S3_PREFIX", ""),
+            endpoint_url=os.getenv("ATTACHMENT_S3_ENDPOINT") or None,
+        )
+
+    raise RuntimeError(f"未知的 ATTACHMENT_STORE：{backend}")
@@ -0,0 +1,595 @@
+"""
+审批回调后台处理池（Worker Pool）
+
+职责：
+1. 回调入口只做校验 + 入队，立刻给飞书返回 200
+2. 固定数量的后台线程从有界队列取任务，执行 拉取 → 解析 → 入库
+3. 队列有积压时一次取出多条，合并到一个事务中入库
+4. 失败按退避策略重试：重试按到期时间排队，到期后重新放回分区队列，
+   等待期间不占用工作线程，同一分区中其它实例的回调照常处理
+5. 进程退出时停止接收新任务，并尽量把队列中的任务处理完
+
+队列按 instance_code 分区：同一实例的回调总是进入同一个线程的队列，按到达顺序依次处理，
+进程内不会有两个线程同时写同一个实例（跨进程由仓储层的实例锁保证）。
+
+合并（coalesce）：一次审批会在几秒内连续推送多个回调（发起、各节点通过、结束），
+同一实例的回调先在内存中等待 coalesce_window 秒，窗口内再到达的回调并入同一组，
+整组只拉取一次最新状态、写入一次；从第一个回调起最多等待 coalesce_max_delay 秒，
+终态（通过 / 拒绝 / 撤回 / 删除）回调到达时整组立即入队。
+"""
+
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.log import fields, get_logger
+from app.utils.metrics import count_retry
+
+logger = get_logger(__name__)
+
+
+# 队列中的停止信号
+_STOP = object()
+
+# 终态：到达后不再等待合并窗口
+FINAL_STATUSES = {"APPROVED", "REJECTED", "CANCELED", "DELETED"}
+
+
+def _callback_status(payload: Dict[str, Any]) -> str:
+    # 兼容 飞书 v1 事件格式（字段在 event 下）和直接转发的扁平格式
+    event = payload.get("event") if isinstance(payload.get("event"), dict) else {}
+    return str(payload.get("status") or event.get("status") or "").upper()
+
+
+class _Pending:
+    """
+    等待合并的一组回调（同一 instance_code）
+    """
+
+    __slots__ = ("payloads", "first_at", "due_at")
+
+    def __init__(self, payload: Dict[str, Any], now: float, due_at: float):
+        self.payloads = [payload]
+        self.first_at = now
+        self.due_at = due_at
+
+
+class _Retry:
+    """
+    到期后重新入队的一组回调（同一 instance_code），attempt 为已重试次数
+    """
+
+    __slots__ = ("payloads", "attempt")
+
+    def __init__(self, payloads: List[Dict[str, Any]], attempt: int):
+        self.payloads = payloads
+        self.attempt = attempt
+
+
+class CallbackWorkerPool:
+    """
+    有界队列 + 固定线程数的回调处理池
+
+    - handler：真正处理单个回调 payload 的函数
+    - batch_handler：一次处理多个 payload 的函数（可选），返回其中处理失败的 payload；
+      返回的 payload 和整批抛出异常时的全部 payload 退回逐条 handler 重试
+    - batch_size：积压时单次最多取出的 payload 数
+    - workers：后台线程数（每个线程一个分区队列）
+    - queue_size：队列总长度（平均分给各分区），分区队列满时 submit 返回 False
+    - max_retries：单个回调失败后的最大重试次数
+    - retry_backoff：首次重试等待秒数，之后按 2 倍递增（等待期间不阻塞分区线程）
+    - coalesce_window：同一实例回调的合并窗口（秒），0 表示不合并；需要 batch_handler
+    - coalesce_max_delay：从第一个回调起的最长等待秒数
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], None],
+        batch_handler: Optional[Callable[[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]] = None,
+        batch_size: int = 1,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        coalesce_window: float = 0.0,
+        coalesce_max_delay: float = 10.0,
+    ):
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        # 整组交给 batch_handler（同一实例只拉取一次），没有 batch_handler 时不合并
+        self.coalesce_window = max(0.0, coalesce_window) if batch_handler is not None else 0.0
+        self.coalesce_max_delay = max(self.coalesce_window, coalesce_max_delay)
+
+        partition_size = max(1, queue_size // self.workers)
+        self._queues: List["queue.Queue[Any]"] = [
+            queue.Queue(maxsize=partition_size) for _ in range(self.workers)
+        ]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._accepting = False
+
+        # 合并中的回调：instance_code → _Pending；到期时间小顶堆 (due_at, 序号, instance_code)
+        self._pending: Dict[str, _Pending] = {}
+        self._due: List[Any] = []
+        self._seq = itertools.count()
+        self._pending_cond = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+
+        # 等待重试的回调组：到期时间小顶堆 (due_at, 序号, _Retry)
+        self._retry_due: List[Any] = []
+
+        # 运行统计
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._retried = 0
+        self._rejected = 0
+        self._coalesced = 0
+        self._flushed_groups = 0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """
+        启动后台线程（重复调用无副作用）
+        """
+        with self._lock:
+            if self._accepting:
+                return
+
+            for i in range(self.workers):
+                t = threading.Thread(
+                    target=self._run,
+                    args=(self._queues[i],),
+                    name=f"approval-callback-worker-{i}",
+                    daemon=True,
+                )
+                t.start()
+                self._threads.append(t)
+
+            # 调度线程：合并窗口到期、重试到期的回调放回分区队列
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name="approval-callback-scheduler",
+                daemon=True,
+            )
+            self._flusher.start()
+
+            self._accepting = True
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """
+        优雅停止：
+        1. 不再接收新任务
+        2. 在 timeout 内等待队列中的任务处理完
+        3. 通知所有线程退出
+        """
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+            # 合并中、等待重试的回调立即入队
+            self._pending_cond.notify_all()
+
+        deadline = time.monotonic() + timeout
+
+        if self._flusher is not None:
+            self._flusher.join(timeout=max(0.0, deadline - time.monotonic()))
+            self._flusher = None
+
+        # 等待所有分区排空（含正在处理的任务）
+        while time.monotonic() < deadline:
+            if all(q.unfinished_tasks == 0 for q in self._queues):
+                break
+            time.sleep(0.05)
+
+        # 每个分区发送停止信号；队列满时丢弃剩余任务，避免阻塞退出
+        for q in self._queues:
+            while True:
+                try:
+                    q.put_nowait(_STOP)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                        q.task_done()
+                    except queue.Empty:
+                        pass
+
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    # 入队
+    # ------------------------------------------------------------------
+
+    def submit(self, payload: Dict[str, Any]) -> bool:
+        """
+        提交一个回调 payload
+
+        返回：
+        - True：已入队
+        - False：处理池未启动或队列已满
+        """
+        if not self._accepting:
+            return False
+
+        if self.coalesce_window > 0:
+            return self._coalesce(payload)
+
+        try:
+            self._partition(payload).put_nowait(payload)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+
+    def _coalesce(self, payload: Dict[str, Any]) -> bool:
+        code = str(payload.get("instance_code") or "")
+        now = time.monotonic()
+        final = _callback_status(payload) in FINAL_STATUSES
+
+        with self._lock:
+            if not self._accepting:
+                return False
+
+            entry = self._pending.get(code)
+            if entry is None:
+                # 合并中的实例数与队列容量共用一个上限
+                capacity = sum(q.maxsize for q in self._queues)
+                if len(self._pending) >= capacity:
+                    self._rejected += 1
+                    return False
+                entry = self._pending[code] = _Pending(payload, now, now if final else now + self.coalesce_window)
+            else:
+                entry.payloads.append(payload)
+                self._coalesced += 1
+                # 窗口顺延，但不超过最长等待；终态立即入队
+                entry.due_at = now if final else min(
+                    now + self.coalesce_window,
+                    entry.first_at + self.coalesce_max_delay,
+                )
+
+            heapq.heappush(self._due, (entry.due_at, next(self._seq), code))
+            self._pending_cond.notify()
+
+        return True
+
+    def _flush_loop(self) -> None:
+        """
+        调度线程：把到期的合并组、到期的重试放入对应分区队列；停止时全部放入
+        """
+        while True:
+            with self._lock:
+                while True:
+                    stopping = not self._accepting
+                    now = time.monotonic()
+                    next_due = min(
+                        self._due[0][0] if self._due else float("inf"),
+                        self._retry_due[0][0] if self._retry_due else float("inf"),
+                    )
+                    if stopping or next_due <= now:
+                        break
+                    self._pending_cond.wait(None if next_due == float("inf") else next_due - now)
+
+                ready = self._pop_due(now, flush_all=stopping)
+                retries = []
+                while self._retry_due and (stopping or self._retry_due[0][0] <= now):
+                    retries.append(heapq.heappop(self._retry_due)[2])
+
+            retry = []
+            for code, entry in ready:
+                try:
+                    self._queues[self._partition_index(code)].put(
+                        entry.payloads,
+                        timeout=None if stopping else 0.05,
+                    )
+                except queue.Full:
+                    # 分区队列已满：稍后再试（期间新回调继续并入该组）
+                    retry.append((code, entry))
+
+            delayed = []
+            for item in retries:
+                try:
+                    self._partition(item.payloads[0]).put(item, timeout=None if stopping else 0.05)
+                except queue.Full:
+                    delayed.append(item)
+
+            with self._lock:
+                self._flushed_groups += len(ready) - len(retry)
+                for code, entry in retry:
+                    newer = self._pending.get(code)
+                    if newer is not None:
+                        # 重试期间又到达的回调：并回原来的组，保持到达顺序
+                        entry.payloads.extend(newer.payloads)
+                    self._pending[code] = entry
+                    heapq.heappush(self._due, (time.monotonic() + 0.05, next(self._seq), code))
+                for item in delayed:
+                    heapq.heappush(self._retry_due, (time.monotonic() + 0.05, next(self._seq), item))
+
+            if stopping:
+                return
+
+    def _schedule_retry(self, payloads: List[Dict[str, Any]], attempt: int, wait: float) -> None:
+        """
+        wait 秒后把这组回调放回分区队列；停止过程中直接入队（不再等待退避）
+        """
+        item = _Retry(payloads, attempt)
+        with self._lock:
+            if self._accepting:
+                heapq.heappush(self._retry_due, (time.monotonic() + wait, next(self._seq), item))
+                self._pending_cond.notify()
+                return
+
+        try:
+            self._partition(payloads[0]).put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._failed += len(payloads)
+            logger.error(
+                "停止过程中队列已满，放弃重试",
+                extra=fields(instance_code=payloads[0].get("instance_code"), callbacks=len(payloads)),
+            )
+
+    def _pop_due(self, now: float, flush_all: bool = False) -> List[Any]:
+        # 调用方需持有 self._lock；堆中可能有窗口顺延前的旧记录，按 entry.due_at 为准
+        ready = []
+        while self._due and (flush_all or self._due[0][0] <= now):
+            _, _, code = heapq.heappop(self._due)
+            entry = self._pending.get(code)
+            if entry is None:
+                continue
+            if not flush_all and entry.due_at > now:
+                continue
+            del self._pending[code]
+            ready.append((code, entry))
+        return ready
+
+    def _partition(self, payload: Dict[str, Any]) -> "queue.Queue[Any]":
+        return self._queues[self._partition_index(str(payload.get("instance_code") or ""))]
+
+    def _partition_index(self, instance_code: str) -> int:
+        # crc32 跨进程稳定（不受 PYTHONHASHSEED 影响）
+        return zlib.crc32(instance_code.encode("utf-8")) % self.workers
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        当前处理池状态，供监控使用
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "accepting": self._accepting,
+                "queue_depth": sum(q.qsize() for q in self._queues),
+                "queue_capacity": sum(q.maxsize for q in self._queues),
+                "partition_depths": [q.qsize() for q in self._queues],
+                "coalesce_window": self.coalesce_window,
+                "pending_instances": len(self._pending),
+                "retry_scheduled": len(self._retry_due),
+                "coalesced": self._coalesced,
+                "flushed_groups": self._flushed_groups,
+                "in_flight": self._in_flight,
+                "processed": self._processed,
+                "failed": self._failed,
+                "retried": self._retried,
+                "rejected": self._rejected,
+            }
+
+    # ------------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------------
+
+    def _run(self, q: "queue.Queue[Any]") -> None:
+        while True:
+            item = q.get()
+            if item is _STOP:
+                q.task_done()
+                return
+
+            if isinstance(item, _Retry):
+                try:
+                    self._handle(item.payloads, item.attempt)
+                finally:
+                    q.task_done()
+                continue
+
+            # 队列元素为单个 payload，或合并后的一组 payload（list）
+            items = [item]
+            batch = list(item) if isinstance(item, list) else [item]
+            retries: List[_Retry] = []
+            stop = False
+
+            # 有积压时顺带取出更多任务，合并处理
+            if self.batch_handler is not None:
+                while len(batch) < self.batch_size:
+                    try:
+                        more = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is _STOP:
+                        stop = True
+                        break
+                    items.append(more)
+                    if isinstance(more, _Retry):
+                        # 到期的重试保留自己的重试次数，单独处理
+                        retries.append(more)
+                    else:
+                        batch.extend(more if isinstance(more, list) else [more])
+
+            try:
+                if len(batch) == 1:
+                    self._handle(batch)
+                else:
+                    self._handle_batch(batch)
+                for r in retries:
+                    self._handle(r.payloads, r.attempt)
+            finally:
+                for _ in items:
+                    q.task_done()
+                if stop:
+                    q.task_done()
+
+            if stop:
+                return
+
+    def _handle_batch(self, payloads: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._in_flight += len(payloads)
+
+        try:
+            # batch_handler 返回其中处理失败的 payload（其余已处理成功）
+            failed = self.batch_handler(payloads) or []
+            with self._lock:
+                self._processed += len(payloads) - len(failed)
+        except Exception as e:
+            failed = payloads
+            logger.warning("批量处理 %d 个回调失败，改为按实例处理：%s", len(payloads), e)
+        finally:
+            with self._lock:
+                self._in_flight -= len(payloads)
+
+        # 按实例重试：同一实例的一组回调仍作为一个整体，只拉取一次、写入一次
+        for group in _group_by_instance(failed):
+            self._handle(group)
+
+    def _call(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        处理同一实例的一组回调，返回其中失败的 payload
+        """
+        if len(payloads) > 1 and self.batch_handler is not None:
+            return self.batch_handler(payloads) or []
+        self.handler(payloads[0])
+        return []
+
+    def _handle(self, payloads: List[Dict[str, Any]], attempt: int = 0) -> None:
+        """
+        处理同一实例的一组回调一次；失败时按退避时间安排重试（不在当前线程中等待）
+        """
+        code = payloads[0].get("instance_code")
+        total = len(payloads)
+        with self._lock:
+            self._in_flight += total
+
+        try:
+            try:
+                failed = self._call(payloads)
+                error = None if not failed else RuntimeError("拉取审批实例失败")
+            except Exception as e:
+                failed, error = payloads, e
+
+            with self._lock:
+                self._processed += total - len(failed)
+            if error is None:
+                return
+
+            if attempt >= self.max_retries:
+                with self._lock:
+                    self._failed += len(failed)
+                logger.error(
+                    "回调后台处理失败（已放弃）：%s",
+                    error,
+                    exc_info=error,
+                    extra=fields(instance_code=code, callbacks=len(failed), attempts=attempt + 1),
+                )
+                return
+
+            wait = self.retry_backoff * (2 ** attempt)
+            with self._lock:
+                self._retried += 1
+            count_retry("callback")
+            logger.warning(
+                "回调处理失败，%.1fs 后第 %d 次重试：%s",
+                wait,
+                attempt + 1,
+                error,
+                extra=fields(instance_code=code),
+            )
+            self._schedule_retry(failed, attempt + 1, wait)
+        finally:
+            with self._lock:
+                self._in_flight -= total
+
+
+def _group_by_instance(payloads: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    # 按 instance_code 分组，保持到达顺序
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for payload in payloads:
+        groups.setdefault(str(payload.get("instance_code") or ""), []).append(payload)
+    return list(groups.values())
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_pool: Optional[CallbackWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def _process_payload(payload: Dict[str, Any]) -> None:
+    # 延迟导入，避免循环依赖
+    from app.services.approval_service import ApprovalService
+
+    ApprovalService().process_callback(payload)
+
+
+def _process_payloads(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from app.services.approval_service import ApprovalService
+
+    return ApprovalService().process_callbacks(payloads)
+
+
+def get_callback_pool() -> CallbackWorkerPool:
+    """
+    获取进程内唯一的回调处理池（按环境变量配置）
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CallbackWorkerPool(
+                    handler=_process_payload,
+                    batch_handler=_process_payloads,
+                    batch_size=int(os.getenv("CALLBACK_BATCH_SIZE", "20")),
+                    workers=int(os.getenv("CALLBACK_WORKERS", "4")),
+                    queue_size=int(os.getenv("CALLBACK_QUEUE_SIZE", "1000")),
+                    max_retries=int(os.getenv("CALLBACK_MAX_RETRIES", "3")),
+                    retry_backoff=float(os.getenv("CALLBACK_RETRY_BACKOFF", "1.0")),
+                    coalesce_window=float(os.getenv("CALLBACK_COALESCE_WINDOW", "2")),
+                    coalesce_max_delay=float(os.getenv("CALLBACK_COALESCE_MAX_DELAY", "10")),
+                )
+
+    return _pool
+
+
+def callback_mode() -> str:
+    """
+    回调处理模式（CALLBACK_MODE）：
+    - queue（默认）：入队，由后台 Worker 处理
+    - sync：在线程池中同步处理
+    - async：在事件循环中异步处理（需要 httpx / aiomysql）
+    """
+    mode = os.getenv("CALLBACK_MODE", "queue").lower()
+    return mode if mode in ("sync", "async") else "queue"
+
+
+def callback_queue_enabled() -> bool:
+    """
+    是否启用入队模式（CALLBACK_MODE=queue，默认）
+    """
+    return callback_mode() == "queue"
@@ -0,0 +1,266 @@
+"""
+用户 / 部门名称解析（入库前补全名称）
+
+审批实例只带 user_id / department_id，这里把一个或多个实例中出现的
+申请人、申请部门、各任务处理人一次收集起来，按以下顺序解析：
+1. 进程内 LRU/TTL 缓存
+2. 通讯录维表 lark_contact_dim（CONTACT_BACKEND=mysql 时）
+3. 飞书通讯录批量接口（每次最多 50 个 ID），结果回填缓存和维表
+
+飞书未返回的 ID（已离职 / 无权限）和解析失败的 ID 在缓存中记为空，
+CONTACT_NEGATIVE_TTL 秒内不再请求；解析失败不影响审批数据入库，名称留空。
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.lark_contact_api import (
+    abatch_get_departments,
+    abatch_get_users,
+    batch_get_departments,
+    batch_get_users,
+)
+from app.utils.log import fields, get_logger
+from app.utils.ttl_cache import MISSING, TTLCache
+
+logger = get_logger(__name__)
+
+
+USER = "user"
+DEPARTMENT = "department"
+
+# 解析结果：{"user": {user_id: 名称}, "department": {department_id: 名称}}
+ContactNames = Dict[str, Dict[str, Optional[str]]]
+
+
+def contact_ids(approval_instances: Iterable[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+    """
+    收集实例中出现的 (user_id 集合, department_id 集合)：申请人、申请部门、任务处理人
+    """
+    users: Set[str] = set()
+    departments: Set[str] = set()
+
+    for inst in approval_instances:
+        if inst.get("user_id"):
+            users.add(inst["user_id"])
+        if inst.get("department_id"):
+            departments.add(inst["department_id"])
+        for task in inst.get("task_list") or []:
+            if task.get("user_id"):
+                users.add(task["user_id"])
+
+    return users, departments
+
+
+class ContactResolver:
+    """
+    缓存 + 维表 + 飞书批量接口 的名称解析器
+
+    - ttl：已解析名称在进程内缓存的秒数
+    - negative_ttl：未解析 ID 的缓存秒数
+    - repo：ContactDimRepository，为 None 时不读写维表
+    - dim_ttl：维表中的名称超过该秒数视为过期，重新向飞书查询
+    - enabled：为 False 时不做任何解析（名称全部留空）
+    """
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        negative_ttl: int = 300,
+        max_entries: int = 50000,
+        repo=None,
+        dim_ttl: int = 86400,
+        enabled: bool = True,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.repo = repo
+        self.dim_ttl = dim_ttl
+        self.enabled = enabled
+        self.cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+        self._fetchers: Dict[str, Tuple[Callable, Callable]] = {
+            USER: (batch_get_users, abatch_get_users),
+            DEPARTMENT: (batch_get_departments, abatch_get_departments),
+        }
+
+        self._lock = threading.Lock()
+        self._dim_hits = 0
+        self._fetched = 0
+        self._unresolved = 0
+        self._failures = 0
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+
+    def resolve(self, approval_instances: Iterable[Dict[str, Any]]) -> ContactNames:
+        """
+        解析实例中出现的所有用户 / 部门名称
+        """
+        names: ContactNames = {USER: {}, DEPARTMENT: {}}
+        if not self.enabled:
+            return names
+
+        users, departments = contact_ids(approval_instances)
+        for kind, ids in ((USER, users), (DEPARTMENT, departments)):
+            found, missing = self._from_cache(kind, ids)
+            if missing and self.repo is not None:
+                found.update(self._from_dim(kind, self.repo.get_names, missing))
+                missing = [i for i in missing if i not in found]
+            if missing:
+                found.update(self._from_lark(kind, missing, self._fetchers[kind][0]))
+            names[kind] = found
+
+        return names
+
+    async def aresolve(self, approval_instances: Iterable[Dict[str, Any]]) -> ContactNames:
+        """
+        resolve 的 asyncio 版本（维表为阻塞 I/O，放到线程中执行）
+        """
+        names: ContactNames = {USER: {}, DEPARTMENT: {}}
+        if not self.enabled:
+            return names
+
+        users, departments = contact_ids(approval_instances)
+        for kind, ids in ((USER, users), (DEPARTMENT, departments)):
+            found, missing = self._from_cache(kind, ids)
+            if missing and self.repo is not None:
+                found.update(await asyncio.to_thread(self._from_dim, kind, self.repo.get_names, missing))
+                missing = [i for i in missing if i not in found]
+            if missing:
+                found.update(await self._afrom_lark(kind, missing, self._fetchers[kind][1]))
+            names[kind] = found
+
+        return names
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {
+                "enabled": self.enabled,
+                "backend": "mysql" if self.repo is not None else "memory",
+                "dim_hits": self._dim_hits,
+                "fetched": self._fetched,
+                "unresolved": self._unresolved,
+                "failures": self._failures,
+            }
+
+        result["cache"] = self.cache.stats()
+        return result
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _from_cache(self, kind: str, ids: Iterable[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        found: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for i in sorted(ids):
+            name = self.cache.get((kind, i))
+            if name is MISSING:
+                missing.append(i)
+            else:
+                found[i] = name
+        return found, missing
+
+    def _from_dim(self, kind: str, get_names: Callable, ids: List[str]) -> Dict[str, str]:
+        try:
+            stored = get_names(kind, ids, self.dim_ttl)
+        except Exception as e:
+            # 维表不可用时直接向飞书查询
+            logger.warning("读取通讯录维表失败：%s", e, extra=fields(kind=kind))
+            return {}
+
+        for i, name in stored.items():
+            self.cache.set((kind, i), name)
+        with self._lock:
+            self._dim_hits += len(stored)
+        return stored
+
+    def _from_lark(self, kind: str, ids: List[str], fetch: Callable) -> Dict[str, Optional[str]]:
+        try:
+            items = fetch(ids)
+        except Exception as e:
+            return self._fetch_failed(kind, ids, e)
+
+        if self.repo is not None and items:
+            try:
+                self.repo.save(kind, items)
+            except Exception as e:
+                logger.warning("写入通讯录维表失败：%s", e, extra=fields(kind=kind))
+
+        return self._remember(kind, ids, items)
+
+    async def _afrom_lark(self, kind: str, ids: List[str], fetch: Callable) -> Dict[str, Optional[str]]:
+        try:
+            items = await fetch(ids)
+        except Exception as e:
+            return self._fetch_failed(kind, ids, e)
+
+        if self.repo is not None and items:
+            try:
+                await asyncio.to_thread(self.repo.save, kind, items)
+            except Exception as e:
+                logger.warning("写入通讯录维表失败：%s", e, extra=fields(kind=kind))
+
+        return self._remember(kind, ids, items)
+
+    def _remember(self, kind: str, ids: List[str], items: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        names: Dict[str, Optional[str]] = {}
+        for i in ids:
+            item = items.get(i)
+            name = item.get("name") if item else None
+            names[i] = name
+            self.cache.set((kind, i), name, ttl=None if name else self.negative_ttl)
+
+        with self._lock:
+            self._fetched += len(items)
+            self._unresolved += sum(1 for n in names.values() if not n)
+
+        return names
+
+    def _fetch_failed(self, kind: str, ids: List[str], error: Exception) -> Dict[str, Optional[str]]:
+        # 解析失败：名称留空，短时间内不再重复请求（避免每个回调都打到飞书限流）
+        logger.warning("解析通讯录名称失败，名称留空：%s", error, extra=fields(kind=kind, count=len(ids)))
+        for i in ids:
+            self.cache.set((kind, i), None, ttl=self.negative_ttl)
+        with self._lock:
+            self._failures += 1
+        return {i: None for i in ids}
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_resolver: Optional[ContactResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_contact_resolver() -> ContactResolver:
+    """
+    获取进程内唯一的名称解析器（按环境变量配置）
+    """
+    global _resolver
+
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                repo = None
+                if os.getenv("CONTACT_BACKEND", "memory").lower() == "mysql":
+                    from app.repository.contact_repo import ContactDimRepository
+
+                    repo = ContactDimRepository()
+
+                _resolver = ContactResolver(
+                    ttl=int(os.getenv("CONTACT_CACHE_TTL", "3600")),
+                    negative_ttl=int(os.getenv("CONTACT_NEGATIVE_TTL", "300")),
+                    max_entries=int(os.getenv("CONTACT_CACHE_MAX_ENTRIES", "50000")),
+                    repo=repo,
+                    dim_ttl=int(os.getenv("CONTACT_DIM_TTL", "86400")),
+                    enabled=os.getenv("CONTACT_ENRICH", "1").lower() not in ("0", "false", "no"),
+                )
+
+    return _resolver
@@ -0,0 +1,176 @@
+"""
+回调幂等（去重）
+
+飞书会重推回调，同一个审批实例也会连续收到多个事件。
+在去重窗口内，已经成功处理过的回调直接确认，不再拉取审批实例、不再重写数据库。
+
+去重键：
+- uuid:<事件 uuid>：同一事件的重推
+- state:<事件类型>:<instance_code>[:<task_id>]:<status>:<时间>：不同事件但实例 / 任务状态相同
+  （回调中没有 update_time / operate_time 时不生成该键，避免把之后同状态的新回调误判为重复；
+  事件类型和 task_id 参与拼键，任务事件不会吞掉同一时间的实例事件）
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.utils.ttl_cache import TTLCache
+
+
+def _event_body(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # 兼容 飞书 v1 事件格式（字段在 event 下）和直接转发的扁平格式
+    event = payload.get("event")
+    return event if isinstance(event, dict) else {}
+
+
+def idempotency_keys(payload: Dict[str, Any]) -> List[str]:
+    """
+    根据回调 payload 生成去重键列表（可能为空）
+    """
+    event = _event_body(payload)
+    keys: List[str] = []
+
+    uuid = (
+        payload.get("uuid")
+        or (payload.get("header") or {}).get("event_id")
+        or event.get("uuid")
+    )
+    if uuid:
+        keys.append(f"uuid:{uuid}")
+
+    instance_code = payload.get("instance_code") or event.get("instance_code")
+    status = payload.get("status") or event.get("status")
+    version = (
+        payload.get("update_time")
+        or payload.get("operate_time")
+        or event.get("update_time")
+        or event.get("operate_time")
+    )
+    if instance_code and version:
+        # v1 事件的顶层 type 为 event_callback，事件类型在 event.type
+        event_type = (
+            event.get("type")
+            or (payload.get("header") or {}).get("event_type")
+            or payload.get("type")
+            or ""
+        )
+        task_id = payload.get("task_id") or event.get("task_id")
+        subject = f"{instance_code}:{task_id}" if task_id else instance_code
+        keys.append(f"state:{event_type}:{subject}:{status or ''}:{version}")
+
+    return keys
+
+
+class IdempotencyGuard:
+    """
+    进程内 LRU/TTL 缓存 + 可选的 MySQL 去重表
+
+    - window：去重窗口（秒）
+    - max_entries：进程内缓存最大条目数
+    - repo：CallbackDedupeRepository，为 None 时只用进程内缓存
+    """
+
+    def __init__(self, window: int = 600, max_entries: int = 10000, repo=None):
+        self.window = window
+        self.repo = repo
+        self.cache = TTLCache(max_entries=max_entries, ttl=window)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._marks = 0
+
+    def seen(self, payload: Dict[str, Any]) -> bool:
+        """
+        回调是否在去重窗口内处理过
+        """
+        keys = idempotency_keys(payload)
+        if not keys:
+            return False
+
+        hit = any(self.cache.get(k, None) for k in keys)
+
+        if not hit and self.repo is not None:
+            hit = self.repo.any_seen(keys, self.window)
+            if hit:
+                # 回填进程内缓存，后续重复直接在内存命中
+                for k in keys:
+                    self.cache.set(k, True)
+
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+        return hit
+
+    def mark(self, payload: Dict[str, Any]) -> None:
+        """
+        回调处理成功后调用，记录去重键
+        """
+        keys = idempotency_keys(payload)
+        if not keys:
+            return
+
+        for k in keys:
+            self.cache.set(k, True)
+
+        if self.repo is not None:
+            instance_code = payload.get("instance_code") or _event_body(payload).get("instance_code")
+            self.repo.mark(keys, instance_code)
+
+            with self._lock:
+                self._marks += 1
+                purge = self._marks % 1000 == 0
+
+            # 定期清理过期记录
+            if purge:
+                self.repo.purge(self.window)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            result = {
+                "window": self.window,
+                "backend": "mysql" if self.repo is not None else "memory",
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / total, 4) if total else 0.0,
+            }
+
+        result["cache"] = self.cache.stats()
+        return result
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_guard: Optional[IdempotencyGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_idempotency_guard() -> IdempotencyGuard:
+    """
+    获取进程内唯一的去重器（按环境变量配置）
+    """
+    global _guard
+
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                repo = None
+                if os.getenv("IDEMPOTENCY_BACKEND", "memory").lower() == "mysql":
+                    from app.repository.dedupe_repo import CallbackDedupeRepository
+
+                    repo = CallbackDedupeRepository()
+
+                _guard = IdempotencyGuard(
+                    window=int(os.getenv("IDEMPOTENCY_WINDOW", "600")),
+                    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+                    repo=repo,
+                )
+
+    return _guard
@@ -1,11 +1,20 @@
-import requests
-from app.services.lark_client import get_app_access_token
+from typing import List, Optional, Tuple
 
+import requests
+from app.services.lark_http import LARK_BASE_URL, get_lark_http
+from app.services.lark_client import (
+    INVALID_TOKEN_CODES,
+    aget_app_access_token,
+    get_app_access_token,
+    invalidate_app_access_token,
+)
+from app.utils.log import dump_payload, get_logger
+from app.utils.metrics import count_retry, timed
 
-# 飞书开放平台基础地址
-LARK_BASE_URL = "https://open.larksuite.com"
+logger = get_logger(__name__)
 
 
+@timed("instance_fetch")
 def get_approval_instance(instance_code: str) -> dict:
     """
     根据 instance_code 调用飞书审批 v4 接口，获取完整审批实例数据
@@ -14,29 +23,123 @@ def get_approval_instance(instance_code: str) -> dict:
     if not instance_code:
         raise ValueError("instance_code 不能为空")
 
-    token = get_app_access_token()
+    url = f"{LARK_BASE_URL}/open-apis/approval/v4/instances/{instance_code}"
+
+    # v4 接口真实数据在 data 字段中
+    return _get_data(url, endpoint="approval_instance", label="审批实例接口")
+
+
+@timed("instance_fetch")
+async def aget_approval_instance(instance_code: str) -> dict:
+    """
+    get_approval_instance 的 asyncio 版本
+    """
+
+    if not instance_code:
+        raise ValueError("instance_code 不能为空")
 
     url = f"{LARK_BASE_URL}/open-apis/approval/v4/instances/{instance_code}"
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
+    return await _aget_data(url, endpoint="approval_instance", label="审批实例接口")
+
+
+def list_approval_instance_codes(
+    approval_code: str,
+    start_time: int,
+    end_time: int,
+    page_size: int = 100,
+    page_token: Optional[str] = None,
+) -> Tuple[List[str], Optional[str], bool]:
+    """
+    分页查询某个审批定义在时间窗口内的审批实例 code
+
+    - start_time / end_time：毫秒时间戳（按实例发起时间筛选）
+    - 返回：(instance_code 列表, 下一页 page_token, 是否还有下一页)
+    """
+
+    if not approval_code:
+        raise ValueError("approval_code 不能为空")
+
+    params = {
+        "approval_code": approval_code,
+        "start_time": str(start_time),
+        "end_time": str(end_time),
+        "page_size": page_size,
     }
+    if page_token:
+        params["page_token"] = page_token
+
+    data = _get_data(
+        f"{LARK_BASE_URL}/open-apis/approval/v4/instances",
+        endpoint="approval_instance_list",
+        label="审批实例列表接口",
+        params=params,
+    )
+
+    return (
+        data.get("instance_code_list") or [],
+        data.get("page_token"),
+        bool(data.get("has_more")),
+    )
+
+
+def _get_data(url: str, endpoint: str, label: str, params: Optional[dict] = None) -> dict:
+    """
+    带 token 调用飞书 GET 接口，校验后返回 data 字段
+    """
+
+    token = get_app_access_token()
+    resp = _get_with_token(url, token, endpoint, params)
+
+    # token 被飞书判定无效（被重置 / 提前失效）：强制刷新后重试一次
+    if _is_invalid_token(resp):
+        count_retry("invalid_token")
+        invalidate_app_access_token(token)
+        token = get_app_access_token()
+        resp = _get_with_token(url, token, endpoint, params)
+
+    return _parse_data(resp, url, label)
+
+
+async def _aget_data(url: str, endpoint: str, label: str, params: Optional[dict] = None) -> dict:
+    """
+    _get_data 的 asyncio 版本
+    """
+    from app.services.lark_http_async import get_async_lark_http
+
+    client = get_async_lark_http()
 
-    resp = requests.get(url, headers=headers, timeout=10)
+    token = await aget_app_access_token()
+    resp = await client.get(url, endpoint=endpoint, headers=_auth_headers(token), params=params)
 
-    # 打印完整响应，方便定位问题
-    print("\n==== 飞书审批实例接口返回 ====")
-    print("请求 URL:", url)
-    print("HTTP 状态码:", resp.status_code)
-    print("响应 Header:", resp.headers)
-    print("原始响应内容:", repr(resp.text))
-    print("================================\n")
+    if _is_invalid_token(resp):
+        count_retry("invalid_token")
+        invalidate_app_access_token(token)
+        token = await aget_app_access_token()
+        resp = await client.get(url, endpoint=endpoint, headers=_auth_headers(token), params=params)
+
+    return _parse_data(resp, url, label)
+
+
+def _parse_data(resp, url: str, label: str) -> dict:
+    """
+    校验飞书响应（requests / httpx 响应均可），返回 data 字段
+    """
+
+    # 按采样输出完整响应（DEBUG），方便定位问题
+    dump_payload(
+        logger,
+        f"飞书{label}返回",
+        resp.text,
+        url=url,
+        status=resp.status_code,
+        log_id=resp.headers.get("X-Tt-Logid"),
+    )
 
     # HTTP 状态码校验
     if resp.status_code != 200:
         raise RuntimeError(
-            f"审批实例接口请求失败，HTTP 状态码={resp.status_code}，返回内容={resp.text}"
+            f"{label}请求失败，HTTP 状态码={resp.status_code}，返回内容={resp.text}"
         )
 
     # Content-Type 校验
@@ -51,7 +154,7 @@ def get_approval_instance(instance_code: str) -> dict:
         payload = resp.json()
     except Exception as e:
         raise RuntimeError(
-            f"审批实例接口 JSON 解析失败，错误={e}，原始内容={resp.text}"
+            f"{label} JSON 解析失败，错误={e}，原始内容={resp.text}"
         )
 
     # 飞书业务 code 校验
@@ -60,5 +163,32 @@ def get_approval_instance(instance_code: str) -> dict:
             f"飞书接口业务错误，code={payload.get('code')}，msg={payload.get('msg')}"
         )
 
-    # v4 接口真实数据在 data 字段中
     return payload.get("data", {})
+
+
+def _get_with_token(
+    url: str,
+    token: str,
+    endpoint: str,
+    params: Optional[dict] = None,
+) -> requests.Response:
+    return get_lark_http().get(url, endpoint=endpoint, headers=_auth_headers(token), params=params)
+
+
+def _auth_headers(token: str) -> dict:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+
+
+def _is_invalid_token(resp) -> bool:
+    """
+    判断飞书是否返回了 token 无效类错误码（HTTP 状态码可能是 200 / 400 / 401）
+    """
+    try:
+        payload = resp.json()
+    except Exception:
+        return False
+
+    return isinstance(payload, dict) and payload.get("code") in INVALID_TOKEN_CODES
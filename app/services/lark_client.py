@@ -1,33 +1,43 @@
+import asyncio
 import os
-import requests
+import threading
+import time
+from typing import Optional, Tuple
+
+from app.services.lark_http import get_lark_http
+from app.utils.log import fields, get_logger
+from app.utils.metrics import timed
+
+logger = get_logger(__name__)
 
 
 # 飞书获取 app_access_token 的接口（内部应用）
-LARK_TOKEN_URL = "https://open.larksuite.com/open-apis/auth/v3/app_access_token/internal"
+LARK_TOKEN_PATH = "/open-apis/auth/v3/app_access_token/internal"
 
+# 飞书返回的 token 无效 / 过期类错误码，遇到时强制刷新 token 后重试一次
+INVALID_TOKEN_CODES = {99991661, 99991663, 99991664, 99991668}
 
-def get_app_access_token() -> str:
-    """
-    获取飞书 app_access_token
-    """
 
+def _token_request_body() -> dict:
     app_id = os.getenv("LARK_APP_ID")
     app_secret = os.getenv("LARK_APP_SECRET")
 
     if not app_id or not app_secret:
         raise RuntimeError("未配置 LARK_APP_ID 或 LARK_APP_SECRET")
 
-    payload = {
+    return {
         "app_id": app_id,
         "app_secret": app_secret
     }
 
-    resp = requests.post(LARK_TOKEN_URL, json=payload, timeout=10)
 
-    print("\n==== 获取 app_access_token 返回 ====")
-    print("STATUS:", resp.status_code)
-    print("RAW RESPONSE:", repr(resp.text))
-    print("=================================\n")
+def _parse_token_response(resp) -> Tuple[str, int]:
+    """
+    校验获取 token 的响应（requests / httpx 响应均可），返回 (token, 有效期秒数)
+    """
+
+    # 响应中包含 token，只记录状态，不输出原文
+    logger.debug("获取 app_access_token 返回", extra=fields(status=resp.status_code))
 
     if resp.status_code != 200:
         raise RuntimeError(f"获取 token 失败，HTTP 状态码={resp.status_code}")
@@ -35,10 +45,202 @@ def get_app_access_token() -> str:
     data = resp.json()
 
     if data.get("code") != 0:
-        raise RuntimeError(f"获取 token 失败：{data}")
+        raise RuntimeError(f"获取 token 失败：code={data.get('code')}，msg={data.get('msg')}")
 
     token = data.get("app_access_token")
     if not token:
         raise RuntimeError("返回数据中未包含 app_access_token")
 
-    return token
+    # expire 单位为秒，飞书默认约 2 小时
+    return token, int(data.get("expire") or 0)
+
+
+@timed("token_fetch")
+def _fetch_app_access_token() -> Tuple[str, int]:
+    """
+    调用飞书接口获取新的 app_access_token
+
+    返回：(token, 有效期秒数)
+    """
+
+    # 获取 token 没有副作用，允许和 GET 一样重试
+    resp = get_lark_http().post(
+        LARK_TOKEN_PATH,
+        endpoint="token",
+        json=_token_request_body(),
+        idempotent=True,
+    )
+    return _parse_token_response(resp)
+
+
+@timed("token_fetch")
+async def _afetch_app_access_token() -> Tuple[str, int]:
+    """
+    _fetch_app_access_token 的 asyncio 版本
+    """
+    from app.services.lark_http_async import get_async_lark_http
+
+    resp = await get_async_lark_http().post(
+        LARK_TOKEN_PATH,
+        endpoint="token",
+        json=_token_request_body(),
+        idempotent=True,
+    )
+    return _parse_token_response(resp)
+
+
+class AppAccessTokenCache:
+    """
+    进程级 app_access_token 缓存
+
+    - 按飞书返回的 expire 计算过期时间
+    - 距过期不足 refresh_ahead 秒时提前刷新：
+      抢到锁的调用方负责刷新，其它调用方继续使用旧 token，不阻塞
+    - 已过期 / 无 token 时，所有调用方排队等待同一次刷新（single-flight）
+    - aget 为 asyncio 版本，与同步调用方共享同一份 token
+    """
+
+    def __init__(self, refresh_ahead: int = 300):
+        self.refresh_ahead = refresh_ahead
+
+        self._token: Optional[str] = None
+        self._expire_at = 0.0
+        self._lock = threading.Lock()
+
+        # 异步调用方的 single-flight 锁（在事件循环中首次使用时创建）
+        self._async_lock: Optional[asyncio.Lock] = None
+
+    def get(self) -> str:
+        token, expire_at = self._token, self._expire_at
+        now = time.time()
+
+        # 1. 有效且未进入提前刷新窗口，直接返回
+        if token and now < expire_at - self.refresh_ahead:
+            return token
+
+        # 2. 仍然有效，只是快过期：非阻塞地尝试刷新
+        if token and now < expire_at:
+            if not self._lock.acquire(blocking=False):
+                # 已有其它调用方在刷新
+                return token
+            try:
+                if self._token != token:
+                    # 拿到锁之前已被别人刷新
+                    return self._token
+                try:
+                    return self._refresh()
+                except Exception as e:
+                    # 提前刷新失败不影响使用，旧 token 仍有效
+                    logger.warning("提前刷新 app_access_token 失败，继续使用旧 token：%s", e)
+                    return token
+            finally:
+                self._lock.release()
+
+        # 3. 没有 token 或已过期：排队等待同一次刷新
+        with self._lock:
+            if self._token and time.time() < self._expire_at:
+                return self._token
+            return self._refresh()
+
+    def expires_in(self) -> float:
+        """
+        缓存的 token 距过期的秒数（无 token 时为 0）
+        """
+        if not self._token:
+            return 0.0
+        return max(0.0, self._expire_at - time.time())
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        使缓存失效
+
+        传入 token 时只在缓存的仍是该 token 时失效，
+        避免并发场景下把别人刚刷新的新 token 清掉
+        """
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expire_at = 0.0
+
+    def _refresh(self) -> str:
+        # 调用方需持有 self._lock
+        token, expire = _fetch_app_access_token()
+        self._token = token
+        self._expire_at = time.time() + expire
+        return token
+
+    async def aget(self) -> str:
+        """
+        get 的 asyncio 版本：刷新期间让出事件循环，同一事件循环内的调用方排队等待同一次刷新
+        """
+        token, expire_at = self._token, self._expire_at
+        now = time.time()
+
+        if token and now < expire_at - self.refresh_ahead:
+            return token
+
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        lock = self._async_lock
+
+        # 快过期：已有协程在刷新时直接用旧 token
+        if token and now < expire_at:
+            if lock.locked():
+                return token
+            async with lock:
+                if self._token != token:
+                    return self._token
+                try:
+                    return await self._arefresh()
+                except Exception as e:
+                    logger.warning("提前刷新 app_access_token 失败，继续使用旧 token：%s", e)
+                    return token
+
+        async with lock:
+            if self._token and time.time() < self._expire_at:
+                return self._token
+            return await self._arefresh()
+
+    async def _arefresh(self) -> str:
+        # 调用方需持有 self._async_lock
+        # 不取线程锁：同步调用方刷新时会持锁等待网络，这里取锁会阻塞整个事件循环
+        token, expire = await _afetch_app_access_token()
+        self._token = token
+        self._expire_at = time.time() + expire
+        return token
+
+
+# 进程内唯一的 token 缓存
+_token_cache = AppAccessTokenCache(
+    refresh_ahead=int(os.getenv("LARK_TOKEN_REFRESH_AHEAD", "300")),
+)
+
+
+@timed("token")
+def get_app_access_token() -> str:
+    """
+    获取飞书 app_access_token（带缓存，过期前自动刷新）
+    """
+    return _token_cache.get()
+
+
+@timed("token")
+async def aget_app_access_token() -> str:
+    """
+    get_app_access_token 的 asyncio 版本
+    """
+    return await _token_cache.aget()
+
+
+def app_access_token_expires_in() -> float:
+    """
+    缓存的 app_access_token 距过期的秒数（就绪检查使用，不触发刷新）
+    """
+    return _token_cache.expires_in()
+
+
+def invalidate_app_access_token(token: Optional[str] = None) -> None:
+    """
+    飞书返回 token 无效时调用，下次 get_app_access_token 会重新获取
+    """
+    _token_cache.invalidate(token)
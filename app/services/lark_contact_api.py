@@ -0,0 +1,93 @@
+"""
+飞书通讯录批量接口（用户 / 部门名称解析）
+
+- GET /open-apis/contact/v3/users/batch：一次最多 50 个 user_id
+- GET /open-apis/contact/v3/departments/batch：一次最多 50 个 department_id
+
+需要应用开通通讯录读取权限；返回中缺失的 ID（已离职 / 无权限）不报错，调用方按未解析处理。
+"""
+
+from typing import Dict, List
+
+from app.services.lark_approval_api import _aget_data, _get_data
+from app.services.lark_http import LARK_BASE_URL
+from app.utils.metrics import timed
+
+
+# 飞书批量接口单次最多 ID 数
+CONTACT_BATCH_SIZE = 50
+
+USERS_BATCH_URL = f"{LARK_BASE_URL}/open-apis/contact/v3/users/batch"
+DEPARTMENTS_BATCH_URL = f"{LARK_BASE_URL}/open-apis/contact/v3/departments/batch"
+
+
+def _chunks(ids: List[str]) -> List[List[str]]:
+    return [ids[i:i + CONTACT_BATCH_SIZE] for i in range(0, len(ids), CONTACT_BATCH_SIZE)]
+
+
+def _user_params(ids: List[str]) -> dict:
+    return {"user_ids": ids, "user_id_type": "user_id"}
+
+
+def _department_params(ids: List[str]) -> dict:
+    return {"department_ids": ids, "department_id_type": "department_id"}
+
+
+def _users_by_id(data: dict) -> Dict[str, dict]:
+    return {u["user_id"]: u for u in data.get("items") or [] if u.get("user_id")}
+
+
+def _departments_by_id(data: dict) -> Dict[str, dict]:
+    return {d["department_id"]: d for d in data.get("items") or [] if d.get("department_id")}
+
+
+@timed("contact_fetch")
+def batch_get_users(user_ids: List[str]) -> Dict[str, dict]:
+    """
+    按 user_id 批量查询用户，返回 {user_id: 用户信息}
+    """
+    result: Dict[str, dict] = {}
+    for chunk in _chunks(user_ids):
+        data = _get_data(USERS_BATCH_URL, endpoint="contact_user_batch",
+                         label="通讯录用户批量接口", params=_user_params(chunk))
+        result.update(_users_by_id(data))
+    return result
+
+
+@timed("contact_fetch")
+def batch_get_departments(department_ids: List[str]) -> Dict[str, dict]:
+    """
+    按 department_id 批量查询部门，返回 {department_id: 部门信息}
+    """
+    result: Dict[str, dict] = {}
+    for chunk in _chunks(department_ids):
+        data = _get_data(DEPARTMENTS_BATCH_URL, endpoint="contact_department_batch",
+                         label="通讯录部门批量接口", params=_department_params(chunk))
+        result.update(_departments_by_id(data))
+    return result
+
+
+@timed("contact_fetch")
+async def abatch_get_users(user_ids: List[str]) -> Dict[str, dict]:
+    """
+    batch_get_users 的 asyncio 版本
+    """
+    result: Dict[str, dict] = {}
+    for chunk in _chunks(user_ids):
+        data = await _aget_data(USERS_BATCH_URL, endpoint="contact_user_batch",
+                                label="通讯录用户批量接口", params=_user_params(chunk))
+        result.update(_users_by_id(data))
+    return result
+
+
+@timed("contact_fetch")
+async def abatch_get_departments(department_ids: List[str]) -> Dict[str, dict]:
+    """
+    batch_get_departments 的 asyncio 版本
+    """
+    result: Dict[str, dict] = {}
+    for chunk in _chunks(department_ids):
+        data = await _aget_data(DEPARTMENTS_BATCH_URL, endpoint="contact_department_batch",
+                                label="通讯录部门批量接口", params=_department_params(chunk))
+        result.update(_departments_by_id(data))
+    return result
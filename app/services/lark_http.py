@@ -0,0 +1,215 @@
+"""
+飞书开放平台共享 HTTP 客户端
+
+作用：
+- 进程内复用同一个 requests.Session，连接池 + keep-alive，避免每次请求都重新建立 TCP / TLS
+- 按接口配置超时时间
+- 幂等请求（GET）在 5xx / 连接被重置时按带抖动的指数退避重试
+- 每次请求前经过按接口配置的令牌桶限流；被飞书限流（429 / 频控错误码）时降速并排队重试
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.rate_limiter import (
+    LARK_RATE_LIMIT_CODES,
+    get_rate_limiter,
+    parse_rate_limit_headers,
+)
+from app.utils.metrics import count_retry
+
+
+# 飞书开放平台基础地址（可通过环境变量指向测试 / 代理地址）
+LARK_BASE_URL = os.getenv("LARK_BASE_URL", "https://open.larksuite.com").rstrip("/")
+
+# 各接口默认读超时（秒），可通过 LARK_TIMEOUT_<ENDPOINT 大写> 覆盖
+DEFAULT_READ_TIMEOUTS = {
+    "token": 5.0,
+    "approval_instance": 10.0,
+    "approval_instance_list": 10.0,
+    # 附件下载为流式读取，读超时是两次收到数据之间的最长间隔
+    "attachment": 30.0,
+}
+
+
+def _endpoint_timeout(endpoint: str) -> Tuple[float, float]:
+    """
+    返回 (连接超时, 读超时)
+    """
+    connect_timeout = float(os.getenv("LARK_CONNECT_TIMEOUT", "3"))
+    read_timeout = float(
+        os.getenv(
+            f"LARK_TIMEOUT_{endpoint.upper()}",
+            DEFAULT_READ_TIMEOUTS.get(endpoint, 10.0),
+        )
+    )
+    return connect_timeout, read_timeout
+
+
+class LarkHttpClient:
+    """
+    带连接池的飞书 HTTP 客户端
+
+    - pool_size：单个 host 的最大连接数（应不小于并发调用飞书的线程数）
+    - max_retries：幂等请求的最大重试次数
+    - backoff：退避基数（秒），第 n 次重试等待 random(0, backoff * 2^n)
+    - rate_limit_retries：被飞书限流后的最大重试次数（限流的请求未被处理，非幂等请求也可重试）
+    """
+
+    def __init__(
+        self,
+        base_url: str = LARK_BASE_URL,
+        pool_size: int = 20,
+        max_retries: int = 2,
+        backoff: float = 0.3,
+        rate_limit_retries: int = 5,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.rate_limit_retries = max(0, rate_limit_retries)
+
+        self.session = requests.Session()
+
+        # 重试由本类自行控制，urllib3 层不重试
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        endpoint: str,
+        idempotent: Optional[bool] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        发起请求
+
+        - path：以 / 开头的接口路径，或完整 URL
+        - endpoint：接口名，用于选择超时和限流配置
+        - idempotent：是否允许重试，默认只有 GET 重试
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+        retries = self.max_retries if idempotent else 0
+
+        kwargs.setdefault("timeout", _endpoint_timeout(endpoint))
+        limiter = get_rate_limiter(endpoint)
+
+        attempt = 0
+        throttled = 0
+        while True:
+            limiter.acquire()
+
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                # 连接被重置 / 超时：可重试则退避后重试
+                if attempt >= retries:
+                    raise
+            else:
+                retry_after, remaining = parse_rate_limit_headers(resp.headers)
+
+                if _is_rate_limited(resp):
+                    # 被限流：降速并暂停发放令牌，重新排队（不计入普通重试次数）
+                    limiter.throttle(retry_after)
+                    if throttled >= self.rate_limit_retries:
+                        return resp
+                    # 丢弃的响应先关闭，把连接还给连接池（stream=True 时不关闭会一直占用）
+                    resp.close()
+                    throttled += 1
+                    count_retry("lark_rate_limited")
+                    continue
+
+                if remaining == 0 and retry_after:
+                    # 配额已用完，在重置前不再发出新请求
+                    limiter.pause_until_reset(retry_after)
+                elif resp.status_code < 400:
+                    limiter.recover()
+
+                if resp.status_code < 500 or attempt >= retries:
+                    return resp
+                resp.close()
+
+            count_retry("lark_http")
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
+
+    def get(self, path: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _is_rate_limited(resp: requests.Response) -> bool:
+    """
+    HTTP 429，或 4xx 响应体中带飞书频控错误码
+    """
+    if resp.status_code == 429:
+        return True
+    if resp.status_code < 400 or resp.status_code >= 500:
+        return False
+
+    try:
+        body = resp.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("code") in LARK_RATE_LIMIT_CODES
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_client: Optional[LarkHttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_lark_http() -> LarkHttpClient:
+    """
+    获取进程内唯一的飞书 HTTP 客户端（按环境变量配置）
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LarkHttpClient(
+                    pool_size=int(os.getenv("LARK_HTTP_POOL_SIZE", "20")),
+                    max_retries=int(os.getenv("LARK_HTTP_MAX_RETRIES", "2")),
+                    backoff=float(os.getenv("LARK_HTTP_BACKOFF", "0.3")),
+                    rate_limit_retries=int(os.getenv("LARK_RATE_LIMIT_MAX_RETRIES", "5")),
+                )
+
+    return _client
+
+
+def close_lark_http() -> None:
+    """
+    关闭客户端的连接池（停机时调用；未创建过时什么也不做）
+    """
+    global _client
+
+    with _client_lock:
+        client, _client = _client, None
+
+    if client is not None:
+        client.close()
@@ -0,0 +1,158 @@
+"""
+飞书开放平台共享 HTTP 客户端（asyncio 版）
+
+与 lark_http.LarkHttpClient 行为一致（连接池、按接口超时、幂等请求带抖动重试、令牌桶限流），
+等待网络 / 限流 / 退避时让出事件循环，单个 uvicorn worker 可以同时处理多个回调。
+
+依赖 httpx（可选依赖），未安装时只有使用异步路径才会报错。
+"""
+
+import asyncio
+import os
+import random
+from typing import Optional
+
+try:
+    import httpx
+except ImportError:  # 可选依赖
+    httpx = None
+
+from app.services.lark_http import LARK_BASE_URL, _endpoint_timeout, _is_rate_limited
+from app.services.rate_limiter import get_rate_limiter, parse_rate_limit_headers
+from app.utils.metrics import count_retry
+
+
+class AsyncLarkHttpClient:
+    """
+    带连接池的飞书 HTTP 客户端（httpx.AsyncClient）
+
+    参数含义同 LarkHttpClient；需要在事件循环中创建和使用
+    """
+
+    def __init__(
+        self,
+        base_url: str = LARK_BASE_URL,
+        pool_size: int = 20,
+        max_retries: int = 2,
+        backoff: float = 0.3,
+        rate_limit_retries: int = 5,
+    ):
+        if httpx is None:
+            raise RuntimeError("异步飞书客户端需要安装 httpx")
+
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.rate_limit_retries = max(0, rate_limit_retries)
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+        )
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        endpoint: str,
+        idempotent: Optional[bool] = None,
+        **kwargs,
+    ) -> "httpx.Response":
+        """
+        发起请求，参数同 LarkHttpClient.request
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+        retries = self.max_retries if idempotent else 0
+
+        if "timeout" not in kwargs:
+            connect_timeout, read_timeout = _endpoint_timeout(endpoint)
+            kwargs["timeout"] = httpx.Timeout(read_timeout, connect=connect_timeout)
+        limiter = get_rate_limiter(endpoint)
+
+        attempt = 0
+        throttled = 0
+        while True:
+            await limiter.acquire_async()
+
+            try:
+                resp = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                # 连接被重置 / 超时：可重试则退避后重试
+                if attempt >= retries:
+                    raise
+            else:
+                retry_after, remaining = parse_rate_limit_headers(resp.headers)
+
+                if _is_rate_limited(resp):
+                    # 被限流：降速并暂停发放令牌，重新排队（不计入普通重试次数）
+                    limiter.throttle(retry_after)
+                    if throttled >= self.rate_limit_retries:
+                        return resp
+                    # 丢弃的响应先关闭，把连接还给连接池（stream=True 时不关闭会一直占用）
+                    await resp.aclose()
+                    throttled += 1
+                    count_retry("lark_rate_limited")
+                    continue
+
+                if remaining == 0 and retry_after:
+                    limiter.pause_until_reset(retry_after)
+                elif resp.status_code < 400:
+                    limiter.recover()
+
+                if resp.status_code < 500 or attempt >= retries:
+                    return resp
+                await resp.aclose()
+
+            count_retry("lark_http")
+            await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
+
+    async def get(self, path: str, endpoint: str, **kwargs) -> "httpx.Response":
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def post(self, path: str, endpoint: str, **kwargs) -> "httpx.Response":
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+# ----------------------------------------------------------------------
+# 进程级单例（在事件循环中创建；只在同一个事件循环中使用）
+# ----------------------------------------------------------------------
+
+_client: Optional[AsyncLarkHttpClient] = None
+
+
+def get_async_lark_http() -> AsyncLarkHttpClient:
+    """
+    获取进程内唯一的异步飞书 HTTP 客户端（按环境变量配置，同 get_lark_http）
+    """
+    global _client
+
+    # 事件循环单线程，创建过程中不会被打断，不需要加锁
+    if _client is None:
+        _client = AsyncLarkHttpClient(
+            pool_size=int(os.getenv("LARK_HTTP_POOL_SIZE", "20")),
+            max_retries=int(os.getenv("LARK_HTTP_MAX_RETRIES", "2")),
+            backoff=float(os.getenv("LARK_HTTP_BACKOFF", "0.3")),
+            rate_limit_retries=int(os.getenv("LARK_RATE_LIMIT_MAX_RETRIES", "5")),
+        )
+
+    return _client
+
+
+async def close_async_lark_http() -> None:
+    """
+    关闭异步客户端（停机时调用；未创建过时什么也不做）
+    """
+    global _client
+
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
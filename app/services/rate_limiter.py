@@ -0,0 +1,227 @@
+"""
+飞书 API 客户端限流
+
+作用：
+- 每个接口一个令牌桶，控制调用飞书的 QPS，避免触发飞书的频控
+- 调用方按到达顺序排队等待（先到先得），不直接失败
+- 根据 429 / 飞书频控错误码 / x-ratelimit-* 响应头自适应降速，之后逐步恢复
+- 记录等待时间和被限流次数，供监控使用
+
+配置：
+- LARK_RATE_LIMIT_DEFAULT：默认 QPS（可写成 "qps" 或 "qps:burst"）
+- LARK_RATE_LIMIT_<ENDPOINT 大写>：单个接口的 QPS，如 LARK_RATE_LIMIT_APPROVAL_INSTANCE=20:40
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+# 飞书频控错误码（请求频率超限）
+LARK_RATE_LIMIT_CODES = {99991400}
+
+
+class AdaptiveTokenBucket:
+    """
+    自适应令牌桶
+
+    - rate：每秒令牌数（配置上限）
+    - burst：桶容量，空闲后允许的突发请求数
+    - min_rate：降速下限
+
+    采用“预约”方式：每个调用方在锁内按顺序预约一个发放时间点，
+    然后在锁外睡到该时间点，因此天然按到达顺序公平排队，且没有忙等。
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None, min_rate: float = 1.0):
+        self.name = name
+        self.max_rate = max(0.1, rate)
+        self.rate = self.max_rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.min_rate = min(min_rate, self.max_rate)
+
+        self._lock = threading.Lock()
+        # 下一个令牌的发放时间
+        self._next_at = time.monotonic()
+
+        # 统计
+        self._acquired = 0
+        self._waited = 0
+        self._wait_seconds = 0.0
+        self._max_wait = 0.0
+        self._throttled = 0
+        self._waiting = 0
+
+    def acquire(self) -> float:
+        """
+        取一个令牌，必要时排队等待；返回等待秒数
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+            self._wait_done()
+        return wait
+
+    async def acquire_async(self) -> float:
+        """
+        acquire 的 asyncio 版本：排队期间让出事件循环
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+            self._wait_done()
+        return wait
+
+    def _reserve(self) -> float:
+        # 按到达顺序预约发放时间点，返回需要等待的秒数
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self.rate
+
+            # 空闲期间最多累积 burst 个令牌
+            start = max(self._next_at, now - (self.burst - 1) * interval)
+            self._next_at = start + interval
+            wait = max(0.0, start - now)
+
+            self._acquired += 1
+            if wait > 0:
+                self._waited += 1
+                self._waiting += 1
+                self._wait_seconds += wait
+                self._max_wait = max(self._max_wait, wait)
+
+        return wait
+
+    def _wait_done(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        被飞书限流：降速一半，并在 retry_after 秒内暂停发放令牌
+        """
+        with self._lock:
+            self._throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._next_at = max(self._next_at, time.monotonic() + pause)
+
+    def pause_until_reset(self, reset_after: float) -> None:
+        """
+        配额已用完（remaining=0）：在配额重置前暂停发放令牌，不降速
+        """
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + reset_after)
+
+    def recover(self) -> None:
+        """
+        请求成功：逐步恢复到配置的速率（每次 +5%）
+        """
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.05)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoint": self.name,
+                "configured_rate": self.max_rate,
+                "current_rate": round(self.rate, 3),
+                "burst": self.burst,
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "waiting": self._waiting,
+                "wait_seconds_total": round(self._wait_seconds, 3),
+                "wait_seconds_max": round(self._max_wait, 3),
+                "throttled": self._throttled,
+            }
+
+
+def parse_rate_limit_headers(headers) -> Tuple[Optional[float], Optional[int]]:
+    """
+    从响应头解析 (距配额重置 / 可重试的秒数, 剩余配额)
+
+    兼容 Retry-After、x-ratelimit-*、飞书网关的 x-ogw-ratelimit-*
+    """
+    retry_after = None
+    for name in ("Retry-After", "x-ogw-ratelimit-reset", "x-ratelimit-reset"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            retry_after = max(0.0, float(value))
+            break
+        except ValueError:
+            continue
+
+    remaining = None
+    for name in ("x-ogw-ratelimit-remaining", "x-ratelimit-remaining"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            remaining = int(value)
+            break
+        except ValueError:
+            continue
+
+    return retry_after, remaining
+
+
+def _parse_rate(value: str) -> Tuple[float, Optional[float]]:
+    # "qps" 或 "qps:burst"
+    if ":" in value:
+        rate, burst = value.split(":", 1)
+        return float(rate), float(burst)
+    return float(value), None
+
+
+class RateLimiterRegistry:
+    """
+    按接口名管理令牌桶
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, AdaptiveTokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> AdaptiveTokenBucket:
+        bucket = self._buckets.get(endpoint)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                config = os.getenv(
+                    f"LARK_RATE_LIMIT_{endpoint.upper()}",
+                    os.getenv("LARK_RATE_LIMIT_DEFAULT", "20"),
+                )
+                rate, burst = _parse_rate(config)
+                bucket = AdaptiveTokenBucket(endpoint, rate, burst)
+                self._buckets[endpoint] = bucket
+
+        return bucket
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = list(self._buckets.values())
+        return {b.name: b.stats() for b in buckets}
+
+
+_registry = RateLimiterRegistry()
+
+
+def get_rate_limiter(endpoint: str) -> AdaptiveTokenBucket:
+    """
+    获取某个飞书接口的令牌桶（进程内共享）
+    """
+    return _registry.get(endpoint)
+
+
+def rate_limiter_stats() -> Dict[str, Any]:
+    return _registry.stats()
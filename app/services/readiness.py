@@ -0,0 +1,177 @@
+"""
+启动预热与就绪检查
+
+启动时（lifespan）在接收流量之前：
+1. 建立数据库连接池的常驻连接（DB_POOL_MIN_SIZE 个）
+2. 获取 app_access_token，同时与飞书建立 keep-alive 连接（TLS 握手在这里完成）
+
+/ready 按依赖的实际状态返回：
+- database：从连接池借出连接并执行 SELECT 1
+- lark_token：缓存的 token 仍有效；已过期时尝试刷新一次
+- callback_queue：入队模式下处理池在接收任务
+- 进程开始停机后直接返回未就绪，负载均衡先摘流量，再排空任务
+
+CALLBACK_MODE=async 时预热 / 检查的是异步连接池和异步飞书客户端。
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.db.mysql import get_pool
+from app.db.mysql_async import async_connection, get_async_pool
+from app.services.callback_worker import callback_mode, get_callback_pool
+from app.services.lark_client import (
+    aget_app_access_token,
+    app_access_token_expires_in,
+    get_app_access_token,
+)
+from app.utils.log import fields, get_logger
+from app.utils.metrics import stage
+
+logger = get_logger(__name__)
+
+
+# 预热总时长上限（秒）：依赖不可用时不无限阻塞启动，/ready 会持续报告未就绪
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+# 单项就绪检查的超时（秒）
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "3"))
+
+
+_state: Dict[str, Any] = {
+    "warmed": False,
+    "stopping": False,
+    "warmup_seconds": None,
+}
+
+
+# ----------------------------------------------------------------------
+# 预热
+# ----------------------------------------------------------------------
+
+def _warm_db() -> None:
+    get_pool().warm()
+
+
+async def _awarm_db() -> None:
+    # 创建异步连接池时即建立 minsize 个连接
+    await get_async_pool()
+
+
+async def warm_up() -> bool:
+    """
+    预热数据库连接池、飞书连接和 app_access_token，返回是否全部成功
+
+    单项失败只记录日志，不阻止启动（依赖恢复后首个请求会照常建立连接）
+    """
+    if callback_mode() == "async":
+        steps = [("db", _awarm_db), ("lark_token", aget_app_access_token)]
+    else:
+        steps = [
+            ("db", lambda: asyncio.to_thread(_warm_db)),
+            ("lark_token", lambda: asyncio.to_thread(get_app_access_token)),
+        ]
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + WARMUP_TIMEOUT
+    ok = True
+
+    for name, step in steps:
+        try:
+            with stage(f"warmup_{name}"):
+                await asyncio.wait_for(step(), timeout=max(0.1, deadline - time.monotonic()))
+        except Exception as e:
+            ok = False
+            logger.warning("启动预热失败：%s", e or type(e).__name__, extra=fields(step=name))
+
+    _state["warmed"] = ok
+    _state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("启动预热完成", extra=fields(ok=ok, seconds=_state["warmup_seconds"]))
+    return ok
+
+
+def mark_stopping() -> None:
+    """
+    进入停机流程：之后 /ready 一律返回未就绪
+    """
+    _state["stopping"] = True
+
+
+# ----------------------------------------------------------------------
+# 就绪检查
+# ----------------------------------------------------------------------
+
+def _check_db() -> None:
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+
+
+async def _acheck_db() -> None:
+    async with async_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT 1")
+            await cursor.fetchone()
+
+
+async def _check_lark_token() -> Dict[str, Any]:
+    # 缓存有效时不访问飞书；过期时刷新一次（同时验证飞书可达、凭证可用）
+    if app_access_token_expires_in() <= 0:
+        if callback_mode() == "async":
+            await aget_app_access_token()
+        else:
+            await asyncio.to_thread(get_app_access_token)
+    return {"expires_in": int(app_access_token_expires_in())}
+
+
+async def _check_callback_queue() -> Dict[str, Any]:
+    stats = get_callback_pool().stats()
+    if not stats["accepting"]:
+        raise RuntimeError("callback workers not running")
+    return {"queue_depth": stats["queue_depth"], "queue_capacity": stats["queue_capacity"]}
+
+
+async def _run_check(check: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        detail = await asyncio.wait_for(check(), timeout=READY_CHECK_TIMEOUT)
+        result = {"ok": True}
+        if isinstance(detail, dict):
+            result.update(detail)
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": f"timeout after {READY_CHECK_TIMEOUT}s"}
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def check_readiness() -> Tuple[bool, Dict[str, Any]]:
+    """
+    检查各依赖的实际状态，返回 (是否就绪, 明细)
+    """
+    if _state["stopping"]:
+        return False, {"status": "stopping"}
+
+    mode = callback_mode()
+    checks: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "database": _acheck_db if mode == "async" else (lambda: asyncio.to_thread(_check_db)),
+        "lark_token": _check_lark_token,
+    }
+    if mode == "queue":
+        checks["callback_queue"] = _check_callback_queue
+
+    names = list(checks)
+    results = await asyncio.gather(*(_run_check(checks[n]) for n in names))
+    detail = dict(zip(names, results))
+    ready = all(r["ok"] for r in results)
+
+    return ready, {
+        "status": "ready" if ready else "not_ready",
+        "mode": mode,
+        "warmed": _state["warmed"],
+        "warmup_seconds": _state["warmup_seconds"],
+        "checks": detail,
+    }
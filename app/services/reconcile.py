@@ -0,0 +1,266 @@
+"""
+未结束审批实例的定期对账（Reconcile）
+
+回调丢失时，实例会一直停在 PENDING。对账任务定期：
+1. 用水位查询（status + refreshed_at 索引）选出未结束、且超过 stale_after 秒未从飞书刷新的实例，
+   最久未刷新的优先
+2. 分批在并发上限内重新拉取，走与回调相同的 persist_instances 入库（内容未变化只刷新 refreshed_at）
+3. 拉取失败的实例同样刷新 refreshed_at，排到队尾，避免每轮都卡在同一批实例上
+
+不与实时回调争抢飞书配额和数据库：
+- 每轮最多处理 max_per_sweep 个实例，拉取速率不超过 qps（在各接口共享限流之外再单独限速）
+- 回调队列积压超过 yield_queue_depth 时本轮跳过 / 提前结束
+- 多进程部署时通过 MySQL 命名锁保证同一时刻只有一个进程在对账
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.services.callback_worker import callback_queue_enabled, get_callback_pool
+from app.services.lark_approval_api import get_approval_instance
+from app.services.rate_limiter import AdaptiveTokenBucket
+from app.utils.log import fields, get_logger
+from app.utils.metrics import stage
+
+logger = get_logger(__name__)
+
+
+SWEEP_LOCK_NAME = "lark_approval:reconcile"
+
+
+class ReconcileSweeper:
+    """
+    对账任务
+
+    - interval：两轮之间的间隔秒数
+    - stale_after：超过该秒数未刷新的实例才会被选中
+    - statuses：视为未结束的状态
+    - max_per_sweep：每轮最多处理的实例数
+    - batch_size：每批查询 / 入库（一个事务）的实例数
+    - concurrency：同时拉取实例详情的线程数
+    - qps：拉取实例详情的速率上限
+    - yield_queue_depth：回调队列深度超过该值时让路给实时回调（None 表示不检查）
+    - service：ApprovalService，默认新建
+    """
+
+    def __init__(
+        self,
+        interval: float = 300,
+        stale_after: int = 1800,
+        statuses: Sequence[str] = ("PENDING",),
+        max_per_sweep: int = 200,
+        batch_size: int = 50,
+        concurrency: int = 2,
+        qps: float = 2.0,
+        yield_queue_depth: Optional[int] = 10,
+        service=None,
+    ):
+        if service is None:
+            from app.services.approval_service import ApprovalService
+
+            service = ApprovalService()
+
+        self.interval = interval
+        self.stale_after = stale_after
+        self.statuses = [s for s in statuses if s]
+        self.max_per_sweep = max(0, max_per_sweep)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.yield_queue_depth = yield_queue_depth
+        self.service = service
+        self.limiter = AdaptiveTokenBucket("reconcile", rate=qps, burst=max(1.0, qps), min_rate=min(1.0, qps))
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # 运行统计
+        self._sweeps = 0
+        self._skipped = 0
+        self._refreshed = 0
+        self._changed = 0
+        self._failed = 0
+        self._last: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """
+        启动后台线程，每隔 interval 秒对账一轮（重复调用无副作用）
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="approval-reconcile", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        停止后台线程；正在进行的一轮在当前批次结束后退出
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("对账失败：%s", e)
+
+    # ------------------------------------------------------------------
+    # 一轮对账
+    # ------------------------------------------------------------------
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        执行一轮对账，返回本轮报告
+        """
+        report: Dict[str, Any] = {
+            "selected": 0, "refreshed": 0, "changed": 0, "failed": 0, "skipped": None, "yielded": None,
+        }
+
+        busy = self._busy()
+        if busy:
+            report["skipped"] = busy
+        else:
+            with self.service.repo.named_lock(SWEEP_LOCK_NAME) as locked:
+                if not locked:
+                    report["skipped"] = "locked"
+                else:
+                    with stage("reconcile_sweep"):
+                        self._sweep(report)
+
+        with self._lock:
+            if report["skipped"]:
+                self._skipped += 1
+            else:
+                self._sweeps += 1
+            self._refreshed += report["refreshed"]
+            self._changed += report["changed"]
+            self._failed += report["failed"]
+            self._last = dict(report, finished_at=time.time())
+
+        if report["selected"] or report["skipped"]:
+            logger.info("对账完成", extra=fields(**report))
+        return report
+
+    def _sweep(self, report: Dict[str, Any]) -> None:
+        repo = self.service.repo
+        remaining = self.max_per_sweep
+        after = None
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="approval-reconcile") as executor:
+            while remaining > 0 and not self._stop.is_set():
+                rows = repo.get_stale_instances(
+                    self.statuses,
+                    self.stale_after,
+                    min(self.batch_size, remaining),
+                    after=after,
+                )
+                if not rows:
+                    break
+
+                remaining -= len(rows)
+                report["selected"] += len(rows)
+                after = (rows[-1]["refreshed_at"], rows[-1]["instance_code"])
+
+                codes = [r["instance_code"] for r in rows]
+                futures = {code: executor.submit(self._fetch, code) for code in codes}
+
+                instances: Dict[str, Dict[str, Any]] = {}
+                failed: List[str] = []
+                for code, future in futures.items():
+                    try:
+                        instances[code] = future.result()
+                    except Exception as e:
+                        failed.append(code)
+                        logger.warning("对账拉取实例失败：%s", e, extra=fields(instance_code=code))
+
+                if instances:
+                    report["changed"] += self.service.persist_instances(instances)
+                    report["refreshed"] += len(instances)
+                if failed:
+                    # 失败的实例排到队尾，下次超过 stale_after 后再试
+                    repo.mark_refreshed(failed)
+                    report["failed"] += len(failed)
+
+                # 本批完成后回调开始积压：提前结束本轮
+                busy = self._busy()
+                if busy:
+                    report["yielded"] = busy
+                    break
+
+    def _fetch(self, instance_code: str) -> Dict[str, Any]:
+        self.limiter.acquire()
+        return get_approval_instance(instance_code)
+
+    def _busy(self) -> Optional[str]:
+        # 回调队列有积压时让路
+        if self.yield_queue_depth is None or not callback_queue_enabled():
+            return None
+        depth = get_callback_pool().stats()["queue_depth"]
+        return "callback_queue_busy" if depth > self.yield_queue_depth else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval": self.interval,
+                "stale_after": self.stale_after,
+                "max_per_sweep": self.max_per_sweep,
+                "sweeps": self._sweeps,
+                "skipped": self._skipped,
+                "refreshed": self._refreshed,
+                "changed": self._changed,
+                "failed": self._failed,
+                "last": dict(self._last),
+            }
+
+
+# ----------------------------------------------------------------------
+# 进程级单例
+# ----------------------------------------------------------------------
+
+_sweeper: Optional[ReconcileSweeper] = None
+_sweeper_lock = threading.Lock()
+
+
+def get_reconcile_sweeper() -> ReconcileSweeper:
+    """
+    获取进程内唯一的对账任务（按环境变量配置）
+    """
+    global _sweeper
+
+    if _sweeper is None:
+        with _sweeper_lock:
+            if _sweeper is None:
+                _sweeper = ReconcileSweeper(
+                    interval=float(os.getenv("RECONCILE_INTERVAL", "300")),
+                    stale_after=int(os.getenv("RECONCILE_STALE_AFTER", "1800")),
+                    statuses=os.getenv("RECONCILE_STATUSES", "PENDING").upper().split(","),
+                    max_per_sweep=int(os.getenv("RECONCILE_MAX_PER_SWEEP", "200")),
+                    batch_size=int(os.getenv("RECONCILE_BATCH_SIZE", "50")),
+                    concurrency=int(os.getenv("RECONCILE_CONCURRENCY", "2")),
+                    qps=float(os.getenv("RECONCILE_QPS", "2")),
+                    yield_queue_depth=int(os.getenv("RECONCILE_YIELD_QUEUE_DEPTH", "10")),
+                )
+
+    return _sweeper
+
+
+def reconcile_enabled() -> bool:
+    """
+    是否在服务进程内定期对账（RECONCILE_INTERVAL > 0，默认 300 秒）
+    """
+    return float(os.getenv("RECONCILE_INTERVAL", "300")) > 0
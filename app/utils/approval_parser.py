@@ -1,74 +1,203 @@
-import json
-from typing import Dict, Any, List
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
+from app.utils import json_codec
 
-def parse_approval_form(form_raw) -> Dict[str, Any]:
+
+# 字段名归一规则：(关键字列表, 统一后的字段名)
+# 按顺序匹配，字段名包含任一关键字即命中，第一条命中的规则生效；都不命中则保留原名
+DEFAULT_FIELD_RULES: List[Tuple[Sequence[str], str]] = [
+    (("日期",), "申请日期"),
+    (("编号",), "表单编号"),
+    (("申请人",), "申请人"),
+    (("部门",), "部门"),
+    (("总计", "总额"), "总金额"),
+]
+
+# 物品明细（fieldList）列名归一规则
+DEFAULT_COLUMN_RULES: List[Tuple[Sequence[str], str]] = [
+    (("物品名称",), "物品名称"),
+    (("规格",), "规格"),
+    (("类别",), "类别"),
+    (("数量",), "数量"),
+    (("单位",), "单位"),
+    (("单价",), "单价"),
+    (("图片",), "图片"),
+    (("链接",), "购买链接"),
+]
+
+
+def _match(name: Optional[str], rules) -> Optional[str]:
+    name = name or ""
+    for keywords, canonical in rules:
+        for kw in keywords:
+            if kw in name:
+                return canonical
+    return None
+
+
+class CompiledMapping:
+    """
+    某个审批定义（approval_code）当前表单结构的字段映射
+
+    - fields：顶层控件 id / 名称 → 统一字段名（None 表示保留原名）
+    - columns：明细列控件 id / 名称 → 统一列名
+    未见过的控件在第一次出现时解析一次并记入映射
+    """
+
+    __slots__ = ("field_rules", "column_rules", "fields", "columns")
+
+    def __init__(self, field_rules, column_rules):
+        self.field_rules = field_rules
+        self.column_rules = column_rules
+        self.fields: Dict[Any, Optional[str]] = {}
+        self.columns: Dict[Any, Optional[str]] = {}
+
+    def field_key(self, item: Dict[str, Any]) -> str:
+        name = item.get("name")
+        key = item.get("id") or name
+        try:
+            canonical = self.fields[key]
+        except KeyError:
+            canonical = self.fields[key] = _match(name, self.field_rules)
+        return canonical or name
+
+    def column_key(self, col: Dict[str, Any]) -> str:
+        name = col.get("name")
+        key = col.get("id") or name
+        try:
+            canonical = self.columns[key]
+        except KeyError:
+            canonical = self.columns[key] = _match(name, self.column_rules)
+        return canonical or name
+
+
+class FieldMappingRegistry:
+    """
+    按 approval_code 缓存编译好的字段映射（LRU）
+
+    - 表单结构签名（控件 id + 名称）变化时，视为审批定义被修改，重新编译
+    - rules：{approval_code: {"fields": [...], "columns": [...]}}，
+      "default" 为缺省规则；规则格式同 DEFAULT_FIELD_RULES
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Dict[str, Any]]] = None, max_entries: int = 256):
+        self.rules = rules or {}
+        self.max_entries = max(1, max_entries)
+
+        # approval_code（没有时为 (None, 表单结构签名)）-> (表单结构签名, CompiledMapping)
+        self._cache: "OrderedDict[Any, Tuple[Tuple, CompiledMapping]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, approval_code: Optional[str], form_items: List[Dict[str, Any]]) -> CompiledMapping:
+        signature = self._signature(form_items)
+        # 没有 approval_code 时按表单结构区分，不同表单不会争用同一个缓存位置
+        key = approval_code if approval_code else (None, signature)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        mapping = CompiledMapping(*self._rules_for(approval_code))
+
+        with self._lock:
+            self._cache[key] = (signature, mapping)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return mapping
+
+    def invalidate(self, approval_code: Optional[str] = None) -> None:
+        """
+        使缓存失效；不传 approval_code 时清空全部
+        """
+        with self._lock:
+            if approval_code is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(approval_code, None)
+
+    def _rules_for(self, approval_code):
+        default = self.rules.get("default") or {}
+        custom = (self.rules.get(approval_code) or {}) if approval_code else {}
+
+        field_rules = custom.get("fields") or default.get("fields") or DEFAULT_FIELD_RULES
+        column_rules = custom.get("columns") or default.get("columns") or DEFAULT_COLUMN_RULES
+        return field_rules, column_rules
+
+    @staticmethod
+    def _signature(form_items: List[Dict[str, Any]]) -> Tuple:
+        # 顶层控件 + 每个明细表第一行的列
+        sig = []
+        for item in form_items:
+            sig.append((item.get("id"), item.get("name")))
+            if item.get("type") == "fieldList":
+                rows = item.get("value") or []
+                if rows:
+                    sig.extend((c.get("id"), c.get("name")) for c in rows[0])
+        return tuple(sig)
+
+
+def load_field_rules(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    从 JSON 文件加载规则：
+    {
+        "default": {"fields": [[["日期"], "申请日期"], ...], "columns": [...]},
+        "<approval_code>": {...}
+    }
+    """
+    with open(path, "rb") as f:
+        return json_codec.loads(f.read())
+
+
+_registry = FieldMappingRegistry(
+    rules=load_field_rules(os.environ["APPROVAL_FIELD_RULES_FILE"])
+    if os.getenv("APPROVAL_FIELD_RULES_FILE")
+    else None,
+)
+
+
+def get_field_mapping_registry() -> FieldMappingRegistry:
+    return _registry
+
+
+def parse_approval_form(form_raw, approval_code: Optional[str] = None) -> Dict[str, Any]:
     """
     将飞书审批实例中的 form 字段解析为业务可用的 dict 结构
+
+    - approval_code：审批定义 code，用于选择 / 缓存该审批的字段映射
     """
 
     # form 在接口中是字符串，需要先反序列化
     if isinstance(form_raw, str):
-        form_items = json.loads(form_raw)
+        form_items = json_codec.loads(form_raw)
     else:
         form_items = form_raw
 
+    mapping = _registry.get(approval_code, form_items)
+
     result: Dict[str, Any] = {}
     items_list: List[Dict[str, Any]] = []
 
     for item in form_items:
-        field_name = item.get("name")
         field_type = item.get("type")
         field_value = item.get("value")
 
-        # 普通字段（日期、文本、编号等）
+        # 普通字段（日期、文本、编号等），按映射统一字段名
         if field_type not in ("fieldList",):
-            # 统一中文字段名（可按你实际需要再映射）
-            if "日期" in field_name:
-                result["申请日期"] = field_value
-            elif "编号" in field_name:
-                result["表单编号"] = field_value
-            elif "申请人" in field_name:
-                result["申请人"] = field_value
-            elif "部门" in field_name:
-                result["部门"] = field_value
-            elif "总计" in field_name or "总额" in field_name:
-                result["总金额"] = field_value
-            else:
-                # 兜底：直接原名存储
-                result[field_name] = field_value
+            result[mapping.field_key(item)] = field_value
 
         # 物品明细（fieldList，二维结构）
         else:
             rows = field_value or []
+            column_key = mapping.column_key
             for row in rows:
-                row_data: Dict[str, Any] = {}
-
-                for col in row:
-                    col_name = col.get("name")
-                    col_type = col.get("type")
-                    col_value = col.get("value")
-
-                    if "物品名称" in col_name:
-                        row_data["物品名称"] = col_value
-                    elif "规格" in col_name:
-                        row_data["规格"] = col_value
-                    elif "类别" in col_name:
-                        row_data["类别"] = col_value
-                    elif "数量" in col_name:
-                        row_data["数量"] = col_value
-                    elif "单位" in col_name:
-                        row_data["单位"] = col_value
-                    elif "单价" in col_name:
-                        row_data["单价"] = col_value
-                    elif "图片" in col_name:
-                        row_data["图片"] = col_value
-                    elif "链接" in col_name:
-                        row_data["购买链接"] = col_value
-                    else:
-                        row_data[col_name] = col_value
-
-                items_list.append(row_data)
+                items_list.append({column_key(col): col.get("value") for col in row})
 
     if items_list:
         result["物品明细"] = items_list
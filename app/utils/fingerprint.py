@@ -0,0 +1,22 @@
+import hashlib
+from typing import Any
+
+from app.utils.json_codec import dumps_canonical
+
+
+def canonical_json(obj: Any) -> str:
+    """
+    规范化 JSON：key 排序、无多余空白，相同内容得到相同字符串
+    """
+    return dumps_canonical(obj)
+
+
+def fingerprint(obj: Any) -> str:
+    """
+    内容指纹（32 位十六进制）
+
+    - 字符串直接按 UTF-8 计算（飞书 form 字段本身就是 JSON 字符串，不必再解析）
+    - 其它对象先转规范化 JSON
+    """
+    text = obj if isinstance(obj, str) else canonical_json(obj)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
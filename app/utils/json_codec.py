@@ -0,0 +1,49 @@
+"""
+JSON 编解码
+
+安装了 orjson 时使用 orjson（解析 / 序列化快数倍），否则回退到标准库 json。
+两者输出都不转义中文（等价于 ensure_ascii=False）。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+# 解析失败时抛出的异常（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类）
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """
+    紧凑 JSON 字符串
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # orjson 不支持的类型（非字符串 key、超大整数等）交给标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_canonical(obj: Any) -> str:
+    """
+    规范化 JSON：key 排序、无多余空白，相同内容得到相同字符串
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
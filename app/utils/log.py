@@ -0,0 +1,312 @@
+"""
+结构化日志
+
+作用：
+- 统一用标准 logging 输出，带级别、logger 名称和结构化字段
+- 日志先放入内存队列，由单独的线程写 stdout，请求处理线程不做任何 I/O；
+  队列满时直接丢弃并计数，不阻塞业务
+- 回调体 / 接口响应等大段内容按 logger 采样输出，并截断长度
+- 输出前脱敏：token / secret / Authorization 等字段和 Bearer token
+
+配置：
+- LOG_LEVEL：日志级别，默认 INFO
+- LOG_FORMAT：json（默认）或 text
+- LOG_QUEUE_SIZE：日志队列长度，默认 10000
+- LOG_PAYLOAD_SAMPLE：大段内容的采样率，如 "0.01" 或 "0.01,app.routes.approval=0.1"
+- LOG_PAYLOAD_MAX_BYTES：单条大段内容最大长度，默认 4096
+
+用法：
+
+    logger = get_logger(__name__)
+    logger.info("回调入队", extra=fields(instance_code=code))
+    dump_payload(logger, "收到审批回调", data, instance_code=code)
+"""
+
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+from app.utils import json_codec
+
+
+# 按字段名脱敏（不区分大小写，包含即命中）
+SENSITIVE_KEYS = ("token", "secret", "password", "authorization", "cookie")
+
+# 按内容脱敏：Bearer xxx、飞书 token（t- / u- / a- 开头的长串）
+SENSITIVE_PATTERNS = (
+    (re.compile(r"(Bearer\s+)[^\s'\",]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"(['\"]?\w*(?:token|secret)['\"]?\s*[:=]\s*['\"]?)[^'\"\s,}]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"\b[tua]-[A-Za-z0-9_\-.]{20,}"), "***"),
+)
+
+REDACTED = "***"
+
+
+def redact(value: Any) -> Any:
+    """
+    返回脱敏后的副本（dict / list / 字符串）
+    """
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if _is_sensitive_key(k) else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def redact_text(text: str) -> str:
+    for pattern, repl in SENSITIVE_PATTERNS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _is_sensitive_key(key: Any) -> bool:
+    key = str(key).lower()
+    return any(s in key for s in SENSITIVE_KEYS)
+
+
+def fields(**kwargs) -> Dict[str, Any]:
+    """
+    生成 logging 的 extra 参数，字段会出现在结构化输出中
+    """
+    return {"fields": kwargs}
+
+
+# ----------------------------------------------------------------------
+# 采样
+# ----------------------------------------------------------------------
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    # "0.01,app.routes.approval=0.1" → {"": 0.01, "app.routes.approval": 0.1}
+    rates: Dict[str, float] = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            name, rate = part.split("=", 1)
+            rates[name.strip()] = float(rate)
+        else:
+            rates[""] = float(part)
+    return rates
+
+
+_sample_rates = _parse_sample_rates(os.getenv("LOG_PAYLOAD_SAMPLE", "0.01"))
+_payload_max_bytes = int(os.getenv("LOG_PAYLOAD_MAX_BYTES", "4096"))
+
+
+def sample_rate(logger_name: str) -> float:
+    """
+    某个 logger 的采样率：取最长匹配的前缀配置
+    """
+    name = logger_name
+    while True:
+        if name in _sample_rates:
+            return _sample_rates[name]
+        if not name:
+            return 1.0
+        name = name.rpartition(".")[0]
+
+
+def dump_payload(logger: logging.Logger, message: str, payload: Any, **extra) -> bool:
+    """
+    按采样率以 DEBUG 级别输出大段内容（回调体、接口响应等），返回是否输出
+
+    未命中采样 / 级别未开启时不做序列化，热点路径上开销可以忽略
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+
+    rate = sample_rate(logger.name)
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return False
+
+    text = payload if isinstance(payload, str) else json_codec.dumps(redact(payload))
+    if len(text) > _payload_max_bytes:
+        text = text[:_payload_max_bytes] + f"...(truncated, {len(text)} chars)"
+
+    logger.debug(message, extra=fields(payload=text, **extra))
+    return True
+
+
+# ----------------------------------------------------------------------
+# 格式化
+# ----------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """
+    一行一个 JSON 对象：ts / level / logger / msg / fields（结构化字段）/ exc（异常堆栈）
+
+    结构化字段放在 fields 下，字段名与 ts / level 等同名时也不会覆盖外层
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact_text(record.getMessage()),
+        }
+
+        extra = getattr(record, "fields", None)
+        if extra:
+            entry["fields"] = redact(extra)
+
+        if record.exc_text:
+            entry["exc"] = redact_text(record.exc_text)
+
+        return json_codec.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    便于本地阅读：时间 级别 logger 消息 key=value ...
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = redact_text(super().format(record))
+
+        extra = getattr(record, "fields", None)
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in redact(extra).items())
+        return line
+
+    def formatException(self, ei) -> str:
+        return redact_text(super().formatException(ei))
+
+
+# ----------------------------------------------------------------------
+# 队列 handler
+# ----------------------------------------------------------------------
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    只在调用线程里合并消息参数、展开异常堆栈，格式化和 I/O 在监听线程完成；
+    队列满时丢弃日志并计数
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 参数 / 异常对象可能在之后被修改或无法跨线程使用，这里先固化成字符串
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """
+    停止信号不受队列长度限制：队列满时（正是日志积压的时候）丢弃最旧的一条腾出位置，
+    标准实现的 put_nowait 会在这里抛出 queue.Full，监听线程也不会被 join
+    """
+
+    # 放入停止信号时等待监听线程腾出位置的秒数
+    sentinel_timeout = 1.0
+
+    def __init__(self, log_queue: queue.Queue, handler: DroppingQueueHandler, *handlers, **kwargs):
+        super().__init__(log_queue, *handlers, **kwargs)
+        self.dropping_handler = handler
+
+    def enqueue_sentinel(self) -> None:
+        while True:
+            try:
+                self.queue.put(self._sentinel, timeout=self.sentinel_timeout)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropping_handler.dropped += 1
+            except queue.Empty:
+                pass
+
+
+_listener: Optional[_QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging() -> None:
+    """
+    配置根 logger（可重复调用，只生效一次）
+    """
+    global _listener, _handler
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        if os.getenv("LOG_FORMAT", "json").lower() == "text":
+            formatter: logging.Formatter = TextFormatter()
+        else:
+            formatter = JsonFormatter()
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(formatter)
+
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        _handler = DroppingQueueHandler(log_queue)
+        _listener = _QueueListener(log_queue, _handler, stream, respect_handler_level=True)
+        _listener.start()
+
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+def shutdown_logging() -> None:
+    """
+    停止监听线程，写出队列中剩余的日志
+    """
+    global _listener, _handler
+
+    with _setup_lock:
+        if _listener is None:
+            return
+
+        # 先摘掉 handler，停止过程中不再有新日志进入队列
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        _listener = None
+        _handler = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    handler = _handler
+    if handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "queued": handler.queue.qsize(),
+        "dropped": handler.dropped,
+    }
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
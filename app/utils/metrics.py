@@ -0,0 +1,337 @@
+"""
+进程内指标（Prometheus 文本格式）
+
+不依赖 prometheus_client，只实现用到的三种类型：
+- Counter：只增不减的计数
+- Gauge：当前值（可增可减）
+- Histogram：耗时分布（固定桶，累计计数）
+
+每个带标签的序列一把锁，记录一次的开销是一次 perf_counter + 一次加锁，可以常开。
+
+业务阶段统一用 stage() / timed() 记录：
+- approval_stage_seconds{stage}：耗时直方图
+- approval_stage_total{stage, result}：成功 / 失败次数
+- approval_stage_in_flight{stage}：正在执行的数量
+"""
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# 默认耗时桶（秒），覆盖 1ms ~ 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """
+    一个指标族：名称 + 标签名，按标签值保存子序列（子类实现 _new_child / _samples）
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际 {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        新建一个标签组合的子序列
+        """
+
+    @abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """
+        逐行输出样本（Prometheus 文本格式）
+        """
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    - 指标按名称注册一次，重复注册返回同一个对象
+    - collector：渲染时调用，返回 (名称, 类型, 说明, {标签: 值}, 数值) 列表，
+      用来导出连接池 / 队列等已有的 stats()
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple]]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for collector in collectors:
+            lines.extend(self._render_collected(collector()))
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_collected(samples: Iterable[Tuple]) -> List[str]:
+        lines: List[str] = []
+        declared = set()
+        for name, type_name, documentation, labels, value in samples:
+            if value is None:
+                continue
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+            names = tuple(labels)
+            lines.append(
+                f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(float(value))}"
+            )
+        return lines
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+# ----------------------------------------------------------------------
+# 业务阶段
+# ----------------------------------------------------------------------
+
+STAGE_SECONDS = _registry.histogram(
+    "approval_stage_seconds",
+    "Latency of each processing stage, seconds",
+    ("stage",),
+)
+STAGE_TOTAL = _registry.counter(
+    "approval_stage_total",
+    "Completed stage executions by result",
+    ("stage", "result"),
+)
+STAGE_IN_FLIGHT = _registry.gauge(
+    "approval_stage_in_flight",
+    "Stage executions currently running",
+    ("stage",),
+)
+RETRIES_TOTAL = _registry.counter(
+    "approval_retries_total",
+    "Retries by kind (lark_http, lark_rate_limited, invalid_token, callback)",
+    ("kind",),
+)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    记录一个阶段的耗时、成功 / 失败次数和并发数
+    """
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    started = time.perf_counter()
+    result = "failure"
+    try:
+        yield
+        result = "success"
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+        STAGE_TOTAL.labels(name, result).inc()
+        in_flight.dec()
+
+
+def timed(name: Optional[str] = None):
+    """
+    装饰器版 stage()，默认以函数名为阶段名；支持 async 函数
+    """
+
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(stage_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count_retry(kind: str) -> None:
+    RETRIES_TOTAL.labels(kind).inc()
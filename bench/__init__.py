@@ -0,0 +1,8 @@
+"""
+回调链路压测 / 微基准
+
+    python -m bench.micro [--output micro.json]
+    python -m bench.load  [--concurrency 32] [--requests 2000] [--repo memory] [--output load.json]
+
+结果为 JSON，便于不同提交之间对比。
+"""
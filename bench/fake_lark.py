@@ -0,0 +1,147 @@
+"""
+本地假飞书服务
+
+- POST /open-apis/auth/v3/app_access_token/internal：返回固定 token
+- GET  /open-apis/approval/v4/instances：分页返回 instance_codes 中的实例 code（page_size / page_token / has_more）
+- GET  /open-apis/approval/v4/instances/<instance_code>：按 instance_code 返回审批实例，
+  fail_codes 中的 code 返回业务错误（模拟实例拉取失败）
+- GET  /open-apis/contact/v3/users/batch、departments/batch：按请求的 ID 返回名称（名称 = ID）
+
+instance_code 格式为 <规模名>-<序号>，响应体预先序列化好，只替换 instance_code，
+避免假服务本身成为瓶颈。可通过 latency 模拟飞书接口耗时。
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from app.utils import json_codec
+
+
+INSTANCE_LIST_PATH = "/open-apis/approval/v4/instances"
+INSTANCE_PREFIX = INSTANCE_LIST_PATH + "/"
+
+# 通讯录批量接口路径 → (ID 参数名, 返回项中的 ID 字段)
+CONTACT_BATCH = {
+    "/open-apis/contact/v3/users/batch": ("user_ids", "user_id"),
+    "/open-apis/contact/v3/departments/batch": ("department_ids", "department_id"),
+}
+
+
+class FakeLarkServer:
+    def __init__(
+        self,
+        fixtures: Dict[str, Dict[str, Any]],
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        instance_codes: Optional[Iterable[str]] = None,
+    ):
+        self.latency = latency
+        self.requests = 0
+        # 实例列表接口返回的 code（按顺序分页）
+        self.instance_codes = list(instance_codes or [])
+        # 拉取时返回业务错误的 instance_code，可在运行中修改
+        self.fail_codes = set()
+        self._lock = threading.Lock()
+
+        # 规模名 → 响应体模板
+        self._templates = {
+            size: json_codec.dumps({"code": 0, "msg": "success", "data": instance})
+            for size, instance in fixtures.items()
+        }
+        self._token_body = json_codec.dumps({
+            "code": 0,
+            "msg": "ok",
+            "app_access_token": "t-bench-token",
+            "expire": 7200,
+        }).encode("utf-8")
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                server._count()
+                self._reply(200, server._token_body)
+
+            def do_GET(self):
+                server._count()
+                if server.latency:
+                    time.sleep(server.latency)
+
+                url = urlsplit(self.path)
+                if url.path in CONTACT_BATCH:
+                    param, key = CONTACT_BATCH[url.path]
+                    ids = parse_qs(url.query).get(param) or []
+                    items = [{key: i, "name": f"name-{i}"} for i in ids]
+                    self._reply(200, json_codec.dumps({"code": 0, "data": {"items": items}}).encode("utf-8"))
+                    return
+
+                if url.path == INSTANCE_LIST_PATH:
+                    self._reply(200, server._list_page(parse_qs(url.query)))
+                    return
+
+                if not self.path.startswith(INSTANCE_PREFIX):
+                    self._reply(404, b'{"code":404,"msg":"not found"}')
+                    return
+
+                code = self.path[len(INSTANCE_PREFIX):].split("?", 1)[0]
+                if code in server.fail_codes:
+                    self._reply(200, b'{"code":1390001,"msg":"injected failure"}')
+                    return
+
+                template = server._templates.get(code.rsplit("-", 1)[0])
+                if template is None:
+                    self._reply(404, b'{"code":404,"msg":"unknown fixture"}')
+                    return
+
+                self._reply(200, template.replace("__INSTANCE_CODE__", code).encode("utf-8"))
+
+            def _reply(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-lark", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _list_page(self, query: Dict[str, list]) -> bytes:
+        # page_token 即下一页的起始下标
+        page_size = int((query.get("page_size") or ["100"])[0])
+        start = int((query.get("page_token") or ["0"])[0])
+        end = start + page_size
+        has_more = end < len(self.instance_codes)
+        data = {
+            "instance_code_list": self.instance_codes[start:end],
+            "page_token": str(end) if has_more else "",
+            "has_more": has_more,
+        }
+        return json_codec.dumps({"code": 0, "msg": "success", "data": data}).encode("utf-8")
+
+    def start(self) -> "FakeLarkServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,139 @@
+"""
+压测用的审批实例
+
+- 内置 small / medium / large 三种表单规模，按固定随机种子生成，每次运行内容一致
+- 也可以指定目录加载录制的真实实例（每个文件为飞书审批实例接口返回的 data 字段，
+  文件名去掉 .json 即为规模名）
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+from app.utils import json_codec
+
+
+# 规模名 → (顶层字段数, 明细行数, 明细列数)
+SIZES = {
+    "small": (6, 0, 0),
+    "medium": (20, 10, 8),
+    "large": (40, 200, 8),
+}
+
+APPROVAL_CODE = "BENCH-APPROVAL-CODE"
+
+_TOP_FIELDS = [
+    ("申请日期", "date"),
+    ("表单编号", "input"),
+    ("申请人", "input"),
+    ("部门", "input"),
+    ("用途说明", "textarea"),
+    ("总计金额", "amount"),
+    ("预算科目", "radioV2"),
+    ("数量合计", "number"),
+]
+
+_COLUMNS = [
+    ("物品名称", "input"),
+    ("规格型号", "input"),
+    ("类别", "radioV2"),
+    ("数量", "number"),
+    ("单位", "input"),
+    ("单价", "amount"),
+    ("图片", "image"),
+    ("购买链接", "input"),
+]
+
+
+def _value(rng: random.Random, widget_type: str):
+    if widget_type == "number":
+        return rng.randint(1, 500)
+    if widget_type == "amount":
+        return {"amount": round(rng.uniform(1, 100000), 2), "currency": "CNY"}
+    if widget_type == "date":
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00+08:00"
+    if widget_type == "image":
+        return [f"https://example.com/img/{rng.getrandbits(48):x}.png"]
+    if widget_type == "textarea":
+        return "说明" * rng.randint(10, 80)
+    return f"值-{rng.getrandbits(32):x}"
+
+
+def make_form(fields: int, rows: int, columns: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    form: List[Dict[str, Any]] = []
+
+    for i in range(fields):
+        name, widget_type = _TOP_FIELDS[i % len(_TOP_FIELDS)]
+        if i >= len(_TOP_FIELDS):
+            name = f"{name}{i}"
+        form.append({
+            "id": f"widget{i}",
+            "name": name,
+            "type": widget_type,
+            "value": _value(rng, widget_type),
+        })
+
+    if rows:
+        value = []
+        for _ in range(rows):
+            value.append([
+                {
+                    "id": f"col{c}",
+                    "name": _COLUMNS[c % len(_COLUMNS)][0],
+                    "type": _COLUMNS[c % len(_COLUMNS)][1],
+                    "value": _value(rng, _COLUMNS[c % len(_COLUMNS)][1]),
+                }
+                for c in range(columns)
+            ])
+        form.append({"id": "widgetList", "name": "物品明细", "type": "fieldList", "value": value})
+
+    return form
+
+
+def make_instance(size: str, seed: int = 0) -> Dict[str, Any]:
+    """
+    生成飞书审批实例接口 data 字段的结构（form 为字符串，与接口一致）
+    """
+    fields, rows, columns = SIZES[size]
+    return {
+        "approval_code": APPROVAL_CODE,
+        "approval_name": "采购申请",
+        "instance_code": "__INSTANCE_CODE__",
+        "status": "PENDING",
+        "user_id": "bench-user",
+        "department_id": "bench-dept",
+        "start_time": "1704067200000",
+        "end_time": "0",
+        "form": json_codec.dumps(make_form(fields, rows, columns, seed)),
+        "task_list": [
+            {
+                "id": f"task{i}",
+                "node_id": f"node{i}",
+                "node_name": f"审批节点{i}",
+                "user_id": f"approver{i}",
+                "status": "PENDING" if i else "APPROVED",
+                "start_time": "1704067200000",
+                "end_time": "0",
+            }
+            for i in range(3)
+        ],
+    }
+
+
+def load_fixtures(directory: str = None) -> Dict[str, Dict[str, Any]]:
+    """
+    返回 {规模名: 审批实例}
+    """
+    if not directory:
+        return {size: make_instance(size) for size in SIZES}
+
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                fixtures[name[:-5]] = json.load(f)
+    if not fixtures:
+        raise ValueError(f"{directory} 下没有 .json 审批实例")
+    return fixtures
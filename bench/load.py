@@ -0,0 +1,248 @@
+"""
+回调链路压测
+
+在本进程内启动：
+- 假飞书服务（bench.fake_lark），返回不同表单规模的审批实例
+- 回调服务（uvicorn + app.main），仓储可选内存实现或真实 MySQL（DB_* 环境变量）
+
+然后按指定并发向 /approval/callback 发送回调，统计：
+- 回调响应延迟 p50 / p95 / p99、吞吐
+- 入队模式下等待后台处理完成，统计端到端处理吞吐
+- 各处理阶段（/metrics 中的 approval_stage_seconds）的次数和平均耗时
+
+    python -m bench.load [--concurrency 32] [--requests 2000] [--mode queue|sync] \\
+        [--repo memory|mysql] [--sizes small,medium,large] [--latency 0.02] [--burst 4] [--output load.json]
+
+--burst N 模拟一次审批连续推送 N 个回调（同一 instance_code，最后一个为终态），
+用来观察合并（CALLBACK_COALESCE_WINDOW）对飞书请求数和写入次数的影响。
+"""
+
+import argparse
+import itertools
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+
+from bench.fake_lark import FakeLarkServer
+from bench.fixtures import load_fixtures
+from bench.memory_repo import MemoryApprovalRepository
+from bench.report import emit, environment, latency_summary
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_service(port: int):
+    # app 模块在导入时读取 LARK_BASE_URL 等配置，必须在设置环境变量之后导入
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-service", daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("回调服务启动超时")
+        time.sleep(0.05)
+
+    return server, thread
+
+
+def _stage_snapshot() -> Dict[str, Dict[str, float]]:
+    from app.utils.metrics import STAGE_SECONDS
+
+    result = {}
+    for (stage_name,), child in list(STAGE_SECONDS._children.items()):
+        counts, total = child.snapshot()
+        count = sum(counts)
+        result[stage_name] = {"count": count, "sum_seconds": total}
+    return result
+
+
+def _stage_delta(before, after) -> Dict[str, Dict[str, float]]:
+    result = {}
+    for stage_name, now in sorted(after.items()):
+        prev = before.get(stage_name, {"count": 0, "sum_seconds": 0.0})
+        count = now["count"] - prev["count"]
+        if count:
+            total = now["sum_seconds"] - prev["sum_seconds"]
+            result[stage_name] = {"count": count, "mean_ms": round(total / count * 1000, 3)}
+    return result
+
+
+def _wait_drained(expected: int, timeout: float) -> bool:
+    from app.services.callback_worker import get_callback_pool
+
+    pool = get_callback_pool()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = pool.stats()
+        if stats["processed"] + stats["failed"] >= expected and stats["in_flight"] == 0:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def run(
+    concurrency: int = 32,
+    total: int = 2000,
+    mode: str = "queue",
+    repo: str = "memory",
+    sizes: List[str] = None,
+    latency: float = 0.0,
+    fixtures_dir: str = None,
+    drain_timeout: float = 300.0,
+    burst: int = 1,
+) -> Dict[str, Any]:
+    fixtures = load_fixtures(fixtures_dir)
+    sizes = sizes or list(fixtures)
+    unknown = [s for s in sizes if s not in fixtures]
+    if unknown:
+        raise ValueError(f"未知的表单规模：{unknown}，可选 {list(fixtures)}")
+
+    lark = FakeLarkServer({s: fixtures[s] for s in sizes}, latency=latency).start()
+
+    os.environ["LARK_BASE_URL"] = lark.base_url
+    os.environ.setdefault("LARK_APP_ID", "bench")
+    os.environ.setdefault("LARK_APP_SECRET", "bench")
+    os.environ["CALLBACK_MODE"] = mode
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LARK_RATE_LIMIT_DEFAULT", "100000")
+    os.environ.setdefault("LARK_HTTP_POOL_SIZE", str(max(20, concurrency)))
+
+    if repo == "memory":
+        # 只在压测进程内替换仓储实现，Service 其余逻辑不变
+        from app.services import approval_service
+
+        approval_service.ApprovalRepository = MemoryApprovalRepository
+        MemoryApprovalRepository.reset()
+
+    port = _free_port()
+    server, thread = _start_service(port)
+    url = f"http://127.0.0.1:{port}/approval/callback"
+
+    local = threading.local()
+    burst = max(1, burst)
+    size_cycle = itertools.cycle(sizes)
+    codes = [f"{next(size_cycle)}-{i}" for i in range((total + burst - 1) // burst)]
+    payloads = [
+        {
+            "uuid": uuid.uuid4().hex,
+            "type": "approval_instance",
+            "instance_code": codes[i // burst],
+            "status": "APPROVED" if i % burst == burst - 1 else "PENDING",
+            "operate_time": str(i),
+        }
+        for i in range(total)
+    ]
+
+    def send(payload):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            status = session.post(url, json=payload, timeout=60).status_code
+        except requests.RequestException:
+            status = "error"
+        return time.perf_counter() - started, status
+
+    stages_before = _stage_snapshot()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-client") as executor:
+        results = list(executor.map(send, payloads))
+
+    sent_elapsed = time.perf_counter() - started
+    statuses = Counter(str(status) for _, status in results)
+
+    drained = True
+    processed_elapsed = sent_elapsed
+    if mode == "queue":
+        drained = _wait_drained(statuses.get("200", 0), drain_timeout)
+        processed_elapsed = time.perf_counter() - started
+
+    stages = _stage_delta(stages_before, _stage_snapshot())
+
+    server.should_exit = True
+    thread.join(timeout=60)
+    lark.stop()
+
+    result: Dict[str, Any] = {
+        "benchmark": "load",
+        "environment": environment(),
+        "params": {
+            "concurrency": concurrency,
+            "requests": total,
+            "mode": mode,
+            "repo": repo,
+            "sizes": sizes,
+            "lark_latency_seconds": latency,
+            "fixtures": fixtures_dir or "builtin",
+            "burst": burst,
+            "coalesce_window_seconds": float(os.getenv("CALLBACK_COALESCE_WINDOW", "2")),
+        },
+        "callback": {
+            "status_codes": dict(statuses),
+            "elapsed_seconds": round(sent_elapsed, 3),
+            "requests_per_second": round(total / sent_elapsed, 1) if sent_elapsed else 0.0,
+            "latency": latency_summary([elapsed for elapsed, _ in results]),
+        },
+        "processing": {
+            "drained": drained,
+            "elapsed_seconds": round(processed_elapsed, 3),
+            "instances_per_second": round(statuses.get("200", 0) / processed_elapsed, 1)
+            if processed_elapsed else 0.0,
+            "lark_requests": lark.requests,
+        },
+        "stages": stages,
+    }
+    if repo == "memory":
+        result["processing"]["rows_written"] = MemoryApprovalRepository.rows_written()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回调链路压测")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发发送回调的客户端数")
+    parser.add_argument("--requests", type=int, default=2000, help="回调总数")
+    parser.add_argument("--mode", choices=("queue", "sync"), default="queue", help="CALLBACK_MODE")
+    parser.add_argument("--repo", choices=("memory", "mysql"), default="memory", help="仓储实现")
+    parser.add_argument("--sizes", help="表单规模，逗号分隔（默认全部）")
+    parser.add_argument("--latency", type=float, default=0.0, help="假飞书接口的模拟耗时（秒）")
+    parser.add_argument("--fixtures", help="录制的审批实例目录（默认使用内置规模）")
+    parser.add_argument("--drain-timeout", type=float, default=300.0, help="等待后台处理完成的最长时间（秒）")
+    parser.add_argument("--burst", type=int, default=1, help="每个审批实例连续推送的回调数")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    result = run(
+        concurrency=args.concurrency,
+        total=args.requests,
+        mode=args.mode,
+        repo=args.repo,
+        sizes=args.sizes.split(",") if args.sizes else None,
+        latency=args.latency,
+        fixtures_dir=args.fixtures,
+        drain_timeout=args.drain_timeout,
+        burst=args.burst,
+    )
+    emit(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
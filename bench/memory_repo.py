@@ -0,0 +1,109 @@
+"""
+内存版审批仓储（压测用，代替 MySQL）
+
+接口与 ApprovalRepository 在 Service 用到的部分一致：
+unit_of_work / get_fingerprints / mark_refreshed / save_batch。
+写入时同样调用 approval_repo 的参数构建函数，保留序列化等 CPU 开销，只省掉数据库往返；
+金额汇总的贡献行保存在内存中，增量计算与 MySQL 版相同。
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+from app.repository.amount_agg import diff_amount_contrib
+from app.repository.approval_repo import (
+    field_kv_params,
+    form_field_params,
+    instance_params,
+    raw_params,
+    task_params,
+)
+
+
+class MemoryApprovalRepository:
+    # 所有实例共享同一份数据，模拟同一个数据库
+    _lock = threading.Lock()
+    _instances: Dict[str, Dict[str, Any]] = {}
+    _contrib: Dict[str, List[Dict[str, Any]]] = {}
+    _rows: Dict[str, int] = {
+        "raw": 0, "instance": 0, "task": 0, "form_field": 0, "field_kv": 0, "amount_agg": 0, "amount_contrib": 0,
+    }
+
+    def __init__(self, pool=None):
+        pass
+
+    @contextmanager
+    def unit_of_work(self, lock_codes=()):
+        yield None
+
+    def get_fingerprints(self, instance_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                code: self._instances[code]
+                for code in instance_codes
+                if code in self._instances
+            }
+
+    def mark_refreshed(self, instance_codes: List[str]):
+        pass
+
+    def save_batch(self, bundles: List[Dict[str, Any]]):
+        counts = {"raw": 0, "instance": 0, "task": 0, "form_field": 0, "field_kv": 0}
+        fingerprints = {}
+
+        for b in bundles:
+            code = b["instance_code"]
+            if b.get("raw_data") is not None:
+                raw_params(code, b["raw_data"], b.get("raw_json"), b.get("version"))
+                counts["raw"] += 1
+            if b.get("instance"):
+                instance_params(b["instance"])
+                counts["instance"] += 1
+                fingerprints[code] = {
+                    k: b["instance"].get(k)
+                    for k in ("instance_hash", "tasks_hash", "form_hash", "version")
+                }
+            for t in b.get("tasks") or []:
+                task_params(code, t, b.get("version"))
+                counts["task"] += 1
+            for f in b.get("form_fields") or []:
+                form_field_params(code, f)
+                counts["form_field"] += 1
+            for r in b.get("kv_rows") or []:
+                field_kv_params(r)
+                counts["field_kv"] += 1
+
+        with self._lock:
+            self._instances.update(fingerprints)
+            self._sync_amount_agg(bundles)
+            for k, v in counts.items():
+                self._rows[k] += v
+
+    def _sync_amount_agg(self, bundles: List[Dict[str, Any]]):
+        existing = [r for b in bundles for r in self._contrib.get(b["instance_code"], [])]
+        deltas, upserts, deletes = diff_amount_contrib(bundles, existing)
+
+        columns = ("instance_code", "currency", "approval_code", "department_id", "status", "stat_date", "amount")
+        for params in upserts:
+            row = dict(zip(columns, params))
+            rows = [r for r in self._contrib.get(row["instance_code"], []) if r["currency"] != row["currency"]]
+            self._contrib[row["instance_code"]] = rows + [row]
+        for code, currency in deletes:
+            self._contrib[code] = [r for r in self._contrib.get(code, []) if r["currency"] != currency]
+
+        self._rows["amount_agg"] += len(deltas)
+        self._rows["amount_contrib"] += len(upserts) + len(deletes)
+
+    @classmethod
+    def rows_written(cls) -> Dict[str, int]:
+        with cls._lock:
+            return dict(cls._rows)
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._instances.clear()
+            cls._contrib.clear()
+            for k in cls._rows:
+                cls._rows[k] = 0
@@ -0,0 +1,97 @@
+"""
+表单解析微基准
+
+覆盖 ApprovalService._build_field_kv_rows / _normalize_form 和 parse_approval_form，
+每种表单规模分别计时，输入为飞书接口返回的 form 字符串（与线上一致，包含解码开销）。
+
+    python -m bench.micro [--repeat 7] [--min-time 0.2] [--fixtures DIR] [--output micro.json]
+"""
+
+import argparse
+import statistics
+import time
+from typing import Any, Callable, Dict
+
+from app.services.approval_service import ApprovalService
+from app.utils.approval_parser import parse_approval_form
+
+from bench.fixtures import load_fixtures
+from bench.memory_repo import MemoryApprovalRepository
+from bench.report import emit, environment
+
+
+def _measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    先估算循环次数使单轮不少于 min_time 秒，再跑 repeat 轮，取每次调用耗时
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    per_call = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        per_call.append((time.perf_counter() - started) / loops)
+
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "median_us": round(statistics.median(per_call) * 1e6, 2),
+        "min_us": round(min(per_call) * 1e6, 2),
+        "max_us": round(max(per_call) * 1e6, 2),
+        "ops_per_second": round(1 / statistics.median(per_call), 1),
+    }
+
+
+def run(repeat: int = 7, min_time: float = 0.2, fixtures_dir: str = None) -> Dict[str, Any]:
+    service = ApprovalService(repo=MemoryApprovalRepository())
+    results: Dict[str, Any] = {}
+
+    for size, instance in load_fixtures(fixtures_dir).items():
+        form_raw = instance.get("form")
+        approval_code = instance.get("approval_code")
+        code = f"{size}-0"
+
+        cases = {
+            "build_field_kv_rows": lambda: service._build_field_kv_rows(code, form_raw, approval_code),
+            "normalize_form": lambda: service._normalize_form(form_raw),
+            "parse_approval_form": lambda: parse_approval_form(form_raw, approval_code),
+            # 线上路径：一次解码，form_field 与 KV 共用
+            "build_bundle": lambda: service.build_bundle(code, instance),
+        }
+
+        results[size] = {
+            "form_bytes": len(form_raw.encode("utf-8")) if isinstance(form_raw, str) else None,
+            "kv_rows": len(service._build_field_kv_rows(code, form_raw, approval_code)),
+            "cases": {name: _measure(func, repeat, min_time) for name, func in cases.items()},
+        }
+
+    return {
+        "benchmark": "micro",
+        "environment": environment(),
+        "params": {"repeat": repeat, "min_time": min_time, "fixtures": fixtures_dir or "builtin"},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="表单解析微基准")
+    parser.add_argument("--repeat", type=int, default=7, help="计时轮数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="单轮最少耗时（秒）")
+    parser.add_argument("--fixtures", help="录制的审批实例目录（默认使用内置规模）")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    emit(run(args.repeat, args.min_time, args.fixtures), args.output)
+
+
+if __name__ == "__main__":
+    main()
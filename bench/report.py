@@ -0,0 +1,77 @@
+"""
+压测结果：分位数统计 + 运行环境信息 + JSON 输出
+"""
+
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """
+    最近秩法分位数，sorted_values 需已排序
+    """
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """
+    耗时列表（秒）→ 毫秒统计
+    """
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        import orjson  # noqa: F401
+
+        json_backend = "orjson"
+    except ImportError:
+        json_backend = "json"
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "json_backend": json_backend,
+    }
+
+
+def emit(result: Dict[str, Any], output: Optional[str]) -> None:
+    """
+    写入文件（指定 output 时），并输出到 stdout
+    """
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
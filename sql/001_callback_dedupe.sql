@@ -0,0 +1,8 @@
+-- 回调去重表：IDEMPOTENCY_BACKEND=mysql 时使用，多个进程 / 多台机器共享去重结果
+CREATE TABLE IF NOT EXISTS lark_approval_callback_dedupe (
+    dedupe_key     VARCHAR(191) NOT NULL COMMENT '去重键：uuid:<event uuid> / state:<instance_code>:<status>:<time>',
+    instance_code  VARCHAR(128) NULL     COMMENT '审批实例 code',
+    created_at     DATETIME     NOT NULL COMMENT '最近一次处理成功的时间',
+    PRIMARY KEY (dedupe_key),
+    KEY idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='审批回调去重';
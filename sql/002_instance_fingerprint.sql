@@ -0,0 +1,5 @@
+-- 审批实例内容指纹：只重写内容发生变化的部分
+ALTER TABLE lark_approval_instance
+    ADD COLUMN instance_hash CHAR(32) NULL COMMENT '实例主表字段指纹',
+    ADD COLUMN tasks_hash    CHAR(32) NULL COMMENT 'task_list 指纹',
+    ADD COLUMN form_hash     CHAR(32) NULL COMMENT 'form 指纹';
@@ -0,0 +1,13 @@
+-- KV 表按 (approval_id, row_id, widget_id) 幂等写入
+--
+-- 执行前先去重，否则唯一键会创建失败：
+--   python -m app.scripts.compact_field_kv
+--
+-- row_id / widget_id 的 NULL 统一为空串（NULL 不参与唯一键比较，会绕过唯一键重复插入）
+UPDATE lark_approval_field_kv SET row_id = '' WHERE row_id IS NULL;
+UPDATE lark_approval_field_kv SET widget_id = '' WHERE widget_id IS NULL;
+
+ALTER TABLE lark_approval_field_kv
+    MODIFY COLUMN row_id VARCHAR(64) NOT NULL DEFAULT '' COMMENT '明细行 ID，顶层字段为空串',
+    MODIFY COLUMN widget_id VARCHAR(64) NOT NULL DEFAULT '' COMMENT '控件 ID，缺失时为空串',
+    ADD UNIQUE KEY uk_approval_row_widget (approval_id, row_id, widget_id);
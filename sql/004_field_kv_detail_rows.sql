@@ -0,0 +1,37 @@
+-- 明细表（fieldList）按单元格展开到 KV 表：行序号 + 统一字段名 + 索引
+ALTER TABLE lark_approval_field_kv
+    ADD COLUMN field_key        VARCHAR(64) NULL COMMENT '统一后的字段名（如 类别 / 数量 / 单价）',
+    ADD COLUMN parent_widget_id VARCHAR(64) NULL COMMENT '明细单元格所属明细表控件 ID，顶层字段为 NULL',
+    ADD COLUMN row_index        INT         NULL COMMENT '明细行序号（从 0 开始），顶层字段为 NULL',
+    ADD INDEX idx_key_approval_row (field_key, approval_id, row_id),
+    ADD INDEX idx_approval_parent_row (approval_id, parent_widget_id, row_index);
+
+-- 明细行宽表视图：一行明细一行记录
+CREATE OR REPLACE VIEW lark_approval_line_item_v AS
+SELECT
+    approval_id,
+    parent_widget_id,
+    row_index,
+    MAX(CASE WHEN field_key = '物品名称' THEN field_value_text END) AS item_name,
+    MAX(CASE WHEN field_key = '类别' THEN field_value_text END)     AS category,
+    MAX(CASE WHEN field_key = '数量' THEN field_value_num END)      AS quantity,
+    MAX(CASE WHEN field_key = '单价' THEN field_value_num END)      AS unit_price,
+    MAX(CASE WHEN field_key = '单价' THEN currency END)             AS currency
+FROM lark_approval_field_kv
+WHERE parent_widget_id IS NOT NULL
+GROUP BY approval_id, parent_widget_id, row_index;
+
+-- 示例：按类别统计金额（数量 × 单价），三次等值连接都走 idx_key_approval_row
+--
+-- SELECT c.field_value_text AS category,
+--        p.currency,
+--        SUM(q.field_value_num * p.field_value_num) AS spend
+-- FROM lark_approval_field_kv c
+-- JOIN lark_approval_field_kv q
+--   ON q.field_key = '数量' AND q.approval_id = c.approval_id AND q.row_id = c.row_id
+--  AND q.parent_widget_id = c.parent_widget_id
+-- JOIN lark_approval_field_kv p
+--   ON p.field_key = '单价' AND p.approval_id = c.approval_id AND p.row_id = c.row_id
+--  AND p.parent_widget_id = c.parent_widget_id
+-- WHERE c.field_key = '类别'
+-- GROUP BY c.field_value_text, p.currency;
@@ -0,0 +1,10 @@
+-- 快照版本：实例 / 任务 / 时间线中最晚的时间戳（毫秒）
+-- 写入时旧版本不覆盖新版本（ON DUPLICATE KEY UPDATE 中的版本守卫），历史数据为 NULL 时直接覆盖
+ALTER TABLE lark_approval_raw
+    ADD COLUMN version BIGINT NULL COMMENT '快照版本（毫秒时间戳）';
+
+ALTER TABLE lark_approval_instance
+    ADD COLUMN version BIGINT NULL COMMENT '快照版本（毫秒时间戳），旧快照不覆盖新快照';
+
+ALTER TABLE lark_approval_task
+    ADD COLUMN version BIGINT NULL COMMENT '所属实例快照版本（毫秒时间戳）';
@@ -0,0 +1,17 @@
+-- 申请人 / 部门 / 处理人名称：入库时通过飞书通讯录批量接口解析（CONTACT_ENRICH）
+ALTER TABLE lark_approval_instance
+    ADD COLUMN applicant_name  VARCHAR(128) NULL COMMENT '申请人姓名' AFTER applicant_user_id,
+    ADD COLUMN department_name VARCHAR(255) NULL COMMENT '申请人部门名称' AFTER department_id;
+
+ALTER TABLE lark_approval_task
+    ADD COLUMN user_name VARCHAR(128) NULL COMMENT '处理人姓名' AFTER open_id;
+
+-- 通讯录维表：CONTACT_BACKEND=mysql 时使用，多个进程共享解析结果，重启后不必重新请求飞书
+CREATE TABLE IF NOT EXISTS lark_contact_dim (
+    kind        VARCHAR(16)  NOT NULL COMMENT 'user / department',
+    contact_id  VARCHAR(64)  NOT NULL COMMENT 'user_id / department_id',
+    name        VARCHAR(255) NULL     COMMENT '名称',
+    en_name     VARCHAR(255) NULL     COMMENT '英文名',
+    updated_at  DATETIME     NOT NULL COMMENT '最近一次从飞书刷新的时间',
+    PRIMARY KEY (kind, contact_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='飞书通讯录维表（用户 / 部门名称）';
@@ -0,0 +1,5 @@
+-- 对账水位：最近一次从飞书拉取实例的时间（内容未变化时也会刷新）
+-- 已有数据取迁移时间，超过 RECONCILE_STALE_AFTER 后进入对账
+ALTER TABLE lark_approval_instance
+    ADD COLUMN refreshed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '最近一次从飞书拉取的时间',
+    ADD INDEX idx_status_refreshed (status, refreshed_at);
@@ -0,0 +1,29 @@
+-- 金额汇总表：入库时在同一事务内增量维护（AMOUNT_AGG），报表直接读汇总行，不再扫描 KV 表
+-- 建表后执行 python -m app.scripts.rebuild_amount_agg 回填已有数据
+
+-- 每个实例 × 币种 当前计入汇总表的贡献（维度 + 金额），用于再次入库时计算增量
+CREATE TABLE IF NOT EXISTS lark_approval_amount_contrib (
+    instance_code  VARCHAR(64)    NOT NULL COMMENT '审批实例 code',
+    currency       VARCHAR(16)    NOT NULL COMMENT '币种',
+    approval_code  VARCHAR(64)    NULL     COMMENT '审批定义 code',
+    department_id  VARCHAR(64)    NOT NULL DEFAULT '' COMMENT '申请人部门 ID',
+    status         VARCHAR(32)    NULL     COMMENT '实例状态',
+    stat_date      DATE           NOT NULL COMMENT '统计日期（实例发起日）',
+    amount         DECIMAL(20, 4) NOT NULL COMMENT '该币种金额合计',
+    PRIMARY KEY (instance_code, currency)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='审批实例对金额汇总表的贡献';
+
+-- 汇总表：grain=day 时 period_start 为当天，grain=month 时为当月 1 日
+CREATE TABLE IF NOT EXISTS lark_approval_amount_agg (
+    grain           VARCHAR(8)     NOT NULL COMMENT 'day / month',
+    period_start    DATE           NOT NULL COMMENT '统计周期起始日',
+    approval_code   VARCHAR(64)    NOT NULL DEFAULT '' COMMENT '审批定义 code',
+    department_id   VARCHAR(64)    NOT NULL DEFAULT '' COMMENT '申请人部门 ID（无部门时为空串）',
+    currency        VARCHAR(16)    NOT NULL COMMENT '币种',
+    status          VARCHAR(32)    NOT NULL DEFAULT '' COMMENT '实例状态',
+    instance_count  INT            NOT NULL DEFAULT 0 COMMENT '实例数',
+    amount_sum      DECIMAL(24, 4) NOT NULL DEFAULT 0 COMMENT '金额合计',
+    updated_at      DATETIME       NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (grain, period_start, approval_code, department_id, currency, status),
+    KEY idx_approval_period (approval_code, grain, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='审批金额汇总（按日 / 月）';
@@ -0,0 +1,4 @@
+-- 图片 / 附件转存（ATTACHMENT_PIPELINE）：对象存储中的 key 写回 KV 行
+-- JSON 数组，与字段值中的 URL 一一对应，转存失败为 null；key 为文件内容的 sha256（ab/cd/<sha256>）
+ALTER TABLE lark_approval_field_kv
+    ADD COLUMN attachment_keys TEXT NULL COMMENT '转存后的对象 key（JSON 数组）';
@@ -0,0 +1,101 @@
+import datetime
+import time
+from decimal import Decimal
+
+from app.repository.amount_agg import amounts_from_kv, diff_amount_contrib, stat_date
+
+COLUMNS = ("instance_code", "currency", "approval_code", "department_id", "status", "stat_date", "amount")
+
+# 2024-01-01 12:00（Asia/Shanghai）
+START_TIME = "1704081600000"
+
+
+def _instance(status="PENDING"):
+    return {
+        "instance_code": "I1",
+        "approval_code": "A1",
+        "department_id": "D1",
+        "status": status,
+        "start_time": START_TIME,
+    }
+
+
+def _kv(field_key, amount, currency="CNY", parent_widget_id=None):
+    return {
+        "field_key": field_key,
+        "field_value_num": amount,
+        "currency": currency,
+        "parent_widget_id": parent_widget_id,
+    }
+
+
+def _bundle(status="PENDING", kv_rows=None):
+    return {"instance_code": "I1", "instance": _instance(status), "kv_rows": kv_rows}
+
+
+def _stored(upserts):
+    # 模拟贡献行已写入，供下一次入库读取
+    return [dict(zip(COLUMNS, params)) for params in upserts]
+
+
+def _deltas(deltas):
+    # (grain, status, currency) → (instance_count, amount_sum)
+    return {(d[0], d[5], d[4]): (d[6], d[7]) for d in deltas}
+
+
+def test_only_canonical_total_is_counted():
+    rows = [
+        _kv("总金额", 113),
+        _kv("金额", 100),
+        _kv("税额", 13),
+        _kv("总金额", 5, parent_widget_id="W-list"),
+    ]
+
+    assert amounts_from_kv(rows) == {"CNY": Decimal("113")}
+
+
+def test_reprocess_writes_nothing():
+    deltas, upserts, _ = diff_amount_contrib([_bundle(kv_rows=[_kv("总金额", 100)])], [])
+    assert _deltas(deltas)[("day", "PENDING", "CNY")] == (1, Decimal("100"))
+
+    assert diff_amount_contrib([_bundle(kv_rows=[_kv("总金额", 100)])], _stored(upserts)) == ([], [], [])
+
+
+def test_status_change_without_form_moves_amount():
+    _, upserts, _ = diff_amount_contrib([_bundle(kv_rows=[_kv("总金额", 100)])], [])
+
+    # kv_rows=None：form 未变化，沿用已有贡献行的金额
+    deltas, new_upserts, deletes = diff_amount_contrib([_bundle("APPROVED")], _stored(upserts))
+
+    assert _deltas(deltas) == {
+        ("day", "PENDING", "CNY"): (-1, Decimal("-100")),
+        ("month", "PENDING", "CNY"): (-1, Decimal("-100")),
+        ("day", "APPROVED", "CNY"): (1, Decimal("100")),
+        ("month", "APPROVED", "CNY"): (1, Decimal("100")),
+    }
+    assert [dict(zip(COLUMNS, p))["status"] for p in new_upserts] == ["APPROVED"]
+    assert deletes == []
+
+
+def test_removed_currency_is_deleted():
+    kv_rows = [_kv("总金额", 100), _kv("总金额", 20, currency="USD")]
+    _, upserts, _ = diff_amount_contrib([_bundle(kv_rows=kv_rows)], [])
+
+    deltas, new_upserts, deletes = diff_amount_contrib([_bundle(kv_rows=[_kv("总金额", 100)])], _stored(upserts))
+
+    assert _deltas(deltas) == {
+        ("day", "PENDING", "USD"): (-1, Decimal("-20")),
+        ("month", "PENDING", "USD"): (-1, Decimal("-20")),
+    }
+    assert new_upserts == []
+    assert deletes == [("I1", "USD")]
+
+
+def test_stat_date_ignores_host_time_zone(monkeypatch):
+    # 2024-01-01 00:00 Asia/Shanghai = 2023-12-31 16:00 UTC
+    for tz in ("UTC", "Asia/Shanghai", "America/New_York"):
+        monkeypatch.setenv("TZ", tz)
+        time.tzset()
+        assert stat_date("1704038400000") == datetime.date(2024, 1, 1)
+    monkeypatch.undo()
+    time.tzset()
@@ -0,0 +1,23 @@
+from app.utils.approval_parser import FieldMappingRegistry
+
+FORM_A = [{"id": "w1", "name": "申请日期", "type": "date"}]
+FORM_B = [{"id": "w2", "name": "总计", "type": "amount"}]
+
+
+def test_mapping_is_cached_per_approval_code_and_signature():
+    registry = FieldMappingRegistry()
+    mapping = registry.get("APPROVAL-1", FORM_A)
+
+    assert registry.get("APPROVAL-1", FORM_A) is mapping
+    # 审批定义被修改（表单结构变化）：重新编译
+    assert registry.get("APPROVAL-1", FORM_B) is not mapping
+
+
+def test_forms_without_approval_code_do_not_evict_each_other():
+    registry = FieldMappingRegistry()
+    a = registry.get(None, FORM_A)
+    b = registry.get(None, FORM_B)
+
+    assert registry.get(None, FORM_A) is a
+    assert registry.get(None, FORM_B) is b
+    assert b.field_key(FORM_B[0]) == "总金额"
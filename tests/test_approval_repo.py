@@ -0,0 +1,113 @@
+import asyncio
+
+import pymysql
+import pytest
+
+from app.repository import approval_repo
+from app.repository.approval_repo import SQL_RELEASE_INSTANCE_LOCKS, ApprovalRepository
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(sql)
+        if sql == SQL_RELEASE_INSTANCE_LOCKS and self.conn.release_error:
+            raise self.conn.release_error
+
+    def fetchone(self):
+        return {"l0": 1}
+
+
+class _Conn:
+    def __init__(self, release_error=None):
+        self.release_error = release_error
+        self.executed = []
+        self.committed = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.released = []
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn, discard=False):
+        self.released.append(discard)
+
+
+@pytest.fixture(autouse=True)
+def mysql_locks(monkeypatch):
+    monkeypatch.setattr(approval_repo, "INSTANCE_LOCK_BACKEND", "mysql")
+
+
+def test_locks_released_and_connection_returned():
+    pool = _Pool(_Conn())
+
+    with ApprovalRepository(pool).unit_of_work(["A"]):
+        pass
+
+    assert pool.conn.committed
+    assert pool.conn.executed[-1] == SQL_RELEASE_INSTANCE_LOCKS
+    assert pool.released == [False]
+
+
+def test_failed_release_discards_connection_without_raising():
+    pool = _Pool(_Conn(release_error=pymysql.err.OperationalError(2013, "Lost connection")))
+
+    with ApprovalRepository(pool).unit_of_work(["A"]):
+        pass
+
+    assert pool.conn.committed
+    assert pool.released == [True]
+
+
+def test_body_error_is_not_masked_by_failed_release():
+    pool = _Pool(_Conn(release_error=RuntimeError("release failed")))
+
+    with pytest.raises(ValueError):
+        with ApprovalRepository(pool).unit_of_work(["A"]):
+            raise ValueError("bad bundle")
+
+    assert pool.released == [True]
+
+
+def test_async_single_table_writes_forward_version():
+    from app.repository.approval_repo_async import AsyncApprovalRepository
+
+    repo = AsyncApprovalRepository()
+    bundles = []
+
+    async def save_batch(batch):
+        bundles.extend(batch)
+
+    repo.save_batch = save_batch
+
+    async def write():
+        await repo.save_raw_data("A", {"status": "APPROVED"}, version=3)
+        await repo.save_tasks("A", [{"id": "t1"}], version=3)
+
+    asyncio.run(write())
+
+    assert [b["version"] for b in bundles] == [3, 3]
@@ -0,0 +1,49 @@
+import pytest
+
+from app.services import approval_service
+from app.services.approval_service import ApprovalService
+from app.services.idempotency import IdempotencyGuard
+from app.utils.metrics import STAGE_TOTAL
+from bench.fixtures import make_instance
+from bench.memory_repo import MemoryApprovalRepository
+
+
+class _NoContacts:
+    def resolve(self, approval_instances):
+        return {}
+
+
+@pytest.fixture
+def service():
+    MemoryApprovalRepository.reset()
+    yield ApprovalService(repo=MemoryApprovalRepository(), idempotency=IdempotencyGuard(), contacts=_NoContacts())
+    MemoryApprovalRepository.reset()
+
+
+def test_process_callbacks_isolates_failed_fetch(service, monkeypatch):
+    instances = {code: dict(make_instance("small", seed=i), instance_code=code) for i, code in enumerate(("A", "C"))}
+    fetched = []
+
+    def fake_get(code):
+        fetched.append(code)
+        if code == "B":
+            raise RuntimeError("instance deleted")
+        return instances[code]
+
+    monkeypatch.setattr(approval_service, "get_approval_instance", fake_get)
+
+    payloads = [{"instance_code": "A"}, {"instance_code": "B"}, {"instance_code": "C"}, {"instance_code": "B"}]
+    failed = service.process_callbacks(payloads)
+
+    assert failed == [{"instance_code": "B"}, {"instance_code": "B"}]
+    assert fetched == ["A", "B", "C"]
+    assert MemoryApprovalRepository.rows_written()["instance"] == 2
+
+
+def test_persist_records_one_decode_form_stage(service):
+    decoded = STAGE_TOTAL.labels("decode_form", "success")
+    before = decoded.value
+
+    service.persist_instance("A", dict(make_instance("medium"), instance_code="A"))
+
+    assert decoded.value - before == 1
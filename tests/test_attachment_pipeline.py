@@ -0,0 +1,52 @@
+import pytest
+
+from app.services.attachment_pipeline import AttachmentPipeline
+from app.services.attachment_store import ObjectStore
+
+
+def _bundle(code="I1"):
+    return {
+        "instance_code": code,
+        "instance": {"form_hash": "h1"},
+        "kv_rows": [{"widget_id": "W1", "field_type": "image", "extra_json": '["http://files.test/a.png"]'}],
+    }
+
+
+def test_submit_before_start_is_dropped():
+    pipeline = AttachmentPipeline(concurrency=1)
+
+    assert pipeline.submit_bundles([_bundle()]) == 0
+    assert pipeline.stats()["dropped"] == 1
+    assert not pipeline.stats()["running"]
+
+
+def test_submit_after_stop_does_not_restart():
+    pipeline = AttachmentPipeline(concurrency=1)
+    pipeline.start()
+    pipeline.stop(timeout=1)
+
+    # 停机过程中仍在处理的回调：不会把线程重新拉起
+    assert pipeline.submit_bundles([_bundle(), _bundle("I2")]) == 0
+    pipeline.start()
+
+    stats = pipeline.stats()
+    assert not stats["running"]
+    assert stats["dropped"] == 2
+    assert stats["submitted"] == 0
+
+
+def test_disabled_pipeline_ignores_bundles():
+    pipeline = AttachmentPipeline(enabled=False)
+    pipeline.start()
+
+    assert pipeline.submit_bundles([_bundle()]) == 0
+    assert pipeline.stats()["dropped"] == 0
+
+
+def test_incomplete_store_fails_on_construction():
+    class NoPut(ObjectStore):
+        def exists(self, key):
+            return False
+
+    with pytest.raises(TypeError):
+        NoPut()
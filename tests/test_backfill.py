@@ -0,0 +1,91 @@
+import pytest
+
+from app.services import lark_approval_api
+from app.services.approval_service import ApprovalService
+from app.services.backfill import BackfillRunner
+from app.services.idempotency import IdempotencyGuard
+from bench.fake_lark import FakeLarkServer
+from bench.fixtures import APPROVAL_CODE, make_instance
+from bench.memory_repo import MemoryApprovalRepository
+
+CODES = [f"small-{i}" for i in range(7)]
+
+
+class _NoContacts:
+    def resolve(self, approval_instances):
+        return {}
+
+
+class _Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def lark(monkeypatch):
+    server = FakeLarkServer({"small": make_instance("small")}, instance_codes=CODES).start()
+    monkeypatch.setattr(lark_approval_api, "LARK_BASE_URL", server.base_url)
+    monkeypatch.setattr(lark_approval_api, "get_app_access_token", lambda: "t-test-token")
+    MemoryApprovalRepository.reset()
+    yield server
+    server.stop()
+    MemoryApprovalRepository.reset()
+
+
+def _runner(checkpoint_path, service=None):
+    service = service or ApprovalService(
+        repo=MemoryApprovalRepository(), idempotency=IdempotencyGuard(), contacts=_NoContacts(),
+    )
+    return BackfillRunner(
+        APPROVAL_CODE, 0, 1, concurrency=2, batch_size=2, page_size=3,
+        checkpoint_path=str(checkpoint_path), service=service,
+    )
+
+
+def test_resume_from_checkpoint(lark, tmp_path):
+    checkpoint = tmp_path / "backfill.json"
+    service = ApprovalService(repo=MemoryApprovalRepository(), idempotency=IdempotencyGuard(), contacts=_NoContacts())
+    persist = service.persist_instances
+    pages = []
+
+    def persist_until_second_page(instances):
+        pages.append(list(instances))
+        if len(pages) > 2:
+            raise _Interrupted()
+        return persist(instances)
+
+    service.persist_instances = persist_until_second_page
+
+    # batch_size=2：第一页写两批，第二页第一批时中断
+    with pytest.raises(_Interrupted):
+        _runner(checkpoint, service).run()
+
+    report = _runner(checkpoint).run()
+
+    assert report["finished"]
+    assert report["pages"] == 3
+    assert report["fetched"] == len(CODES)
+    assert report["failed"] == 0
+    assert MemoryApprovalRepository.rows_written()["instance"] == len(CODES)
+
+
+def test_retry_failed(lark, tmp_path):
+    checkpoint = tmp_path / "backfill.json"
+    lark.fail_codes = {"small-1", "small-5"}
+
+    report = _runner(checkpoint).run()
+
+    assert report["finished"]
+    assert report["fetched"] == len(CODES) - 2
+    assert report["failed_codes"] == ["small-1", "small-5"]
+
+    lark.fail_codes = set()
+    report = _runner(checkpoint).retry_failed()
+
+    assert report["fetched"] == len(CODES)
+    assert report["failed_codes"] == []
+    assert MemoryApprovalRepository.rows_written()["instance"] == len(CODES)
+
+    # 已完成的窗口不再重复拉取
+    requests = lark.requests
+    assert _runner(checkpoint).run()["finished"]
+    assert lark.requests == requests
@@ -0,0 +1,220 @@
+import threading
+import time
+
+from app.services.callback_worker import CallbackWorkerPool
+
+# 分区线程处理该回调时阻塞，用于制造积压
+HOLD = {"instance_code": "HOLD"}
+
+
+def _wait(pool, processed, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = pool.stats()
+        if stats["processed"] + stats["failed"] >= processed and stats["in_flight"] == 0:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError(pool.stats())
+
+
+def _hold(pool, release):
+    """
+    提交 HOLD 并等到分区线程开始处理（队列随即为空），之后提交的回调在队列中积压，直到 release.set()
+    """
+    assert pool.submit(HOLD)
+    deadline = time.monotonic() + 2
+    while not release.holding.is_set() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert release.holding.is_set()
+
+
+class _Release(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.holding = threading.Event()
+
+    def hold(self, payload):
+        if payload is HOLD or payload.get("instance_code") == "HOLD":
+            self.holding.set()
+            self.wait(5)
+            return True
+        return False
+
+
+def test_failed_batch_retries_each_instance_group_once():
+    calls = []
+    attempts = {"n": 0}
+    release = _Release()
+
+    def batch_handler(payloads):
+        calls.append([p["instance_code"] for p in payloads])
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise RuntimeError("mysql gone")
+        return []
+
+    def handler(payload):
+        if not release.hold(payload):
+            calls.append([payload["instance_code"]])
+
+    pool = CallbackWorkerPool(handler, batch_handler, batch_size=10, workers=1, retry_backoff=0.01)
+    pool.start()
+    _hold(pool, release)
+    for p in ({"instance_code": "A", "n": 1}, {"instance_code": "A", "n": 2}, {"instance_code": "B"}):
+        assert pool.submit(p)
+    release.set()
+    stats = _wait(pool, 4)
+    pool.stop(1)
+
+    assert stats["processed"] == 4
+    # 整批失败后：A 的两个回调作为一组重试（一次拉取），B 单独处理
+    assert calls == [["A", "A", "B"], ["A", "A"], ["B"]]
+
+
+def test_batch_handler_failures_go_to_retry_and_give_up():
+    release = _Release()
+
+    def batch_handler(payloads):
+        return [p for p in payloads if p["instance_code"] == "BAD"]
+
+    def handler(payload):
+        if not release.hold(payload) and payload["instance_code"] == "BAD":
+            raise RuntimeError("forbidden")
+
+    pool = CallbackWorkerPool(handler, batch_handler, batch_size=10, workers=1, max_retries=2, retry_backoff=0.01)
+    pool.start()
+    _hold(pool, release)
+    assert pool.submit({"instance_code": "OK"})
+    assert pool.submit({"instance_code": "BAD"})
+    release.set()
+    stats = _wait(pool, 3)
+    pool.stop(1)
+
+    assert stats["processed"] == 2
+    assert stats["failed"] == 1
+    assert stats["retried"] == 2
+
+
+def test_submit_rejects_when_partition_queue_is_full():
+    release = _Release()
+    pool = CallbackWorkerPool(release.hold, workers=1, queue_size=2)
+
+    assert not pool.submit({"instance_code": "A"})
+
+    pool.start()
+    _hold(pool, release)
+    assert pool.submit({"instance_code": "A"})
+    assert pool.submit({"instance_code": "B"})
+    assert not pool.submit({"instance_code": "C"})
+    assert pool.stats()["rejected"] == 1
+
+    release.set()
+    stats = _wait(pool, 3)
+    pool.stop(1)
+    assert stats["processed"] == 3
+    assert not pool.submit({"instance_code": "D"})
+
+
+def test_same_instance_stays_on_one_partition():
+    threads = {}
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            threads.setdefault(payload["instance_code"], set()).add(threading.current_thread().name)
+
+    pool = CallbackWorkerPool(handler, workers=4)
+    pool.start()
+    for i in range(40):
+        assert pool.submit({"instance_code": f"I{i % 8}"})
+    _wait(pool, 40)
+    pool.stop(1)
+
+    assert all(len(names) == 1 for names in threads.values())
+    assert len({name for names in threads.values() for name in names}) > 1
+
+
+def test_retry_backoff_does_not_block_partition():
+    done = {}
+
+    def handler(payload):
+        if payload["instance_code"] == "BAD":
+            raise RuntimeError("lark 500")
+        done[payload["instance_code"]] = time.monotonic()
+
+    pool = CallbackWorkerPool(handler, workers=1, max_retries=1, retry_backoff=1.0)
+    pool.start()
+    started = time.monotonic()
+    pool.submit({"instance_code": "BAD"})
+    pool.submit({"instance_code": "GOOD"})
+
+    deadline = time.monotonic() + 2
+    while "GOOD" not in done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert done["GOOD"] - started < 0.5
+    assert pool.stats()["retry_scheduled"] == 1
+
+    stats = _wait(pool, 2)
+    pool.stop(1)
+    assert stats["failed"] == 1
+    assert stats["retried"] == 1
+
+
+def test_stop_flushes_scheduled_retries():
+    calls = []
+
+    def handler(payload):
+        calls.append(payload["instance_code"])
+        if len(calls) == 1:
+            raise RuntimeError("mysql gone")
+
+    pool = CallbackWorkerPool(handler, workers=1, max_retries=3, retry_backoff=60)
+    pool.start()
+    pool.submit({"instance_code": "A"})
+    deadline = time.monotonic() + 2
+    while pool.stats()["retry_scheduled"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    pool.stop(2)
+    assert calls == ["A", "A"]
+    assert pool.stats()["processed"] == 1
+
+
+def test_coalesce_window_merges_callbacks_per_instance():
+    calls = []
+
+    def batch_handler(payloads):
+        calls.append([p["instance_code"] for p in payloads])
+        return []
+
+    pool = CallbackWorkerPool(lambda p: None, batch_handler, batch_size=10, workers=1, coalesce_window=0.2)
+    pool.start()
+    for code in ("A", "B", "A", "A"):
+        assert pool.submit({"instance_code": code, "status": "PENDING"})
+    stats = _wait(pool, 4)
+    pool.stop(1)
+
+    # 同一实例窗口内的回调合并为一组，整组一次处理
+    assert [c.count("A") for c in calls if "A" in c] == [3]
+    assert stats["coalesced"] == 2
+    assert stats["processed"] == 4
+
+
+def test_final_status_flushes_immediately():
+    calls = []
+
+    def batch_handler(payloads):
+        calls.append([p["status"] for p in payloads])
+        return []
+
+    pool = CallbackWorkerPool(lambda p: None, batch_handler, batch_size=10, workers=1, coalesce_window=30)
+    pool.start()
+    started = time.monotonic()
+    pool.submit({"instance_code": "A", "status": "PENDING"})
+    pool.submit({"instance_code": "A", "status": "APPROVED"})
+    _wait(pool, 2)
+    elapsed = time.monotonic() - started
+    pool.stop(1)
+
+    assert elapsed < 1
+    assert calls == [["PENDING", "APPROVED"]]
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from app.repository.approval_repo import diff_field_kv, field_kv_params
+
+
+def _kv(widget_id, value, row_id=None, num=None):
+    return {
+        "approval_id": "I1",
+        "row_id": row_id,
+        "widget_id": widget_id,
+        "field_name": widget_id,
+        "field_type": "input",
+        "field_value_text": value,
+        "field_value_num": num,
+    }
+
+
+def _stored(rows):
+    # 数据库中的形态：row_id / widget_id 为空串，数值为 Decimal
+    stored = []
+    for r in rows:
+        r = dict(r, row_id=r["row_id"] or "", widget_id=r["widget_id"] or "")
+        if r["field_value_num"] is not None:
+            r["field_value_num"] = Decimal(str(r["field_value_num"]))
+        stored.append(r)
+    return stored
+
+
+def test_unchanged_rows_write_nothing():
+    rows = [_kv("W1", "a"), _kv("W2", "3", num=3.5), _kv("W3", "x", row_id="0"), _kv(None, "no id")]
+
+    assert diff_field_kv({"I1": rows}, _stored(rows)) == ([], [])
+
+
+def test_changed_and_removed_rows():
+    old = [_kv("W1", "a"), _kv("W2", "b"), _kv("W3", "x", row_id="0"), _kv("W3", "y", row_id="1")]
+    new = [_kv("W1", "a"), _kv("W2", "changed"), _kv("W3", "x", row_id="0")]
+
+    upserts, deletes = diff_field_kv({"I1": new}, _stored(old))
+
+    assert upserts == [field_kv_params(new[1])]
+    assert deletes == [("I1", "1", "W3")]
+
+
+def test_missing_ids_are_written_as_empty_string():
+    params = field_kv_params(_kv(None, "no id"))
+
+    assert params[1:3] == ("", "")
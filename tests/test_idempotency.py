@@ -0,0 +1,37 @@
+from app.services.idempotency import IdempotencyGuard, idempotency_keys
+
+
+def test_uuid_key():
+    assert idempotency_keys({"uuid": "u1"}) == ["uuid:u1"]
+
+
+def test_no_state_key_without_time():
+    assert idempotency_keys({"instance_code": "X", "status": "PENDING"}) == []
+
+
+def test_status_without_time_does_not_suppress_later_callback():
+    guard = IdempotencyGuard(window=600)
+    guard.mark({"instance_code": "X", "status": "PENDING"})
+    assert not guard.seen({"instance_code": "X", "status": "PENDING"})
+
+
+def test_task_event_does_not_suppress_instance_event():
+    task = {"type": "event_callback", "event": {
+        "type": "approval_task", "instance_code": "X", "task_id": "T1", "status": "APPROVED", "operate_time": "1",
+    }}
+    instance = {"type": "event_callback", "event": {
+        "type": "approval_instance", "instance_code": "X", "status": "APPROVED", "operate_time": "1",
+    }}
+    assert idempotency_keys(task) != idempotency_keys(instance)
+
+    guard = IdempotencyGuard(window=600)
+    guard.mark(task)
+    assert not guard.seen(instance)
+    assert guard.seen(task)
+
+
+def test_same_state_redelivered_is_seen():
+    payload = {"event": {"type": "approval_instance", "instance_code": "X", "status": "APPROVED", "operate_time": "5"}}
+    guard = IdempotencyGuard(window=600)
+    guard.mark(payload)
+    assert guard.seen(dict(payload, uuid="another-delivery"))
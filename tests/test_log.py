@@ -0,0 +1,56 @@
+import json
+import logging
+import queue
+import threading
+
+from app.utils import log
+from app.utils.log import DroppingQueueHandler, JsonFormatter, fields
+
+
+def _record(**extra):
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "回调入队", None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_fields_do_not_overwrite_envelope():
+    entry = json.loads(JsonFormatter().format(_record(**fields(level="x", msg="y", app_secret="s"))))
+
+    assert entry["level"] == "INFO"
+    assert entry["msg"] == "回调入队"
+    assert entry["fields"] == {"level": "x", "msg": "y", "app_secret": "***"}
+
+
+class _Blocking(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.unblock.wait()
+        self.records.append(record)
+
+
+def test_stop_with_full_queue(monkeypatch):
+    log_queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(log_queue)
+    sink = _Blocking()
+    listener = log._QueueListener(log_queue, handler, sink)
+    monkeypatch.setattr(listener, "sentinel_timeout", 0.05)
+    listener.start()
+
+    # 监听线程卡在第一条上，队列随后被写满
+    for _ in range(4):
+        handler.handle(_record())
+    assert log_queue.full()
+
+    stopper = threading.Thread(target=listener.stop)
+    stopper.start()
+    stopper.join(0.5)
+    sink.unblock.set()
+    stopper.join(2)
+
+    assert not stopper.is_alive()
+    assert handler.dropped >= 2
+    assert len(sink.records) + handler.dropped == 4
@@ -0,0 +1,27 @@
+import pytest
+
+from app.utils.metrics import Counter, _Metric
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("m", "doc")
+
+    class NoSamples(_Metric):
+        def _new_child(self):
+            return None
+
+    with pytest.raises(TypeError):
+        NoSamples("m", "doc")
+
+
+def test_counter_renders_labelled_samples():
+    counter = Counter("test_total", "Test counter", ("kind",))
+    counter.labels("a").inc()
+    counter.labels("a").inc(2)
+
+    assert counter.render() == [
+        "# HELP test_total Test counter",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 3',
+    ]
@@ -0,0 +1,79 @@
+import time
+
+import requests
+
+from app.services.lark_http import LarkHttpClient
+from app.services.rate_limiter import AdaptiveTokenBucket, parse_rate_limit_headers
+
+
+def test_burst_then_paced():
+    bucket = AdaptiveTokenBucket("test", rate=10, burst=3)
+    # 模拟已空闲一段时间
+    bucket._next_at -= 10
+
+    waits = [bucket._reserve() for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0.05 < waits[3] <= 0.1
+    assert 0.15 < waits[4] <= 0.2
+    assert bucket.stats()["waited"] == 2
+
+
+def test_throttle_halves_rate_and_pauses():
+    bucket = AdaptiveTokenBucket("test", rate=8, burst=8, min_rate=3)
+
+    bucket.throttle(retry_after=0.5)
+    assert bucket.rate == 4
+    assert bucket._reserve() > 0.4
+
+    bucket.throttle()
+    assert bucket.rate == 3
+
+
+def test_recover_returns_to_configured_rate():
+    bucket = AdaptiveTokenBucket("test", rate=10, min_rate=1)
+    bucket.throttle(retry_after=0)
+
+    for _ in range(20):
+        bucket.recover()
+
+    assert bucket.rate == 10
+
+
+def test_parse_rate_limit_headers():
+    assert parse_rate_limit_headers({"x-ogw-ratelimit-reset": "2", "x-ogw-ratelimit-remaining": "0"}) == (2.0, 0)
+    assert parse_rate_limit_headers({"Retry-After": "soon", "x-ratelimit-reset": "1.5"}) == (1.5, None)
+    assert parse_rate_limit_headers({}) == (None, None)
+
+
+class _Response(requests.Response):
+    def __init__(self, status_code, headers=None):
+        super().__init__()
+        self.status_code = status_code
+        self.headers.update(headers or {})
+        self._content = b"{}"
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def request(self, method, url, **kwargs):
+        return self.responses.pop(0)
+
+
+def test_discarded_responses_are_closed():
+    client = LarkHttpClient(base_url="http://lark.test", backoff=0)
+    responses = [_Response(429, {"Retry-After": "0"}), _Response(503), _Response(200)]
+    client.session = _Session(responses)
+
+    started = time.monotonic()
+    resp = client.get("/ping", "test_close")
+
+    assert resp is responses[2]
+    assert [r.closed for r in responses] == [True, True, False]
+    assert time.monotonic() - started < 1